@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Benchmarks each stage of the NEATbots evaluation pipeline on the CPU, using the stand-in simulator
+from testing/fake_voxcraft_sim.py in place of voxcraft-sim.
+
+Stages are timed across organism sizes, population sizes, palette sizes and every gym, and written
+to a JSON report. Passing a previous report with --compare prints the change in each timing, and
+exits with status 1 if any stage has slowed down beyond the threshold, for catching regressions in CI.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output report.json
+    python benchmarks/bench_pipeline.py --quick --compare baseline.json
+"""
+
+import argparse, glob, json, os, platform, shutil, subprocess, sys, tempfile, time
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from neatbots.evolution import Evolution
+from neatbots.organism import MATERIAL_OUTPUTS, resolve_materials
+from neatbots.recorder import Recorder
+from neatbots.simulation import Simulation
+from neatbots.VoxcraftVXA import VXA
+
+FAKE_SIM = os.path.join(ROOT, "testing", "fake_voxcraft_sim.py")
+GYMS = sorted(glob.glob(os.path.join(ROOT, "gyms", "*.vxa")))
+
+def time_stage(func, repeats: int):
+    """Times a stage several times.
+
+    Args:
+        func (Callable): Stage to time, called with the repeat number.
+        repeats (int): Number of times to run the stage.
+
+    Returns:
+        (dict): Median and minimum duration in seconds.
+    """
+
+    times = list()
+    for r in range(repeats):
+        start = time.perf_counter()
+        func(r)
+        times.append(time.perf_counter() - start)
+    return {"median": float(np.median(times)), "min": float(np.min(times)), "repeats": repeats}
+
+def load_gym(gym_path: str, palette: int = 0):
+    """Loads a gym, filling its palette with random materials.
+
+    Args:
+        gym_path (str): Path of the gym's .vxa file.
+        palette (int, optional): Number of organism materials added to the palette. Defaults to 0.
+
+    Returns:
+        (VXA): Instance of VXA class for the gym.
+    """
+
+    vxa = VXA(src=gym_path, HeapSize=0.6, SimTime=0.01)
+    for row in random_outputs(palette, palette):
+        vxa.add_material(**dict(zip(MATERIAL_OUTPUTS, row)), diff_thresh=-1)
+    return vxa
+
+def random_outputs(n: int, seed: int):
+    """Creates random morphology network outputs for solid, non-fixed materials.
+
+    Args:
+        n (int): Number of outputs.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        (np.ndarray): (n x 19) array of network outputs.
+    """
+
+    outputs = np.random.default_rng(seed).random((n, len(MATERIAL_OUTPUTS)))
+    outputs[:, MATERIAL_OUTPUTS.index("isEmpty")] = 0.0
+    outputs[:, MATERIAL_OUTPUTS.index("Fixed")] = 0.0
+    return outputs
+
+def random_morphology(size: int, n_materials: int, seed: int):
+    """Creates a random morphology, with roughly half of the organism space filled.
+
+    Args:
+        size (int): Width, height and depth of the organism space.
+        n_materials (int): Number of materials to choose from.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        (np.ndarray): 3D array of material IDs.
+    """
+
+    rng = np.random.default_rng(seed)
+    morphology = rng.integers(1, n_materials + 1, (size, size, size))
+    morphology[rng.random((size, size, size)) < 0.5] = 0
+    return morphology
+
+def fits(sim: Simulation, size: int):
+    """Checks that an organism size fits into a gym's spawn area."""
+
+    try:
+        sim.check_spawn((size, size, size))
+        return True
+    except Exception:
+        return False
+
+def bench_cppn_query(sizes: list, repeats: int, stor_path: str):
+    """Times building and querying morphology and control system networks, which does not depend on the gym."""
+
+    results = list()
+    sim = Simulation(FAKE_SIM, "", stor_path, VXA(HeapSize=0.6, SimTime=0.01))
+    for size in sizes:
+        evo = Evolution(sim, gen_n=1, pop_s=repeats, W=size, H=size, D=size)
+        organisms = list(evo.construct_organisms(1).values())
+        results.append({"stage": "cppn_query", "gym": None, "size": size, "pop": None, "palette": None,
+                        **time_stage(lambda r: organisms[r % len(organisms)].query_morphology(), repeats)})
+        results.append({"stage": "controlsys_query", "gym": None, "size": size, "pop": None, "palette": None,
+                        **time_stage(lambda r: organisms[r % len(organisms)].query_controlsys(), repeats)})
+    return results
+
+def bench_gym(gym_path: str, sizes: list, pops: list, palettes: list, repeats: int, stor_path: str):
+    """Times the stages which depend on a gym's settings and environment."""
+
+    gym = os.path.basename(gym_path)
+    results = list()
+
+    for palette in palettes:
+        vxa = load_gym(gym_path, palette)
+
+        # Merging a batch of network outputs into the palette, from a fresh copy each time
+        proposals = random_outputs(32, 0)
+        copies = [VXA.__new__(VXA) for _ in range(repeats)]
+        for vxa_copy in copies:
+            vxa_copy.__setstate__(vxa.__getstate__())
+        results.append({"stage": "palette_insert", "gym": gym, "size": None, "pop": None, "palette": palette,
+                        **time_stage(lambda r: resolve_materials(copies[r], proposals, np.arange(len(proposals))), repeats)})
+
+        # Writing the settings and palette
+        vxa_path = os.path.join(stor_path, "base.vxa")
+        results.append({"stage": "vxa_write", "gym": gym, "size": None, "pop": None, "palette": palette,
+                        **time_stage(lambda r: vxa.write(vxa_path), repeats)})
+
+    vxa = load_gym(gym_path, max(palettes))
+    n_materials = min(len(vxa.materials.ids), 200)
+
+    for size in sizes:
+        sim = Simulation(FAKE_SIM, "", stor_path, vxa)
+        if not fits(sim, size):
+            results.append({"stage": "vxd_encode", "gym": gym, "size": size, "pop": None, "palette": None, "skipped": "exceeds spawn area"})
+            continue
+
+        # Placing a morphology into the environment and encoding it
+        generation_path = sim.create_directory("encode")
+        morphologies = [random_morphology(size, n_materials, r) for r in range(repeats)]
+        results.append({"stage": "vxd_encode", "gym": gym, "size": size, "pop": None, "palette": None,
+                        **time_stage(lambda r: sim.encode_morphology(morphologies[r], generation_path, "bench_1-" + str(r), 0), repeats)})
+
+        # Parsing simulator output, with history recorded and some organisms diverging
+        for pop in pops:
+            generation_path = sim.create_directory("simulate")
+            for i in range(pop):
+                sim.encode_morphology(random_morphology(size, n_materials, i), generation_path, "bench_1-" + str(i), 100)
+            vxa.write(os.path.join(generation_path, "base.vxa"))
+
+            parse_times = {"stdout_parse": list(), "results_parse": list()}
+            for _ in range(repeats):
+                sim.recorder = Recorder(os.devnull)
+                sim.simulate_generation(generation_path)
+                for stage in parse_times.keys():
+                    parse_times[stage].append(sim.recorder.totals.get(stage, 0.0))
+                sim.recorder.close()
+            for stage, times in parse_times.items():
+                results.append({"stage": stage, "gym": gym, "size": size, "pop": pop, "palette": None,
+                                "median": float(np.median(times)), "min": float(np.min(times)), "repeats": repeats})
+
+    return results
+
+def result_key(result: dict):
+    return (result["stage"], result["gym"], result["size"], result["pop"], result["palette"])
+
+def compare(report: dict, baseline: dict, threshold: float, floor: float):
+    """Prints the change in each timing against a previous report. \n
+    Regressions are judged on the fastest repeat, which is least affected by other load on the machine.
+
+    Args:
+        report (dict): Report of this run.
+        baseline (dict): Previous report.
+        threshold (float): Ratio of durations counted as a regression.
+        floor (float): Increase in seconds below which a slowdown is treated as noise.
+
+    Returns:
+        (int): Number of regressions.
+    """
+
+    base_results = {result_key(r): r for r in baseline["results"] if "min" in r}
+    regressions = 0
+
+    print("\n  {0:<15}| {1:<11}| {2:>4} | {3:>4} | {4:>7} | {5:>10} | {6:>10} | {7:>6}".format(
+        "Stage", "Gym", "Size", "Pop", "Palette", "Baseline", "Fastest", "Ratio"))
+    for result in report["results"]:
+        base = base_results.get(result_key(result))
+        if ("min" not in result) or (base == None): continue
+
+        ratio = result["min"] / base["min"] if (base["min"] > 0) else 1.0
+        regressed = (ratio > threshold) and (result["min"] - base["min"] > floor)
+        flag = " <<" if (regressed) else ""
+        regressions += regressed
+        print("  {0:<15}| {1:<11}| {2:>4} | {3:>4} | {4:>7} | {5:10.6f} | {6:10.6f} | {7:6.2f}{8}".format(
+            result["stage"], str(result["gym"] or "-"), str(result["size"] or "-"), str(result["pop"] or "-"),
+            str(result["palette"] or "-"), base["min"], result["min"], ratio, flag))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the NEATbots evaluation pipeline without a CUDA device.")
+    parser.add_argument("--quick", action="store_true", help="small sizes and few repeats, for CI")
+    parser.add_argument("--sizes", type=int, nargs="+", help="organism widths, heights and depths")
+    parser.add_argument("--pops", type=int, nargs="+", help="population sizes")
+    parser.add_argument("--palettes", type=int, nargs="+", help="numbers of organism materials in the palette")
+    parser.add_argument("--gyms", nargs="+", help="gym files, all in gyms/ by default")
+    parser.add_argument("--repeats", type=int, help="number of times each stage is timed")
+    parser.add_argument("--output", default="bench_report.json", help="path of the JSON report")
+    parser.add_argument("--compare", help="path of a previous JSON report")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio counted as a regression")
+    parser.add_argument("--floor", type=float, default=0.0005, help="slowdown in seconds ignored as noise")
+    args = parser.parse_args()
+
+    sizes = args.sizes or ([3, 8] if (args.quick) else [3, 8, 16, 32])
+    pops = args.pops or ([8] if (args.quick) else [8, 32])
+    palettes = args.palettes or ([10] if (args.quick) else [10, 100])
+    repeats = args.repeats or (3 if (args.quick) else 5)
+    gyms = args.gyms or GYMS
+
+    # Simulated organisms are scored instantly, with one in ten diverging
+    os.environ["FAKE_VOXCRAFT_LATENCY"] = "0"
+    os.environ["FAKE_VOXCRAFT_DIVERGE"] = "0.1"
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    report = {"environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                              "processor": platform.processor(), "commit": commit.stdout.decode().strip()},
+              "settings": {"sizes": sizes, "pops": pops, "palettes": palettes, "repeats": repeats},
+              "results": list()}
+
+    stor_path = tempfile.mkdtemp(prefix="neatbots_bench_")
+    try:
+        report["results"] += bench_cppn_query(sizes, repeats, stor_path)
+        for gym_path in gyms:
+            print("Benchmarking " + os.path.basename(gym_path))
+            report["results"] += bench_gym(gym_path, sizes, pops, palettes, repeats, stor_path)
+    finally:
+        shutil.rmtree(stor_path, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Report written to " + args.output)
+
+    if (args.compare != None):
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold, args.floor)
+        if (regressions > 0):
+            print("\n{0} stage(s) slower than {1}x the baseline".format(regressions, args.threshold))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,28 @@
 from neatbots.simulation import Simulation
 from neatbots.evolution import Evolution
-from neatbots.VoxcraftVXA import VXA
+from neatbots.VoxcraftVXA import VXA, compile_gym
+from neatbots.cache import FitnessCache
+from neatbots.sweep import Sweep
 import MultiNEAT as NEAT
-import pandas as pd
 
 def main():
     """Runner function for testing the NEATbots module."""
     
+    # Compile the gym once, so that every trial maps its environment instead of parsing it
+    compile_gym("./gyms/gym_05.vxa")
+
     # MultiNEAT hyperparameters
-    testing_params = NEAT.Parameters()
     optimal_params = NEAT.Parameters()
 
     #demo_evo = setup_experiment(optimal_params)
     #demo_evo.evolve_organisms(elites=True, verbose=True)
 
     # Set MultiNEAT control parameters:
-    testing_params.DetectCompetetiveCoevolutionStagnation = True
-    testing_params.RouletteWheelSelection = False
-    testing_params.AllowClones = False
+    control_params = {
+        "DetectCompetetiveCoevolutionStagnation":   True,
+        "RouletteWheelSelection":                   False,
+        "AllowClones":                              False,
+    }
 
     # Set experiment ranges for MultiNEAT hyperparameters
     exp_ranges = { 
@@ -48,59 +53,31 @@ def main():
         #"MutateGenomeTraitsProb":      [1.0, [2, 4, 6, 8, 10]],
     }
 
-    with open("./Experiment_Results.csv", mode="w") as f:
-        f.write("Exp No.,Test No.,Test Value,Evo Speed,Evo Accel,Max Avg Fit,Generation of Max Avg Fit\n") 
-
-    for e, exp_param in enumerate(exp_ranges.keys()):
-
-        exp_results = list()
-
-        # Get values for this experiments hyperparameter
-        default, test_vals = exp_ranges[exp_param]
-
-        # For recording optimal hyperparameter value
-        rec_max_avg = 0
+    # Run each (hyperparameter, value) trial in parallel, resuming from any recorded in the results file
+    sweep = Sweep(setup_experiment, exp_ranges, control_params, results_path="./Experiment_Results.csv", stor_path="./generations", workers=4)
 
-        # Set all other hyperparameters to their defaults
-        for hyp_param in exp_ranges.keys():
-            if hyp_param != exp_param:
-                testing_params.__setattr__(hyp_param, exp_ranges[hyp_param][0])
-                
-        # Iterate over test values for current hyperparameter
-        for t, test_val in enumerate(test_vals):
-            testing_params.__setattr__(exp_param, test_val)
-
-            # Create evolution object for test
-            testing_evo = setup_experiment(testing_params)
-
-            # Perform evolution and return results
-            gen_results, evo_speed, evo_accel, max_avg, max_avg_gen = testing_evo.evolve_organisms(elites=False, verbose=False)
-            exp_results.append([str("%02d")%(e+1), str("%02d")%(t+1), test_val, evo_speed, evo_accel, max_avg, max_avg_gen])
-
-            # Update optimal hyperparams
-            if (rec_max_avg < max_avg):
-                rec_max_avg = max_avg
-                optimal_params.__setattr__(exp_param, test_val)
-
-        # Experiment results
-        fmt_exp_results = pd.DataFrame(exp_results)
-        fmt_exp_results.to_csv("./Experiment_Results.csv", mode="a", float_format="%+07.2f", header=False, index=False)
+    # Set optimal hyperparams
+    for exp_param, test_val in sweep.run(verbose=True).items():
+        optimal_params.__setattr__(exp_param, test_val)
 
     # Run using optimal hyperparameters
     final_evo = setup_experiment(optimal_params)
     final_evo.evolve_organisms(elites=True, verbose=True)
     
-def setup_experiment(params: NEAT.Parameters):
+def setup_experiment(params: NEAT.Parameters, stor_path: str = "./generations"):
     # VXA (Simulation settings class)
-    vxa = VXA(src="./gyms/gym_05.vxa", 
+    vxa = VXA(src="./gyms/gym_05.gym", 
         HeapSize=0.6, EnableCilia=0, EnableSignals=1, EnableExpansion=1, EnableCollision=1, 
         SimTime=2.0, TempPeriod=0.0, VaryTempEnabled=1, TempAmplitude=20, TempBase=25, TempEnabled=1)
 
-    # Simulation object
-    sim = Simulation("./voxcraft-sim/voxcraft-sim", "./voxcraft-sim/vx3_node_worker", "./generations", vxa)
+    # Simulation object, sharing settings files between the trials of a sweep
+    sim = Simulation("./voxcraft-sim/voxcraft-sim", "./voxcraft-sim/vx3_node_worker", stor_path, vxa, settings_path="./generations/settings")
+
+    # Fitness cache, shared between all experiments
+    cache = FitnessCache("./fitness_cache.sqlite")
 
     # Evolution object
-    return Evolution(sim, params, gen_n=16, pop_s=16, W=3, H=3, D=3)
+    return Evolution(sim, params, gen_n=16, pop_s=16, W=3, H=3, D=3, cache=cache, palette_pool=64)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,213 @@
+import hashlib
+import json
+import os
+import struct
+import threading
 import numpy as np
 from lxml import etree
-from copy import deepcopy
+
+from neatbots.VoxcraftVXD import MAX_MATERIAL_ID
+
+# Mechanical material properties, with functions scaling normalised (0.0-1.0) values into their ranges
+PROPERTIES = {
+    "isTarget": lambda x : round(x),
+    "isMeasured": lambda x : round(x),
+    "Fixed": lambda x : round(x),
+    "sticky": lambda x : round(x),
+    "Cilia": lambda x : round(x),
+    "isPaceMaker": lambda x : round(x),
+    "PaceMakerPeriod": lambda x : 0.2 + (x * 0.4),
+    "signalValueDecay": lambda x : 0.0 + (x * 0.5),
+    "signalTimeDecay": lambda x : 0.2 + (x * 0.4),
+    "inactivePeriod": lambda x : 0.2 + (x * 0.4),
+    "MatModel": lambda x : round(x),
+    "Fail_Stress": lambda x : 0.0 + (x * 1.0),
+    "Elastic_Mod": lambda x : 10 ** int(4 + (x * 4)),
+    "Density": lambda x : 10 ** int(4 + (x * 4)),
+    "Poissons_Ratio": lambda x : 0 + (x * 0.5),
+    "CTE": lambda x : 10 ** -int(2 + (x * 1.0)),
+    "uStatic": lambda x : 0.0 + (x * 5.0),
+    "uDynamic": lambda x : 0.0 + (x * 1.0),
+}
+
+# Vectorised equivalents of the property scaling functions, applied to whole columns of normalised values
+PROPERTY_ARRAYS = {
+    "isTarget": lambda x : np.round(x),
+    "isMeasured": lambda x : np.round(x),
+    "Fixed": lambda x : np.round(x),
+    "sticky": lambda x : np.round(x),
+    "Cilia": lambda x : np.round(x),
+    "isPaceMaker": lambda x : np.round(x),
+    "PaceMakerPeriod": lambda x : 0.2 + (x * 0.4),
+    "signalValueDecay": lambda x : 0.0 + (x * 0.5),
+    "signalTimeDecay": lambda x : 0.2 + (x * 0.4),
+    "inactivePeriod": lambda x : 0.2 + (x * 0.4),
+    "MatModel": lambda x : np.round(x),
+    "Fail_Stress": lambda x : 0.0 + (x * 1.0),
+    "Elastic_Mod": lambda x : 10.0 ** np.trunc(4 + (x * 4)),
+    "Density": lambda x : 10.0 ** np.trunc(4 + (x * 4)),
+    "Poissons_Ratio": lambda x : 0 + (x * 0.5),
+    "CTE": lambda x : 10.0 ** -np.trunc(2 + (x * 1.0)),
+    "uStatic": lambda x : 0.0 + (x * 5.0),
+    "uDynamic": lambda x : 0.0 + (x * 1.0),
+}
+
+# Columns of material outputs, as passed to VXA.add_materials
+MATERIAL_OUTPUTS = ("isEmpty", "isTarget", "isMeasured", "Fixed", "sticky", "Cilia", "isPaceMaker", "PaceMakerPeriod", 
+                    "signalValueDecay", "signalTimeDecay", "inactivePeriod", "MatModel", "Elastic_Mod", "Fail_Stress", 
+                    "Density", "Poissons_Ratio", "CTE", "uStatic", "uDynamic")
+
+# Width of each property's range, used to normalise differences between materials
+PROPERTY_SPANS = np.array([abs(f(0) - f(1)) for f in PROPERTIES.values()], dtype=float)
+# Column of the Fixed property, which marks environment materials
+FIXED = list(PROPERTIES.keys()).index("Fixed")
+
+# Compiled gym bundles: magic bytes, header length, JSON header, then the environment grid aligned for memory mapping
+GYM_MAGIC = b"NEATGYM1"
+GYM_ALIGN = 64
+
+def compile_gym(src: str, dst: str = None):
+    """Compiles a .vxa gym into a bundle which loads without parsing its structure. \n
+    The environment is stored as a raw grid of material IDs, memory mapped when loaded so that processes share its pages,
+    with the remaining settings, palette defaults and gym materials kept as a small XML header.
+
+    Args:
+        src (str): Relative path of the .vxa gym.
+        dst (str, optional): Relative path of the bundle, the gym's path with a .gym extension if None. Defaults to None.
+
+    Returns:
+        (str): Relative path of the bundle.
+    """
+
+    dst = dst if (dst != None) else os.path.splitext(src)[0] + ".gym"
+    vxa = VXA(src=src)
+
+    # Layers are rebuilt from the grid when serialised
+    data = vxa.root.find("*/Structure/Data")
+    if (data != None):
+        data.getparent().remove(data)
+
+    header = {"shape": list(vxa.environment.shape), "spawnpoint": list(vxa.spawnpoint),
+              "xml": etree.tostring(vxa.root, encoding="unicode")}
+    header = json.dumps(header).encode("utf-8")
+    offset = -(len(GYM_MAGIC) + 8 + len(header)) % GYM_ALIGN
+    header += b" " * offset
+
+    # Written under a unique name and renamed, so workers never map a partial file
+    temp_path = dst + "." + str(os.getpid()) + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(GYM_MAGIC + struct.pack("<Q", len(header)) + header)
+        f.write(np.ascontiguousarray(vxa.environment, dtype=np.uint8).tobytes())
+    os.replace(temp_path, dst)
+
+    return dst
+
+def collect_settings(shared_dir: str, before: float):
+    """Removes shared .vxa files no longer linked anywhere, once per generation rather than on every write. \n
+    Files written or reused since the given time are kept, as another process may be about to link them.
+
+    Args:
+        shared_dir (str): Directory of shared .vxa files written by VXA.write.
+        before (float): Time, in seconds since the epoch, after which files are kept.
+    """
+
+    if not os.path.isdir(shared_dir):
+        return
+
+    for name in os.listdir(shared_dir):
+        path = os.path.join(shared_dir, name)
+        try:
+            stat = os.stat(path)
+            if (name.endswith(".vxa")) and (stat.st_nlink == 1) and (stat.st_mtime < before):
+                os.unlink(path)
+        except OSError:
+            pass
+
+def occupied_bounds(data: np.ndarray):
+    """Finds the bounding box of all non-empty voxels.
+
+    Args:
+        data (np.ndarray): 3D array of material IDs.
+
+    Returns:
+        (np.array): Lowest occupied X, Y and Z indices, or None if all voxels are empty.
+        (np.array): Highest occupied X, Y and Z indices plus one, or None if all voxels are empty.
+    """
+
+    if not np.any(data): return None
+
+    lo, hi = list(), list()
+    for axis in range(3):
+        occupied = np.flatnonzero(np.any(data, axis=tuple(a for a in range(3) if a != axis)))
+        lo.append(occupied[0])
+        hi.append(occupied[-1] + 1)
+
+    return np.array(lo), np.array(hi)
+
+class MaterialIndex:
+    """Class representing the mechanical properties of a palette's materials as an array."""
+
+    def __init__(self, palette: etree._Element):
+        """Reads the materials and gym defaults of a palette into arrays.
+
+        Args:
+            palette (etree._Element): Palette element of a .vxa tree.
+
+        Returns:
+            (MaterialIndex): MaterialIndex object describing the palette.
+        """
+
+        tags = list(PROPERTIES.keys())
+        materials = palette.findall("Material")
+
+        # Material IDs and their properties, one row per material
+        self.ids = np.array([int(m.get("ID")) for m in materials], dtype=int)
+        self.props = np.array([[float(m.find("Mechanical/" + t).text) for t in tags] for m in materials], dtype=float).reshape(-1, len(tags))
+        # Environment (fixed) materials are never reused for organisms
+        self.comparable = self.props[:, FIXED].astype(int) == 0
+
+        # Properties the gym specifies as constant, and their values
+        defaults = palette.find("Defaults")
+        const = [defaults is not None and defaults.find(t) is not None and bool(eval(defaults.find(t).get("isConst"))) for t in tags]
+        self.const = np.array(const, dtype=bool)
+        self.const_text = {t: defaults.find(t).text for t, c in zip(tags, const) if c}
+
+        # Lookups answered by an existing material, and materials added
+        self.hits = 0
+        self.misses = 0
+
+    def nearest(self, props: np.ndarray, diff_thresh: float):
+        """Finds the most similar organism material within a threshold of percentage difference.
+
+        Args:
+            props (np.ndarray): Mechanical properties of the candidate material.
+            diff_thresh (float): Maximum percentage difference, 0 allows only identical materials.
+
+        Returns:
+            (int): ID of the most similar material, or None if no material is similar enough.
+        """
+
+        if not np.any(self.comparable): return None
+
+        # Per-property differences as a percentage of each range
+        per_diff = (np.abs(self.props[self.comparable] - props) / PROPERTY_SPANS).sum(axis=1) / len(PROPERTY_SPANS) * 100
+        best = np.argmin(per_diff)
+
+        if per_diff[best] <= diff_thresh:
+            return int(self.ids[self.comparable][best])
+        return None
+
+    def append(self, mat_id: int, props: np.ndarray):
+        """Records a material newly added to the palette.
+
+        Args:
+            mat_id (int): Numeric ID of the material.
+            props (np.ndarray): Mechanical properties of the material.
+        """
+
+        self.ids = np.append(self.ids, mat_id)
+        self.props = np.vstack([self.props, props])
+        self.comparable = np.append(self.comparable, int(props[FIXED]) == 0)
 
 class VXA:
     """Class representing a .vxa file."""
@@ -45,13 +252,19 @@ class VXA:
             (VXA): VXA object with the specified arguments.
         """
 
-        args = deepcopy(locals())
-        defs = dict(zip(reversed(list(args.keys())[:-2]), VXA.__init__.__defaults__[1:]))
+        args = dict(locals())
+        # Pair settings with their defaults by signature order, as locals() ordering differs between Python versions
+        code = VXA.__init__.__code__
+        defs = dict(zip(code.co_varnames[2:code.co_argcount], VXA.__init__.__defaults__[1:]))
 
         self.root = None
+        self.bundle = None
 
+        # Load VXA from a compiled gym, mapping its environment
+        if (src != None) and (src.endswith(".gym")):
+            self.load_bundle(src)
         # Load VXA from file
-        if src != None:
+        elif src != None:
             parser = etree.XMLParser(remove_blank_text=True)
             self.root = etree.parse(src, parser).getroot()
         # Create VXA from scratch
@@ -153,39 +366,108 @@ class VXA:
                 
                 elem.text = str(args[k])
 
+        # Index the palette for material similarity searches
+        self.index_palette()
+        # Decode the environment once, as it is shared by every organism
+        self.load_voxelspace()
 
-    def get_voxelspace(self):
-        """Returns pre-defined voxel space as 3D array, as well as pre-defined origin
-        point for placing organisms.
+    def __getstate__(self):
+        """Pickles the VXA as its serialised tree, as lxml elements cannot be pickled. \n
+        A compiled gym's environment is pickled as the bundle's path, and mapped again when unpickled.
+        """
 
-        Returns:
-            (np.array): 3D array describing voxel space.
-            (tuple): Vector for origin point within voxel space.
+        return {"root": etree.tostring(self.root), "bundle": self.bundle}
+
+    def __setstate__(self, state):
+        """Rebuilds the VXA from its serialised tree."""
+
+        self.root = etree.fromstring(state["root"], etree.XMLParser(remove_blank_text=True))
+        self.bundle = state.get("bundle")
+        self.index_palette()
+        self.load_voxelspace()
+
+    def load_bundle(self, src: str):
+        """Reads the settings of a compiled gym, its environment is mapped by load_voxelspace.
+
+        Args:
+            src (str): Relative path of a bundle written by compile_gym.
+
+        Raises:
+            Exception: Indicates that the file is not a compiled gym.
+        """
+
+        with open(src, "rb") as f:
+            if (f.read(len(GYM_MAGIC)) != GYM_MAGIC):
+                raise Exception("ERROR: " + str(src) + " is not a compiled gym, please recompile it with compile_gym")
+            length, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode("utf-8"))
+
+        self.root = etree.fromstring(header["xml"].encode("utf-8"), etree.XMLParser(remove_blank_text=True))
+        self.bundle = (src, len(GYM_MAGIC) + 8 + length, tuple(header["shape"]), tuple(header["spawnpoint"]))
+
+    def index_palette(self):
+        """Rebuilds the in-memory material index, required after the palette is modified directly."""
+
+        self.palette = self.root.find("*/Palette")
+        self.materials = MaterialIndex(self.palette)
+
+    def load_voxelspace(self):
+        """Decodes the pre-defined voxel space and origin point from the structure tags, 
+        required after the structure is modified directly.
         """
 
+        # Settings may have changed along with the structure
+        self.invalidate_serialization()
+
+        # Read-only, so that organisms are placed into copies
+        self.environment = np.zeros(shape=(0, 0, 0), dtype=np.uint8)
+        self.environment.flags.writeable = False
+        self.spawnpoint = (0, 0, 0)
+        self.environment_bounds = None
+
         structure = self.root.find("*/Structure")
+
+        # Compiled gym, mapped read-only and shared between processes
+        if (self.bundle != None) and (structure.find("Data") == None):
+            src, offset, shape, spawnpoint = self.bundle
+            self.spawnpoint = spawnpoint
+            if (np.prod(shape) > 0):
+                self.environment = np.memmap(src, dtype=np.uint8, mode="r", offset=offset, shape=shape)
+                self.environment_bounds = occupied_bounds(self.environment)
+            return
+
         # No structure
         if (len(list(structure.iter())) < 8):
-            return np.empty(shape=(0, 0, 0)), (0, 0, 0)
+            return
 
         # Dimensions
         x_dim = int(float(structure.find("X_Voxels").text))
         y_dim = int(float(structure.find("Y_Voxels").text))
         z_dim = int(float(structure.find("Z_Voxels").text))
-        env_arr = np.zeros(shape=(x_dim, y_dim, z_dim))
         # Origin
         x_org = int(float(structure.find("X_OSpawn").text))
         y_org = int(float(structure.find("Y_OSpawn").text))
         z_org = int(float(structure.find("Z_OSpawn").text))
-        org_arr = (x_org, y_org, z_org)
+        self.spawnpoint = (x_org, y_org, z_org)
+
+        # Each layer is a string of material characters with X varying fastest
+        layers = [np.frombuffer(layer.text.encode("ascii"), dtype=np.uint8) - 48 for layer in structure.find("Data").findall("Layer")]
+        env_arr = np.stack(layers).reshape(z_dim, y_dim, x_dim).transpose(2, 1, 0).copy()
+        env_arr.flags.writeable = False
 
-        for z, layer in enumerate(structure.find("Data").findall("Layer")):
-            for xy, value in enumerate(layer.text):
-                x = int(xy % (x_dim))
-                y = int((xy - x) / (x_dim))
-                env_arr[x, y, z] = int(value)
+        self.environment = env_arr
+        self.environment_bounds = occupied_bounds(env_arr)
 
-        return env_arr, org_arr
+    def get_voxelspace(self):
+        """Returns pre-defined voxel space as 3D array, as well as pre-defined origin
+        point for placing organisms.
+
+        Returns:
+            (np.array): 3D array describing voxel space.
+            (tuple): Vector for origin point within voxel space.
+        """
+
+        return self.environment.copy(), self.spawnpoint
 
     def add_material(self, RGBA=[None, None, None, None], isEmpty=0.0, isTarget=0.0, isMeasured=1.0, Fixed=0.0, sticky=0.0, Cilia=0.0, 
                      isPaceMaker=0.0, PaceMakerPeriod=0.0, signalValueDecay=0.0, signalTimeDecay=0.0, inactivePeriod=0.0, 
@@ -219,37 +501,109 @@ class VXA:
         Returns:
             int: The numeric ID of the material.
         """
-        args = deepcopy(locals())
-
-        properties = {
-            "isTarget": lambda x : round(x),
-            "isMeasured": lambda x : round(x),
-            "Fixed": lambda x : round(x),
-            "sticky": lambda x : round(x),
-            "Cilia": lambda x : round(x),
-            "isPaceMaker": lambda x : round(x),
-            "PaceMakerPeriod": lambda x : 0.2 + (x * 0.4),
-            "signalValueDecay": lambda x : 0.0 + (x * 0.5),
-            "signalTimeDecay": lambda x : 0.2 + (x * 0.4),
-            "inactivePeriod": lambda x : 0.2 + (x * 0.4),
-            "MatModel": lambda x : round(x),
-            "Fail_Stress": lambda x : 0.0 + (x * 1.0),
-            "Elastic_Mod": lambda x : 10 ** int(4 + (x * 4)),
-            "Density": lambda x : 10 ** int(4 + (x * 4)),
-            "Poissons_Ratio": lambda x : 0 + (x * 0.5),
-            "CTE": lambda x : 10 ** -int(2 + (x * 1.0)),
-            "uStatic": lambda x : 0.0 + (x * 5.0),
-            "uDynamic": lambda x : 0.0 + (x * 1.0),
-        }
+        args = locals()
 
         # Return empty space if isEmpty flag is set
-        if (round(isEmpty) == 1.0): return "0"
+        if (round(isEmpty) == 1.0): return 0
+
+        # Scale normalised arguments into specified ranges, unless the gym specifies the property as constant
+        values = [self.materials.const_text[tag] if const else PROPERTIES[tag](args[tag]) 
+                  for tag, const in zip(PROPERTIES.keys(), self.materials.const)]
+        props = np.array([float(v) for v in values], dtype=float)
+
+        # Return pre-existing similar material
+        pre_id = self.materials.nearest(props, diff_thresh)
+        if pre_id != None:
+            self.materials.hits += 1
+            return pre_id
+        self.materials.misses += 1
+
+        return self.insert_material(values, props, RGBA)
+
+    def add_materials(self, outputs: np.ndarray, diff_thresh: float = 0.0):
+        """Adds a batch of materials to the .vxa palette, as add_material would for each row in turn. \n
+        Properties are scaled a column at a time, and identical materials within the batch are checked against the palette once,
+        so always share the ID found for their first row.
+
+        Args:
+            outputs (np.ndarray): (N x 19) array of normalised (0.0-1.0) values, with columns ordered as MATERIAL_OUTPUTS.
+            diff_thresh (float, optional): Threshold for material similarity, 0 allows identical materials and 100 requires maximal difference. Defaults to 0.0.
+
+        Returns:
+            (np.array): Numeric ID of each row's material, 0 for empty space.
+        """
+
+        outputs = np.asarray(outputs, dtype=float).reshape(-1, len(MATERIAL_OUTPUTS))
+        mat_ids = np.zeros(len(outputs), dtype=int)
+
+        # Scale normalised columns into specified ranges, unless the gym specifies the property as constant
+        props = np.empty(shape=(len(outputs), len(PROPERTIES)))
+        for p, (tag, const) in enumerate(zip(PROPERTIES.keys(), self.materials.const)):
+            props[:, p] = float(self.materials.const_text[tag]) if const else PROPERTY_ARRAYS[tag](outputs[:, MATERIAL_OUTPUTS.index(tag)])
+
+        # Empty rows stay 0, and the rest are resolved once per distinct material, in order of first appearance
+        solid = np.flatnonzero(np.round(outputs[:, MATERIAL_OUTPUTS.index("isEmpty")]) != 1.0)
+        if (len(solid) == 0):
+            return mat_ids
+        unique, first, inverse = np.unique(props[solid], axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        unique, first = unique[order], first[order]
+        inverse = np.argsort(order)[inverse.ravel()]
+
+        # Differences between each distinct material and the palette, and between each other, as in MaterialIndex.nearest
+        palette_props = self.materials.props[self.materials.comparable]
+        palette_ids = self.materials.ids[self.materials.comparable]
+        palette_diff = (np.abs(unique[:, None, :] - palette_props[None, :, :]) / PROPERTY_SPANS).sum(axis=2) / len(PROPERTY_SPANS) * 100
+        batch_diff = (np.abs(unique[:, None, :] - unique[None, :, :]) / PROPERTY_SPANS).sum(axis=2) / len(PROPERTY_SPANS) * 100
+        comparable = unique[:, FIXED].astype(int) == 0
+
+        # Committed in order, as each added material may be the nearest for those after it
+        palette_size = len(self.materials.ids)
+        unique_ids = np.zeros(len(unique), dtype=int)
+        added = list()
+        for u in range(len(unique)):
+            best_id, best_diff = None, np.inf
+            if (len(palette_ids) > 0):
+                best = np.argmin(palette_diff[u])
+                best_id, best_diff = int(palette_ids[best]), palette_diff[u, best]
+            if (len(added) > 0) and (batch_diff[u, added].min() < best_diff):
+                best = added[int(np.argmin(batch_diff[u, added]))]
+                best_id, best_diff = int(unique_ids[best]), batch_diff[u, best]
+
+            if (best_id != None) and (best_diff <= diff_thresh):
+                unique_ids[u] = best_id
+                continue
+
+            row = outputs[solid[first[u]]]
+            values = [self.materials.const_text[tag] if const else PROPERTIES[tag](row[MATERIAL_OUTPUTS.index(tag)]) 
+                      for tag, const in zip(PROPERTIES.keys(), self.materials.const)]
+            unique_ids[u] = self.insert_material(values, unique[u])
+            if (comparable[u]):
+                added.append(u)
+
+        misses = len(self.materials.ids) - palette_size
+        self.materials.hits += len(solid) - misses
+        self.materials.misses += misses
+        mat_ids[solid] = unique_ids[inverse]
+        return mat_ids
+
+    def insert_material(self, values: list, props: np.ndarray, RGBA: list = [None, None, None, None]):
+        """Appends a material to the palette and its index, without checking for similar materials.
+
+        Args:
+            values (list): Scaled value of each property, as written to the palette.
+            props (np.ndarray): Mechanical properties of the material.
+            RGBA (list, optional): List of 0.0-0.1 RGBA ranges, randomised if none given. Defaults to [None, None, None, None].
+
+        Returns:
+            int: The numeric ID of the material.
+        """
 
         # === Palette ===
-        palette = self.root.find("*/Palette")
         # ==== Material ====
-        mat_ID = len(palette.findall("Material")) + 1
-        new_mat = etree.Element("Material")
+        # Gym IDs need not run from 1, so follow the highest
+        mat_ID = (int(np.max(self.materials.ids)) if (len(self.materials.ids) > 0) else 0) + 1
+        new_mat = etree.SubElement(self.palette, "Material")
         new_mat.set("ID", str(mat_ID))
         etree.SubElement(new_mat, "Name").text = str("Generated")
 
@@ -262,50 +616,186 @@ class VXA:
         etree.SubElement(display, "Alpha").text = str(1)
 
         # ===== Mechanical =====
-        defaults = palette.find(".//Defaults")
         new_mech = etree.SubElement(new_mat, "Mechanical")
-        # Iterate through mechanical properties
-        for tag in properties.keys():
-            # Check if gym specifies this property as constant
-            if (bool(eval(defaults.find(".//"+tag).get("isConst"))) == True):
-                # Set gym specified constant value
-                etree.SubElement(new_mech, tag).text = str(defaults.find(".//"+tag).text)
-            else:
-                # Scale normalised argument into specified range and set property value
-                etree.SubElement(new_mech, tag).text = str(properties[tag](args[tag]))
-
-        # Check that new_mat is distinct enough from others
-        for m, pre_mat in enumerate(palette.findall("Material")):
-            pre_mech = pre_mat.find("Mechanical")
-            all_diff = 0
-            # Skip environment materials
-            if int(float(pre_mech.find("Fixed").text)) == 0:
-                # Calculate per-property similarity
-                for p, prop in enumerate(pre_mech):
-                    abs_diff = abs(float(pre_mech.find(prop.tag).text) - float(new_mech.find(prop.tag).text))
-                    if (abs_diff == 0): all_diff += 0
-                    else:               all_diff += (abs_diff / abs(properties[prop.tag](0) - properties[prop.tag](1)))
-                # Return pre-existing similar material
-                if (all_diff == 0): per_diff = 0
-                else:               per_diff = (all_diff / len(properties.values())) * 100
-                
-                if per_diff <= diff_thresh:
-                    return pre_mat.attrib["ID"]
+        for tag, value in zip(PROPERTIES.keys(), values):
+            etree.SubElement(new_mech, tag).text = str(value)
 
-        # New mat is distinct enough, so append to palette
-        palette.append(new_mat)
+        # New mat is distinct enough, so record it in the index
+        self.materials.append(mat_ID, props)
         return mat_ID
 
-    def write(self, filename='base.vxa'):
-        """Writes the VXA tree to a file, with proper indenting.
+    def compact_palette(self, morphologies: list, pool_size: int = 0):
+        """Removes organism materials no longer referenced, keeping the palette (and its .vxa file) the size of a single population. \n
+        Gym materials keep their IDs, and the remaining organism materials are renumbered densely after them,
+        referenced materials first, and the pool of unreferenced materials is shortened so that IDs stay within the range of the .vxd encoding.
 
         Args:
-            filename (str, optional): Filename for the .vxa file. Defaults to 'base.vxa'.
+            morphologies (list): 3D arrays of material IDs for every organism in the population.
+            pool_size (int, optional): Number of unreferenced materials kept for reuse by later populations, the most recently added first. Defaults to 0.
+
+        Raises:
+            ValueError: Indicates that the referenced materials cannot be numbered within the range of the .vxd encoding.
+
+        Returns:
+            (list): Morphologies with their material IDs remapped into the compacted palette.
+        """
+
+        materials = self.palette.findall("Material")
+        if (len(materials) == 0):
+            return morphologies
+        ids = self.materials.ids
+
+        # Gym materials are kept whether or not any voxel uses them
+        generated = np.array([m.findtext("Name") == "Generated" for m in materials], dtype=bool)
+        used = np.unique(np.concatenate([np.asarray(m).ravel() for m in morphologies])) if (len(morphologies) > 0) else []
+        referenced = generated & np.isin(ids, used)
+
+        # Organism materials follow the gym materials, checked before the palette is changed
+        n_gym = int(np.sum(~generated))
+        first_id = (int(np.max(ids[~generated])) if (n_gym > 0) else 0) + 1
+        last_id = first_id + int(np.sum(referenced)) - 1
+        if (last_id > MAX_MATERIAL_ID):
+            raise ValueError("ERROR: " + str(int(np.sum(referenced))) + " referenced materials would take IDs up to " + str(last_id) + 
+                             ", past the .vxd encoding limit of " + str(MAX_MATERIAL_ID))
+
+        # Pool of the most recently added unreferenced materials, in palette order
+        pool_size = min(pool_size, MAX_MATERIAL_ID - last_id)
+        pooled = np.sort(np.flatnonzero(generated & ~referenced)[::-1][:pool_size])
+        order = np.concatenate([np.flatnonzero(~generated), np.flatnonzero(referenced), pooled]).astype(int)
+
+        # Dense IDs for organism materials
+        new_ids = ids.copy()
+        new_ids[order[n_gym:]] = first_id + np.arange(len(order) - n_gym)
+        lookup = np.zeros(np.max(ids) + 1, dtype=int)
+        lookup[ids[order]] = new_ids[order]
+
+        # Rebuild the palette in the new order, in place of the old materials
+        position = self.palette.index(materials[0])
+        for material in materials:
+            self.palette.remove(material)
+        for offset, i in enumerate(order):
+            materials[i].set("ID", str(new_ids[i]))
+            self.palette.insert(position + offset, materials[i])
+
+        hits, misses = self.materials.hits, self.materials.misses
+        self.index_palette()
+        self.materials.hits, self.materials.misses = hits, misses
+
+        return [lookup[np.asarray(m)] for m in morphologies]
+
+    def get_sim_time(self):
+        """Returns the simulation duration, the constant of the stop condition formula.
+
+        Returns:
+            (float): Simulation duration in seconds.
+        """
+
+        return float(self.root.find("Simulator/StopCondition/StopConditionFormula//mtCONST").text)
+
+    def set_sim_time(self, sim_time: float):
+        """Rewrites the constant of the stop condition formula, changing the simulation duration.
+
+        Args:
+            sim_time (float): Simulation duration in seconds.
+        """
+
+        self.root.find("Simulator/StopCondition/StopConditionFormula//mtCONST").text = str(sim_time)
+        self.invalidate_serialization()
+
+    def encode_environment(self):
+        """Adds the layers of a compiled gym's mapped environment to the structure, as they were in the .vxa gym.
+
+        Returns:
+            (etree._Element): The added data element, or None if the structure already holds its layers.
+        """
+
+        structure = self.root.find("*/Structure")
+        if (self.bundle == None) or (structure.find("Data") != None) or (self.environment.size == 0):
+            return None
+
+        # Each layer is a string of material characters with X varying fastest
+        data = etree.SubElement(structure, "Data")
+        layers = (np.asarray(self.environment).transpose(2, 1, 0) + 48).reshape(self.environment.shape[2], -1)
+        for layer in layers:
+            etree.SubElement(data, "Layer").text = layer.tobytes().decode("ascii")
+        return data
+
+    def invalidate_serialization(self):
+        """Discards the serialised settings, required after any settings other than the palette are modified directly."""
+
+        self.static_xml = None
+
+    def serialize(self):
+        """Serialises the VXA tree with proper indenting. \n
+        Everything but the palette is serialised once and cached, as only the palette changes between generations.
+
+        Returns:
+            (bytes): Serialised .vxa file.
         """
 
         # If no material has been added, add default material
-        if len(self.root.find("*/Palette").findall("Material")) == 0:
+        if len(self.materials.ids) == 0:
             self.add_material()
-        
-        with open(filename, 'w+') as f:
-            f.write(etree.tostring(self.root, encoding="unicode", pretty_print=True))
+
+        if (self.static_xml == None):
+            # Serialise the tree with a marker in place of the palette
+            marker = etree.Comment("PALETTE")
+            self.palette.getparent().replace(self.palette, marker)
+            # Compiled gyms are written with the layers of their mapped environment
+            data = self.encode_environment()
+            try:
+                static = etree.tostring(self.root, pretty_print=True)
+            finally:
+                marker.getparent().replace(marker, self.palette)
+                if (data != None):
+                    data.getparent().remove(data)
+
+            head, tail = static.split(b"<!--PALETTE-->")
+            indent = head[head.rfind(b"\n") + 1:]
+            self.static_xml = (head, tail[1:], indent)
+
+        head, tail, indent = self.static_xml
+        palette = etree.tostring(self.palette, pretty_print=True, with_tail=False)
+        # Indent the palette to its depth in the tree, values never span lines
+        return head + palette[:-1].replace(b"\n", b"\n" + indent) + b"\n" + tail
+
+    def write(self, filename='base.vxa', shared_dir: str = None):
+        """Writes the VXA tree to a file, with proper indenting. \n
+        With a shared directory, each distinct file is written there once and linked to every path it is written to,
+        so shards, generations and trials with the same settings and palette share a single file on disk.
+
+        Args:
+            filename (str, optional): Filename for the .vxa file. Defaults to 'base.vxa'.
+            shared_dir (str, optional): Directory of shared .vxa files, which may be used by several processes. Defaults to None.
+        """
+
+        data = self.serialize()
+
+        if (shared_dir != None):
+            os.makedirs(shared_dir, exist_ok=True)
+            shared_path = os.path.join(shared_dir, hashlib.sha1(data).hexdigest() + ".vxa")
+
+            # Written under a unique name and renamed, so other processes never see a partial file
+            if not os.path.exists(shared_path):
+                temp_path = shared_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, shared_path)
+            else:
+                # Reused files are marked as recent, so they are not collected before being linked
+                try:
+                    os.utime(shared_path)
+                except OSError:
+                    pass
+
+            if os.path.exists(filename):
+                os.unlink(filename)
+            try:
+                os.link(shared_path, filename)
+                return
+            except OSError:
+                # Links unsupported, or the shared file was removed by another process
+                pass
+
+        with open(filename, 'wb') as f:
+            f.write(data)
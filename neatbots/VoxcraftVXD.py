@@ -2,47 +2,86 @@ import numpy as np
 from lxml import etree
 import os
 
+# Phase offsets are written with 3 decimal places, looked up rather than formatted per voxel
+PHASE_STEPS = 1000
+PHASE_STRINGS = np.array([b"%.3f" % (i / PHASE_STEPS) for i in range(-PHASE_STEPS, PHASE_STEPS + 1)])
+
+# Materials are written as the character offset from '0' by their ID, those past ASCII taking several bytes in UTF-8
+MAX_MATERIAL_ID = 255 - 48
+MATERIAL_CHARS = np.array([chr(48 + i).encode("utf-8") for i in range(MAX_MATERIAL_ID + 1)])
+
 class VXD:
+    """Class representing a .vxd file."""
+
+    # Serialised document openings (VXD and RecordHistory tags), built once per set of record settings
+    templates = dict()
 
     def __init__(self):
-        root = etree.XML("<VXD></VXD>")
-        self.tree = etree.ElementTree(root)
-    
+        self.head = b"<VXD>\n"
+        self.structure = b""
+        self.phase_offset = b""
+
     def set_tags(self, RecordVoxel=1, RecordLink=0, RecordFixedVoxels=1, RecordStepSize=100):
-        root = self.tree.getroot()
+        key = (RecordVoxel, RecordLink, RecordFixedVoxels, RecordStepSize)
 
-        history = etree.SubElement(root, "RecordHistory")
-        history.set('replace', 'VXA.Simulator.RecordHistory')
-        etree.SubElement(history, "RecordStepSize").text = str(RecordStepSize) #Capture image every 100 time steps
-        etree.SubElement(history, "RecordVoxel").text = str(RecordVoxel) # Add voxels to the visualization
-        etree.SubElement(history, "RecordLink").text = str(RecordLink) # Add links to the visualization
-        etree.SubElement(history, "RecordFixedVoxels").text = str(RecordFixedVoxels) 
+        if key not in VXD.templates:
+            root = etree.XML("<VXD></VXD>")
+            history = etree.SubElement(root, "RecordHistory")
+            history.set('replace', 'VXA.Simulator.RecordHistory')
+            etree.SubElement(history, "RecordStepSize").text = str(RecordStepSize) #Capture image every 100 time steps
+            etree.SubElement(history, "RecordVoxel").text = str(RecordVoxel) # Add voxels to the visualization
+            etree.SubElement(history, "RecordLink").text = str(RecordLink) # Add links to the visualization
+            etree.SubElement(history, "RecordFixedVoxels").text = str(RecordFixedVoxels)
+            # Keep everything before the closing VXD tag
+            VXD.templates[key] = etree.tostring(root, pretty_print=True)[:-len(b"</VXD>\n")]
 
-    def set_data(self, data):
-        root = self.tree.getroot()
+        self.head = VXD.templates[key]
 
+    def set_data(self, data):
         X_Voxels, Y_Voxels, Z_Voxels = data.shape
-        body_flatten = np.zeros((X_Voxels*Y_Voxels, Z_Voxels),dtype=str)
-        for z in range(Z_Voxels):
-            for y in range(Y_Voxels):
-                for x in range(X_Voxels):
-                    body_flatten[y*(X_Voxels)+x, z] = chr(int(48+data[x, y, z]))
-            #body_flatten[:,i] = data[:,:,i].flatten()
-        
-        structure = etree.SubElement(root, "Structure")
-        structure.set('replace', 'VXA.VXC.Structure')
-        structure.set('Compression', 'ASCII_READABLE')
-
-        etree.SubElement(structure, "X_Voxels").text = str(X_Voxels)
-        etree.SubElement(structure, "Y_Voxels").text = str(Y_Voxels)
-        etree.SubElement(structure, "Z_Voxels").text = str(Z_Voxels)
+
+        # Materials are encoded as single characters from '0'
+        if (data.size > 0) and ((np.min(data) < 0) or (np.max(data) > MAX_MATERIAL_ID)):
+            raise ValueError("Material IDs must be between 0 and " + str(MAX_MATERIAL_ID) + " to be encoded")
+
+        # One row of characters per layer, with X varying fastest
+        body_flatten = np.asarray(data, dtype=np.int64).transpose(2, 1, 0).reshape(Z_Voxels, X_Voxels*Y_Voxels)
+        if (data.size > 0) and (np.max(data) < 128 - 48):
+            layers = [layer.tobytes() for layer in (body_flatten + 48).astype(np.uint8)]
+        else:
+            layers = [b"".join(MATERIAL_CHARS[layer].tolist()) for layer in body_flatten]
+        # A layer containing the CDATA terminator is split across two sections
+        layers = [layer.replace(b"]]>", b"]]]]><![CDATA[>") for layer in layers]
 
         # set body data
-        data_tag = etree.SubElement(structure, "Data")
-        for i in range(Z_Voxels):
-            string = "".join([f"{c}" for c in body_flatten[:,i]])
-            etree.SubElement(data_tag, "Layer").text = etree.CDATA(string)
+        self.structure = b"".join(
+            [b'  <Structure replace="VXA.VXC.Structure" Compression="ASCII_READABLE">\n',
+             b"    <X_Voxels>%d</X_Voxels>\n" % X_Voxels,
+             b"    <Y_Voxels>%d</Y_Voxels>\n" % Y_Voxels,
+             b"    <Z_Voxels>%d</Z_Voxels>\n" % Z_Voxels,
+             b"    <Data>\n"] +
+            [b"      <Layer><![CDATA[" + layer + b"]]></Layer>\n" for layer in layers] +
+            [b"    </Data>\n"])
+
+    def set_phase_offset(self, data):
+        """Sets the actuation phase offset of each voxel, shaped like the structure data.
+
+        Args:
+            data (np.ndarray): 3D array of phase offsets between -1 and 1.
+        """
+
+        X_Voxels, Y_Voxels, Z_Voxels = data.shape
+
+        # Comma separated values per layer, with X varying fastest
+        steps = np.rint(np.clip(data, -1.0, 1.0) * PHASE_STEPS).astype(np.int64) + PHASE_STEPS
+        phase_flatten = PHASE_STRINGS[steps.transpose(2, 1, 0).reshape(Z_Voxels, X_Voxels*Y_Voxels)]
+
+        self.phase_offset = b"".join(
+            [b"    <PhaseOffset>\n"] +
+            [b"      <Layer><![CDATA[" + b",".join(layer.tolist()) + b"]]></Layer>\n" for layer in phase_flatten] +
+            [b"    </PhaseOffset>\n"])
 
     def write(self, filename='robot.vxd'):
-        with open(filename, 'w+') as f:
-            f.write(etree.tostring(self.tree, encoding="unicode", pretty_print=True))    
\ No newline at end of file
+        structure = (self.structure + self.phase_offset + b"  </Structure>\n") if (self.structure) else b""
+        with open(filename, 'wb') as f:
+            f.write(self.head + structure + b"</VXD>\n")
@@ -0,0 +1,208 @@
+import copy
+import os
+import pickle
+import sys
+import traceback
+import numpy as np
+from lxml import etree
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from neatbots.simulation import Simulation
+from neatbots.organism import Organism
+from neatbots.VoxcraftVXA import VXA
+
+class EliteRecord:
+    """Class representing an elite organism as it was generated and scored, without its phenotype networks."""
+
+    def __init__(self, org_id: str, organism: Organism, vxa: VXA):
+        """Constructs an EliteRecord object from an organism which has just been evaluated.
+
+        Args:
+            org_id (str): ID of the organism.
+            organism (Organism): Evaluated organism, holding the morphology and phase offsets it was simulated with.
+            vxa (VXA): Instance of VXA class containing the materials referenced by the morphology.
+
+        Returns:
+            (EliteRecord): EliteRecord object describing the organism.
+        """
+
+        self.org_id = org_id
+        self.fitness = organism.fitness
+
+        # Materials are numbered locally from 1, as palette IDs change between generations, in the smallest type holding them all
+        morphology = np.asarray(organism.morphology)
+        mat_ids, local = np.unique(morphology.ravel(), return_inverse=True)
+        self.morphology = (local.reshape(morphology.shape) + (1 if (mat_ids[0] != 0) else 0)).astype(np.min_scalar_type(len(mat_ids)))
+
+        # Resolved material properties, as the palette's own elements without their IDs
+        self.materials = list()
+        for mat_id in mat_ids[mat_ids != 0]:
+            material = copy.deepcopy(vxa.palette.find("Material[@ID='%d']" % mat_id))
+            del material.attrib["ID"]
+            self.materials.append(etree.tostring(material))
+
+        self.phase_offset = None if (organism.phase_offset is None) else np.asarray(organism.phase_offset, dtype=np.float32)
+
+        # Genomes are kept serialised, as they are only needed to continue evolving from the elite
+        self.morphology_gen = pickle.dumps(organism.morphology_gen, protocol=pickle.HIGHEST_PROTOCOL)
+        self.controlsys_gen = pickle.dumps(organism.controlsys_gen, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def genomes(self):
+        """Deserialises the genomes of the elite.
+
+        Returns:
+            (NEAT.Genome): The morphology genome of the organism.
+            (NEAT.Genome): The control system genome of the organism.
+        """
+
+        return pickle.loads(self.morphology_gen), pickle.loads(self.controlsys_gen)
+
+class EliteArchive:
+    """Class representing the elite organisms of an evolution process, which can be re-simulated from their records."""
+
+    def __init__(self, path: str = None):
+        """Constructs an EliteArchive object, loading any records stored at the path.
+
+        Args:
+            path (str, optional): Relative path of the archive file, kept only in memory if None. Defaults to None.
+
+        Returns:
+            (EliteArchive): EliteArchive object with the specified arguments.
+        """
+
+        self.path = path
+        self.records = dict()
+
+        if (path != None) and (os.path.exists(path)):
+            with open(path, "rb") as f:
+                self.records = pickle.load(f)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, org_id: str, organism: Organism, vxa: VXA):
+        """Records an elite organism, which must be recorded before the palette is next modified.
+
+        Args:
+            org_id (str): ID of the organism.
+            organism (Organism): Evaluated organism.
+            vxa (VXA): Instance of VXA class containing the materials referenced by the organism's morphology.
+        """
+
+        self.records[org_id] = EliteRecord(org_id, organism, vxa)
+
+    def save(self, path: str = None):
+        """Writes the records to the archive file, replacing it once complete.
+
+        Args:
+            path (str, optional): Relative path of the archive file, this archive's path if None. Defaults to None.
+        """
+
+        path = path if (path != None) else self.path
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self.records, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def replay_vxa(self, vxa: VXA):
+        """Creates a copy of the simulation settings whose palette holds only the gym's materials and those of the elites.
+
+        Args:
+            vxa (VXA): Instance of VXA class containing simulation execution settings.
+
+        Returns:
+            (VXA): Instance of VXA class for re-simulating the elites.
+            (Dict[str, np.ndarray]): Lookup from each record's local material numbers to palette IDs.
+        """
+
+        replay = VXA.__new__(VXA)
+        replay.__setstate__(vxa.__getstate__())
+
+        # Gym materials keep their IDs, as the environment refers to them
+        for material in replay.palette.findall("Material"):
+            if (material.findtext("Name") == "Generated"):
+                replay.palette.remove(material)
+        gym_ids = [int(material.get("ID")) for material in replay.palette.findall("Material")]
+
+        # Materials shared between elites are only added once
+        parser = etree.XMLParser(remove_blank_text=True)
+        added = dict()
+        lookups = dict()
+        for org_id, record in self.records.items():
+            lookup = [0]
+            for material in record.materials:
+                if (material not in added):
+                    added[material] = max(gym_ids + list(added.values()) + [0]) + 1
+                    elem = etree.fromstring(material, parser)
+                    elem.set("ID", str(added[material]))
+                    replay.palette.append(elem)
+                lookup.append(added[material])
+            lookups[org_id] = np.array(lookup, dtype=int)
+
+        replay.index_palette()
+        return replay, lookups
+
+    def replay(self, sim: Simulation, generation_dir: str = "elites", label: str = "elite", step_size: int = 100):
+        """Re-simulates the elites from their records, recording history files, without rebuilding their phenotypes
+        or modifying the simulation's palette.
+
+        Args:
+            sim (Simulation): The simulation object to use when simulating organisms.
+            generation_dir (str, optional): Name of folder to store encodings, results and histories in. Defaults to "elites".
+            label (str, optional): Name given to each organism. Defaults to "elite".
+            step_size (int, optional): Number of steps to record in history file. Defaults to 100.
+
+        Returns:
+            (Dict[str, int]): Dictionary of id-fitness pairs describing organism performance.
+        """
+
+        # Separate settings, so that replaying can run alongside evolution
+        replay_sim = copy.copy(sim)
+        replay_sim.vxa, lookups = self.replay_vxa(sim.vxa)
+
+        generation_path = replay_sim.create_directory(generation_dir)
+        for org_id, record in self.records.items():
+            replay_sim.encode_morphology(lookups[org_id][record.morphology], generation_path, label +"_"+ org_id, step_size,
+                                         record.phase_offset)
+        replay_sim.write_settings(generation_path)
+
+        with sim.recorder.stage("simulate_generation"):
+            fitness_scores = replay_sim.simulate_generation(generation_path)
+        replay_sim.release_directory(generation_path, persist=True)
+
+        sim.recorder.end_generation(generation_dir, palette_size=len(replay_sim.vxa.materials.ids))
+        return fitness_scores
+
+    def replay_async(self, sim: Simulation, generation_dir: str = "elites", label: str = "elite", step_size: int = 100):
+        """Re-simulates the elites from their records in a background thread.
+
+        Args:
+            sim (Simulation): The simulation object to use when simulating organisms.
+            generation_dir (str, optional): Name of folder to store encodings, results and histories in. Defaults to "elites".
+            label (str, optional): Name given to each organism. Defaults to "elite".
+            step_size (int, optional): Number of steps to record in history file. Defaults to 100.
+
+        Returns:
+            (Future): Future of the id-fitness pairs returned by replay.
+        """
+
+        # Records are copied, so that the archive can keep growing while replaying
+        archive = EliteArchive()
+        archive.records = dict(self.records)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(archive.replay, sim, generation_dir, label, step_size)
+        future.add_done_callback(report_replay)
+        executor.shutdown(wait=False)
+        return future
+
+def report_replay(future: Future):
+    """Reports a failed background replay, which would otherwise be lost unless its result is requested.
+
+    Args:
+        future (Future): Finished future returned by EliteArchive.replay_async.
+    """
+
+    error = None if future.cancelled() else future.exception()
+    if (error != None):
+        print("ERROR: Elite replay failed", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
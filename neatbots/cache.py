@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import time
+import numpy as np
+from lxml import etree
+
+from neatbots.VoxcraftVXA import VXA
+
+class FitnessCache:
+    """Class representing an on-disk cache of fitness scores, keyed by simulated phenotype."""
+
+    def __init__(self, path: str = "./fitness_cache.sqlite", max_entries: int = 100000):
+        """Constructs a FitnessCache object, opening or creating the cache file.
+
+        Args:
+            path (str, optional): Relative path for the cache file, which may be shared between runs. Defaults to "./fitness_cache.sqlite".
+            max_entries (int, optional): Number of entries kept, evicting the least recently used. Defaults to 100000.
+
+        Returns:
+            (FitnessCache): FitnessCache object with the specified arguments.
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+
+        # Wait on other processes writing to the same file, callers serialise access between threads
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, fitness REAL, used INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS fitness_used ON fitness (used)")
+        self.conn.commit()
+
+        # Statistics for this process
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        """Pickles the cache as its settings, as database connections cannot be pickled."""
+
+        return {"path": self.path, "max_entries": self.max_entries}
+
+    def __setstate__(self, state):
+        """Reopens the cache file in another process."""
+
+        self.__init__(**state)
+
+    def settings_key(self, vxa: VXA):
+        """Hashes the simulation settings which affect fitness (simulator, thermal and gravity settings).
+
+        Args:
+            vxa (VXA): Instance of VXA class containing simulation execution settings.
+
+        Returns:
+            (str): Hex digest of the settings.
+        """
+
+        digest = hashlib.sha256()
+        for section in ("Simulator", "Environment", "VXC/Lattice"):
+            elem = vxa.root.find(section)
+            if (elem != None):
+                digest.update(etree.tostring(elem, method="c14n"))
+        return digest.hexdigest()
+
+    def phenotype_key(self, data: np.ndarray, vxa: VXA, settings: str, phase_offset: np.ndarray = None):
+        """Hashes a placed morphology canonically, so that identical bodies match whatever their material IDs.
+
+        Args:
+            data (np.ndarray): 3D array of material IDs, as placed into the environment and cropped.
+            vxa (VXA): Instance of VXA class containing the materials referenced by the data.
+            settings (str): Hash of the simulation settings, from settings_key.
+            phase_offset (np.ndarray, optional): 3D array of actuation phase offsets, placed like the data. Defaults to None.
+
+        Returns:
+            (str): Hex digest of the phenotype.
+        """
+
+        # Renumber materials in order of first appearance
+        mat_ids, first, inverse = np.unique(data.ravel(), return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        digest = hashlib.sha256(settings.encode("ascii"))
+        digest.update(np.array(data.shape, dtype=np.int64).tobytes())
+        digest.update(rank[inverse.ravel()].astype(np.int64).tobytes())
+
+        # Resolved properties of each material, with empty space as zeros
+        for mat_id in mat_ids[order]:
+            props = vxa.materials.props[vxa.materials.ids == mat_id]
+            digest.update(props.tobytes() if (mat_id != 0) else b"empty")
+
+        # Identical bodies with different controllers behave differently
+        if (phase_offset is not None):
+            digest.update(np.asarray(phase_offset, dtype=np.float64).tobytes())
+
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Looks up the fitness score of a phenotype.
+
+        Args:
+            key (str): Hash of the phenotype.
+
+        Returns:
+            (float): Cached fitness score, or None if the phenotype has not been simulated.
+        """
+
+        row = self.conn.execute("SELECT fitness FROM fitness WHERE key = ?", (key,)).fetchone()
+        if (row == None):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE fitness SET used = ? WHERE key = ?", (time.time_ns(), key))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, fitnesses: dict):
+        """Stores the fitness scores of simulated phenotypes, evicting the least recently used beyond max_entries.
+
+        Args:
+            fitnesses (dict): Dictionary of phenotype hashes and fitness scores.
+        """
+
+        used = time.time_ns()
+        self.conn.executemany("INSERT OR REPLACE INTO fitness (key, fitness, used) VALUES (?, ?, ?)",
+                              [(k, float(f), used) for k, f in fitnesses.items()])
+
+        excess = self.conn.execute("SELECT COUNT(*) FROM fitness").fetchone()[0] - self.max_entries
+        if (excess > 0):
+            self.conn.execute("DELETE FROM fitness WHERE key IN (SELECT key FROM fitness ORDER BY used LIMIT ?)", (excess,))
+        self.conn.commit()
+
+    def hit_rate(self):
+        """Returns the proportion of lookups answered by the cache in this process.
+
+        Returns:
+            (float): Hits divided by lookups, 0 if there have been no lookups.
+        """
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if (lookups > 0) else 0.0
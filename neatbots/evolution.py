@@ -1,18 +1,70 @@
 import copy
 import os
 import time
+import pickle
+import shutil
 import numpy as np
 import pandas as pd
 from typing import Dict
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 import MultiNEAT as NEAT
 
 from neatbots.simulation import Simulation
-from neatbots.organism import Organism
+from neatbots.organism import Organism, resolve_materials
+from neatbots.cache import FitnessCache
+from neatbots.recorder import Recorder
+from neatbots.archive import EliteArchive
+from neatbots.surrogate import Surrogate, morphology_features, N_FEATURES
+
+# Simulation object of each worker process
+worker_sim = None
+
+def init_worker(sim: Simulation):
+    """Stores the simulation object used by a worker process.
+
+    Args:
+        sim (Simulation): Copy of the simulation object used when encoding organisms.
+    """
+
+    global worker_sim
+    worker_sim = sim
+
+def propose_organism(organism: Organism):
+    """Worker task which builds and queries an organism's morphology and control system networks.
+
+    Args:
+        organism (Organism): Organism to generate.
+
+    Returns:
+        (tuple): Distinct network outputs proposed as materials, and a 3D array of indices into the proposals for each voxel.
+        (np.ndarray): 3D array of actuation phase offsets for each voxel.
+        (dict): Seconds spent in each stage of generating the organism.
+    """
+
+    proposal = organism.propose_materials()
+    phase_offset, _ = organism.generate_controlsys()
+    return proposal, phase_offset, organism.timings
+
+def encode_organism(morphology: np.ndarray, generation_path: str, label: str, step_size: int, phase_offset: np.ndarray = None):
+    """Worker task which encodes a morphology into a .vxd file.
+
+    Args:
+        morphology (np.ndarray): 3D array of material IDs.
+        generation_path (str): Path for storing encodings.
+        label (str): Filename for encoding.
+        step_size (int): Number of timesteps to record.
+        phase_offset (np.ndarray, optional): 3D array of actuation phase offsets for each voxel. Defaults to None.
+    """
+
+    worker_sim.encode_morphology(morphology, generation_path, label, step_size, phase_offset)
 
 class Evolution:
     """Class representing an evolution process."""
 
-    def __init__(self, sim: Simulation, params:NEAT.Parameters = None, gen_n: int = 3, pop_s: int = 8, W: int = 2, H: int = 2, D: int = 2):
+    def __init__(self, sim: Simulation, params:NEAT.Parameters = None, gen_n: int = 3, pop_s: int = 8, W: int = 2, H: int = 2, D: int = 2, 
+                 workers: int = 0, cache: FitnessCache = None, persist_gens: tuple = (), checkpoint_path: str = None, checkpoint_every: int = 1, 
+                 recorder: Recorder = None, palette_pool: int = None, surrogate: Surrogate = None, fidelities: tuple = None, promote: float = 0.5):
         """Constructs an Evolution object.
 
         Args:
@@ -22,6 +74,24 @@ class Evolution:
             W (int): The width of each organisms possible space.
             H (int): The height of each organisms possible space.
             D (int): The depth of each organisms possible space.
+            workers (int, optional): Number of worker processes generating and encoding organisms, 0 or 1 for serial. Defaults to 0.
+            cache (FitnessCache, optional): Cache of fitness scores for previously simulated phenotypes. Defaults to None.
+            persist_gens (tuple, optional): Generation numbers kept in storage when the simulation uses scratch directories, 
+                                            elites are always kept. Defaults to ().
+            checkpoint_path (str, optional): Relative path of the directory storing checkpoints, outside the simulation's storage directory. 
+                                             No checkpoints are written if None. Defaults to None.
+            checkpoint_every (int, optional): Number of generations between checkpoints. Defaults to 1.
+            recorder (Recorder, optional): Recorder of per-stage timings and counters, disabled if None. Defaults to None.
+            palette_pool (int, optional): Number of unreferenced materials kept when compacting the palette each generation, 
+                                          the palette only grows if None. Defaults to None.
+            surrogate (Surrogate, optional): Model of fitness used to skip simulating organisms predicted to perform poorly, 
+                                             every organism is simulated if None. Defaults to None.
+            fidelities (tuple, optional): Strictly increasing fractions of the simulation duration ending at 1.0, each population being simulated 
+                                          at the first and the best promoted to each next, only the full duration is simulated if None. Defaults to None.
+            promote (float, optional): Fraction of organisms promoted to each next fidelity. Defaults to 0.5.
+
+        Raises:
+            ValueError: Indicates that the fidelities do not increase to the full simulation duration.
 
         Returns:
             (Evolution): Evolution object with the specified arguments.
@@ -37,6 +107,48 @@ class Evolution:
         self.H = H
         self.D = D
 
+        # Worker processes are started on first use
+        self.workers = workers
+        self.pool = None
+        # Guards the shared palette when organisms are generated concurrently
+        self.palette_lock = Lock()
+
+        # Fitness scores of previously simulated phenotypes
+        self.cache = cache
+
+        # Generations kept after simulating in low-I/O mode
+        self.persist_gens = set(persist_gens)
+
+        # Periodic checkpoints, for resuming interrupted evolution
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+
+        # Elite of each generation, and their re-simulation once evolution ends
+        self.elite_archive = EliteArchive()
+        self.elite_replay = None
+
+        # Per-stage timings, shared with the simulation
+        self.recorder = recorder if (recorder != None) else Recorder()
+        self.sim.recorder = self.recorder
+
+        # Palette compaction, keeping the palette the size of a single population
+        self.palette_pool = palette_pool
+
+        # Pre-screening of organisms by predicted fitness
+        self.surrogate = surrogate
+
+        # Successive halving over increasing simulation durations, ending at the full duration so that cached scores are comparable
+        if (fidelities != None):
+            fidelities = tuple(float(f) for f in fidelities)
+            if (len(fidelities) == 0) or (fidelities[-1] != 1.0) or (fidelities[0] <= 0.0) or \
+               any(lo >= hi for lo, hi in zip(fidelities[:-1], fidelities[1:])):
+                raise ValueError("ERROR: Fidelities must be strictly increasing fractions in (0, 1], ending at 1.0, got " + str(fidelities))
+        self.fidelities = fidelities
+        self.promote = promote
+
+        # Called with the generation number once each generation is scored, before selection, such as for migration between islands
+        self.before_epoch = None
+
         # Retrieve defaults and set non-default parameters
         if (params != None):
             self.params = params
@@ -54,8 +166,17 @@ class Evolution:
                                                NEAT.ActivationFunction.UNSIGNED_SIGMOID, NEAT.ActivationFunction.RELU, 1, self.params, 1)
 
         # Specify initial population properties
-        self.morphology_pop = NEAT.Population(self.morphology_seed_genome, self.params, True, 1.0, 0) # 0 is the RNG seed
-        self.controlsys_pop = NEAT.Population(self.controlsys_seed_genome, self.params, True, 1.0, 0) # 0 is the RNG seed
+        self.create_populations()
+
+    def create_populations(self, seed: int = 0):
+        """Creates the initial morphology and control system populations from the seed genomes.
+
+        Args:
+            seed (int, optional): RNG seed of both populations. Defaults to 0.
+        """
+
+        self.morphology_pop = NEAT.Population(self.morphology_seed_genome, self.params, True, 1.0, seed)
+        self.controlsys_pop = NEAT.Population(self.controlsys_seed_genome, self.params, True, 1.0, seed)
 
     def construct_organisms(self, pop_id: int):
         """Combines the genomes from morphology and control system populations, creating a single population of organisms.
@@ -74,7 +195,7 @@ class Evolution:
 
         return joined_orgs
 
-    def evaluate_organisms(self, organisms: Dict[str, Organism], generation_dir: str, label: str, step_size: int):
+    def evaluate_organisms(self, organisms: Dict[str, Organism], generation_dir: str, label: str, step_size: int, persist: bool = True):
         """Simulates all organisms in a population and calculates the fitness scores for each. \n
         Also records history files for step_size higher than 0, however, this is quite slow.
 
@@ -83,6 +204,7 @@ class Evolution:
             generation_dir (str): Name of folder to store encodings and results in.
             label (str): Name given to each organism.
             step_size (int): Number of steps to record in history file.
+            persist (bool, optional): Flag for keeping the generation directory when the simulation uses scratch directories. Defaults to True.
 
         Returns:
             (Dict[str, Organism]): Input dict with the organisms scored based upon their fitness.
@@ -91,88 +213,617 @@ class Evolution:
         # Create directory to store this generations populations of .vxd files
         generation_path = self.sim.create_directory(generation_dir)
 
-        # Iterate over all organisms in the population
-        for key in organisms.keys():
-            # Generate and encode morphology
-            #org_morphology = organisms[key].generate_morphology(self.sim.vxa.organism_mats())
-            org_morphology = organisms[key].generate_morphology(self.sim.vxa)
-            self.sim.encode_morphology(org_morphology, generation_path, str(label +"_"+ key), step_size)
-            # Generate control system
-            #org_controlsys = organisms[key].generate_controlsys()
-
-        # Store the VXA file last, to include the materials generated by the organisms
-        self.sim.vxa.write(os.path.join(generation_path, "base.vxa"))
-
-        # Batch simulate the population and return fitness scores for all organisms
-        fitness_scores = self.sim.simulate_generation(generation_path)
+        keys = list(organisms.keys())
+        pool = self.get_pool()
+
+        # Build and query all morphology and control system networks
+        with self.recorder.stage("propose"):
+            if (pool != None):
+                proposed = list(pool.map(propose_organism, [organisms[key] for key in keys], chunksize=self.chunksize(len(keys))))
+            else:
+                proposed = [propose_organism(organisms[key]) for key in keys]
+        proposals = [proposal for proposal, _, _ in proposed]
+        phase_offsets = {key: phase_offset for key, (_, phase_offset, _) in zip(keys, proposed)}
+        for key, (_, _, timings) in zip(keys, proposed):
+            organisms[key].timings = timings
+            for stage in ("build_phenotype", "query", "build_controlsys", "query_controlsys"):
+                self.recorder.add(stage, timings[stage])
+
+        # Merge proposed materials into the shared palette in population order, so material IDs do not depend on worker count
+        hits, misses = self.sim.vxa.materials.hits, self.sim.vxa.materials.misses
+        morphologies = dict()
+        with self.recorder.stage("add_material"):
+            for key, proposal in zip(keys, proposals):
+                start = time.perf_counter()
+                morphologies[key] = resolve_materials(self.sim.vxa, *proposal)
+                organisms[key].timings["add_material"] = time.perf_counter() - start
+        self.recorder.add("material_hits", self.sim.vxa.materials.hits - hits)
+        self.recorder.add("material_misses", self.sim.vxa.materials.misses - misses)
+
+        # Keep only the gym's materials and those referenced by this population
+        if (self.palette_pool != None):
+            with self.recorder.stage("compact_palette"):
+                morphologies = dict(zip(keys, self.sim.vxa.compact_palette([morphologies[key] for key in keys], self.palette_pool)))
+
+        # Skip phenotypes which have already been simulated, unless recording their history
+        fitness_scores = dict()
+        phenotypes = dict()
+        if (self.cache != None) and (step_size == 0):
+            with self.recorder.stage("cache_lookup"):
+                settings = self.cache.settings_key(self.sim.vxa)
+                for key in keys:
+                    phenotypes[key] = self.cache.phenotype_key(self.sim.place_morphology(morphologies[key]), self.sim.vxa, settings, 
+                                                               self.sim.place_morphology(morphologies[key], phase_offsets[key]))
+                    cached = self.cache.get(phenotypes[key])
+                    if (cached != None):
+                        fitness_scores[key] = cached
+        sim_keys = [key for key in keys if key not in fitness_scores]
+
+        # Simulate only the organisms predicted to perform best, and an exploration quota, predicting fitness for the rest
+        screened = (self.surrogate != None) and (step_size == 0)
+        if (screened):
+            with self.recorder.stage("surrogate"):
+                features = np.array([morphology_features(morphologies[key], phase_offsets[key], self.sim.vxa) 
+                                     for key in sim_keys]).reshape(-1, N_FEATURES)
+                simulate, predicted = self.surrogate.screen(features)
+                if (predicted is not None):
+                    for key, sim_flag, prediction in zip(sim_keys, simulate, predicted):
+                        if not sim_flag:
+                            # NEAT requires non-negative fitness scores
+                            fitness_scores[key] = max(float(prediction), 0.0)
+                            organisms[key].predicted = True
+                features, predicted = features[simulate], (predicted[simulate] if (predicted is not None) else None)
+                sim_keys = [key for key, sim_flag in zip(sim_keys, simulate) if sim_flag]
+        sim_labels = [str(label +"_"+ key) for key in sim_keys]
+
+        # Encode all morphologies
+        with self.recorder.stage("encode"):
+            if (pool != None):
+                list(pool.map(encode_organism, [morphologies[key] for key in sim_keys], [generation_path] * len(sim_keys), sim_labels, 
+                              [step_size] * len(sim_keys), [phase_offsets[key] for key in sim_keys], chunksize=self.chunksize(len(sim_keys))))
+            else:
+                for key, org_label in zip(sim_keys, sim_labels):
+                    start = time.perf_counter()
+                    self.sim.encode_morphology(morphologies[key], generation_path, org_label, step_size, phase_offsets[key])
+                    organisms[key].timings["encode"] = time.perf_counter() - start
+
+        if (len(sim_keys) > 0) and (self.fidelities != None) and (step_size == 0):
+            # Simulate at increasing durations, caching only the scores of organisms simulated for the full duration
+            sim_scores, full_keys = self.simulate_fidelities(generation_path, organisms, dict(zip(sim_keys, sim_labels)))
+            fitness_scores.update(sim_scores)
+
+            if (len(phenotypes) > 0):
+                self.cache.put({phenotypes[key]: sim_scores[key] for key in full_keys})
+
+        elif (len(sim_keys) > 0):
+            # Store the VXA file last, to include the materials generated by the organisms
+            with self.recorder.stage("vxa_write"):
+                self.sim.write_settings(generation_path)
+
+            # Batch simulate the population and return fitness scores for all organisms
+            with self.recorder.stage("simulate_generation"):
+                sim_scores = self.sim.simulate_generation(generation_path)
+            fitness_scores.update(sim_scores)
+
+            if (len(phenotypes) > 0):
+                self.cache.put({phenotypes[key]: sim_scores[key] for key in sim_keys})
+
+        # Learn from the simulated organisms, reporting how well they were predicted
+        if (screened):
+            with self.recorder.stage("surrogate"):
+                skipped = sum(organisms[key].predicted for key in keys)
+                report = self.surrogate.update(features, np.array([fitness_scores[key] for key in sim_keys]), predicted, skipped)
+            for name, value in report.items():
+                if not np.isnan(value):
+                    self.recorder.add("surrogate_" + name, value)
+
+        # Encodings and results are no longer needed once parsed
+        self.sim.release_directory(generation_path, persist)
+
+        # Phenotypes are kept for recording elites, with the IDs of the palette as simulated
+        for key in keys:
+            organisms[key].morphology = morphologies[key]
+            organisms[key].phase_offset = phase_offsets[key]
 
         # Iterate over all results for the population
         for key in organisms.keys():
             # Set fitness scores for all organisms
             organisms[key].set_fitnesses(fitness_scores[key])
+            self.recorder.record("organism", org=key, label=label, fitness=organisms[key].fitness, 
+                                 cached=(key not in sim_keys) and (not organisms[key].predicted), predicted=organisms[key].predicted, 
+                                 fidelity_fitness=organisms[key].fidelity_fitness, **organisms[key].timings)
 
         return organisms
 
 
-    def evolve_organisms(self, elites: bool = False, verbose: bool = False):
+    def simulate_fidelities(self, generation_path: str, organisms: Dict[str, Organism], labels: Dict[str, str]):
+        """Simulates encoded organisms with successive halving: all at the shortest duration, and the best fraction
+        of each fidelity again at the next, so that most of the simulator's time is spent on the best organisms. \n
+        Each fidelity is simulated in its own subdirectory, and the fitness of each organism at each duration is recorded in the organism.
+
+        Args:
+            generation_path (str): Path of the directory containing the encoded organisms.
+            organisms (Dict[str, Organism]): Dictionary of organisms and their ids.
+            labels (Dict[str, str]): Filenames of the encoded organisms to simulate, by organism id.
+
+        Returns:
+            (Dict[str, float]): Dictionary of id-fitness pairs, organisms eliminated at a fidelity scoring no higher than those promoted from it.
+            (list): IDs of organisms simulated at the highest fidelity.
+        """
+
+        full_time = self.sim.vxa.get_sim_time()
+        fidelity_keys = list(labels.keys())
+        tiers = list()
+
+        try:
+            for n, fraction in enumerate(self.fidelities):
+                sim_time = full_time * fraction
+                self.sim.vxa.set_sim_time(sim_time)
+
+                # First fidelity simulates every encoding, later ones a copy of those promoted
+                fidelity_path = generation_path
+                if (n > 0):
+                    fidelity_path = os.path.join(generation_path, "fidelity_" + str(n + 1))
+                    os.makedirs(fidelity_path, exist_ok=True)
+                    for key in fidelity_keys:
+                        shutil.copyfile(os.path.join(generation_path, labels[key] + ".vxd"), os.path.join(fidelity_path, labels[key] + ".vxd"))
+
+                with self.recorder.stage("vxa_write"):
+                    self.sim.write_settings(fidelity_path)
+                with self.recorder.stage("simulate_generation"):
+                    sim_scores = self.sim.simulate_generation(fidelity_path)
+                self.recorder.add("fidelity_" + str(n + 1) + "_simulated", len(fidelity_keys))
+
+                for key in fidelity_keys:
+                    organisms[key].fidelity_fitness[sim_time] = sim_scores[key]
+
+                # Promote the best organisms to the next fidelity
+                if (n + 1 < len(self.fidelities)):
+                    ranked = sorted(fidelity_keys, key=lambda k: sim_scores[k], reverse=True)
+                    n_promoted = max(1, int(np.ceil(len(ranked) * self.promote)))
+                    tiers.append(ranked[n_promoted:])
+                    fidelity_keys = ranked[:n_promoted]
+        finally:
+            self.sim.vxa.set_sim_time(full_time)
+        tiers.append(fidelity_keys)
+
+        # Scores at different durations are not comparable, so each tier is capped by the tier promoted from it
+        fitness_scores = dict()
+        ceiling = float("inf")
+        for tier in reversed(tiers):
+            for key in tier:
+                last_time = max(organisms[key].fidelity_fitness.keys())
+                fitness_scores[key] = min(organisms[key].fidelity_fitness[last_time], ceiling)
+            if (len(tier) > 0):
+                ceiling = min(fitness_scores[key] for key in tier)
+
+        return fitness_scores, fidelity_keys
+
+    def get_pool(self):
+        """Returns the pool of worker processes, starting it if required.
+
+        Returns:
+            (ProcessPoolExecutor): Pool of worker processes, or None when generating serially.
+        """
+
+        if (self.workers > 1) and (self.pool == None):
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.sim,))
+        return self.pool
+
+    def close_pool(self):
+        """Shuts down the pool of worker processes, if started."""
+
+        if (self.pool != None):
+            self.pool.shutdown()
+            self.pool = None
+
+    def chunksize(self, n_tasks: int):
+        """Splits tasks into a few chunks per worker, limiting inter-process overhead.
+
+        Args:
+            n_tasks (int): Number of tasks to split.
+
+        Returns:
+            (int): Number of tasks sent to a worker at once.
+        """
+
+        return max(1, n_tasks // (self.workers * 4))
+
+    def evolve_organisms(self, elites: bool = False, verbose: bool = False, checkpoint: dict = None):
         """Main generation-iteration loop for evolving organisms.
 
         Args:
             elites (bool): Flag for recording elites.
             verbose (bool): Flag for per-generation output.
+            checkpoint (dict, optional): State to continue from, as restored by resume_from. Defaults to None.
 
         Returns:
             (pd.Dataframe): Dataframe of metrics calculated per-generation.
             (pd.Dataframe): Dataframe of metrics calculated for the whole evolution process.
         """
 
-        elite_orgs = dict()
-        gen_results = list()
+        self.elite_archive = EliteArchive() if (checkpoint == None) else checkpoint["elite_archive"]
+        gen_results = list() if (checkpoint == None) else checkpoint["gen_results"]
 
         # Record simulation execution time for benchmarking
         if(verbose): print("\n  Gen |  AvgFit  |  MaxFit  | HH:MM:SS  ")
         if(verbose): print(  "#======================================#")
+        if(verbose): 
+            for result in gen_results: print( "  {0:03d} | {1:+07.2f}% | {2:+07.2f}% | {3} ".format(*result))
 
         # Generational evolution loop
-        for gen in range(self.gen_n):
+        for gen in range(len(gen_results), self.gen_n):
 
             # Record per-generation execution time for benchmarking
             gen_start = time.perf_counter()
+            settings_start = time.time()
 
             # Create organisms from morphology and control system populations
-            joined_orgs = self.construct_organisms(gen+1)
+            with self.recorder.stage("construct_organisms"):
+                joined_orgs = self.construct_organisms(gen+1)
             
             # Build, simulate and score all organisms
-            scored_orgs = self.evaluate_organisms(joined_orgs, "generation_"+str(gen+1), "basic", 0)
+            scored_orgs = self.evaluate_organisms(joined_orgs, "generation_"+str(gen+1), "basic", 0, (gen+1) in self.persist_gens)
             #self.sim.empty_directory("generations/generation_X")
             #scored_orgs = self.evaluate_organisms(joined_orgs, "generation_X", "basic", 0)
 
-            # Store highest performing organism for this generation
-            elite_key = max(scored_orgs.keys(), key=lambda k: getattr(scored_orgs[k], 'fitness'))
-            elite_orgs[elite_key] = copy.deepcopy(scored_orgs[elite_key])
+            # Remove settings files of earlier generations, once they are no longer linked
+            self.sim.collect_settings(settings_start)
+
+            # Record highest performing simulated organism for this generation, before the palette changes
+            elite_key = max([k for k in scored_orgs.keys() if not scored_orgs[k].predicted], key=lambda k: getattr(scored_orgs[k], 'fitness'))
+            self.elite_archive.add(elite_key, scored_orgs[elite_key], self.sim.vxa)
 
             # Calculate generation results
             avg_fit = np.average([org.fitness for org in scored_orgs.values()])
             max_fit = np.max([org.fitness for org in scored_orgs.values()])
 
             # Record execution time for benchmarking
-            gen_secs = time.perf_counter() - gen_start
-            gen_mins = (gen_secs // 60)
-            gen_hour = (gen_mins // 60)
-            gen_time = str("%02d:%02d:%02d") % (gen_hour, gen_mins % 60, gen_secs % 60)
+            gen_time = self.format_time(time.perf_counter() - gen_start)
 
             gen_results.append([gen+1, avg_fit, max_fit, gen_time])
 
             if(verbose): print( "  {0:03d} | {1:+07.2f}% | {2:+07.2f}% | {3} ".format(*gen_results[-1]))
+            if(verbose) and (self.surrogate != None) and (len(self.surrogate.reports) > 0): 
+                print("      | Surrogate: {simulated} simulated, {skipped} skipped, rank corr {rank_corr:+.2f}, MAE {mae:.3f}".format(**self.surrogate.reports[-1]))
+
+            # Exchange genomes with other populations, while this generation's fitness scores are set
+            if (self.before_epoch != None):
+                self.before_epoch(gen+1)
 
             # Select organisms to make a new population for the next generation
-            self.morphology_pop.Epoch()
-            #self.controlsys_pop.Epoch()
+            with self.recorder.stage("epoch"):
+                self.morphology_pop.Epoch()
+                self.controlsys_pop.Epoch()
+
+            self.recorder.end_generation(gen+1, avg_fit=avg_fit, max_fit=max_fit, wall=time.perf_counter() - gen_start, 
+                                         palette_size=len(self.sim.vxa.materials.ids))
+
+            # Store state for resuming from the next generation
+            if (self.checkpoint_path != None) and (((gen+1) % self.checkpoint_every == 0) or (gen+1 == self.gen_n)):
+                self.save_checkpoint(gen_results)
+
+        self.close_pool()
+        self.record_elites(elites, verbose)
+        self.close_simulation()
+
+        if(verbose) and (self.cache != None): print("\n  Cache hit rate: {0:.1%}".format(self.cache.hit_rate()))
+        if(verbose): print("\n#================ DONE ================#")
+
+        return self.summarise_results(gen_results)
+
+    def record_elites(self, elites: bool, verbose: bool):
+        """Stores the elite archive alongside the generations, and re-simulates the elites from their records
+        in the background, recording history files without delaying the end of the run. \n
+        Nothing is written unless elites are requested, checkpoints already holding the archive.
+
+        Args:
+            elites (bool): Flag for recording elites.
+            verbose (bool): Flag for per-generation output.
+        """
+
+        if (elites):
+            # Elites can also be replayed later from the stored archive
+            os.makedirs(self.sim.stor_path, exist_ok=True)
+            self.elite_archive.save(os.path.join(self.sim.stor_path, "elites.pkl"))
+
+            if(verbose): print("\n#===== Recording Elites (background) ====#")
+            self.elite_replay = self.elite_archive.replay_async(self.sim)
+
+    def close_simulation(self):
+        """Removes the simulation's scratch space, once any background elite replay has finished with it."""
+
+        if (self.elite_replay != None):
+            self.elite_replay.add_done_callback(lambda future: self.sim.close())
+        else:
+            self.sim.close()
+
+    def save_checkpoint(self, gen_results: list):
+        """Stores the state of evolution after a generation, replacing the previous checkpoint. \n
+        The checkpoint is written to a temporary directory and renamed once complete, so an interruption never leaves a partial checkpoint.
+
+        Args:
+            gen_results (list): Metrics recorded for each generation so far.
+        """
+
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        gen_path = os.path.join(self.checkpoint_path, "checkpoint_" + str(len(gen_results)))
+        temp_path = gen_path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
 
-        # Re-simulate elites, recording history files
-        if (elites):     
-            if(verbose): print("\n#========== Recording Elites ==========#")
-            scored_orgs = self.evaluate_organisms(elite_orgs, "elites", "elite", 100)
+        # Populations are saved using MultiNEAT's own format
+        self.morphology_pop.Save(os.path.join(temp_path, "morphology.pop"))
+        self.controlsys_pop.Save(os.path.join(temp_path, "controlsys.pop"))
+
+        # Palette (within the VXA), metrics, elites, surrogate model and RNG state
+        state = {"vxa": self.sim.vxa, "elite_archive": self.elite_archive, "gen_results": gen_results, "surrogate": self.surrogate, 
+                 "rng_state": np.random.get_state()}
+        with open(os.path.join(temp_path, "state.pkl"), "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, gen_path)
+
+        # Remove older checkpoints, only once the new one is complete
+        for name in os.listdir(self.checkpoint_path):
+            if (name.startswith("checkpoint_")) and (name != os.path.basename(gen_path)):
+                shutil.rmtree(os.path.join(self.checkpoint_path, name), ignore_errors=True)
+
+    def load_checkpoint(self, checkpoint_path: str):
+        """Restores the state of evolution from the latest complete checkpoint.
+
+        Args:
+            checkpoint_path (str): Relative path of the directory storing checkpoints.
+
+        Returns:
+            (dict): State to continue from, containing the elite archive and per-generation metrics.
+        """
+
+        # Latest complete checkpoint, ignoring any left partially written
+        gens = [int(name.split("_")[1]) for name in os.listdir(checkpoint_path) 
+                if (name.startswith("checkpoint_")) and (not name.endswith(".tmp"))]
+        if (len(gens) == 0):
+            raise Exception("No checkpoint found in " + checkpoint_path)
+        gen_path = os.path.join(checkpoint_path, "checkpoint_" + str(max(gens)))
+
+        self.morphology_pop = NEAT.Population(os.path.join(gen_path, "morphology.pop"))
+        self.controlsys_pop = NEAT.Population(os.path.join(gen_path, "controlsys.pop"))
+
+        with open(os.path.join(gen_path, "state.pkl"), "rb") as f:
+            state = pickle.load(f)
+
+        # Restored palette keeps the material IDs referenced by later generations
+        self.sim.vxa = state["vxa"]
+        self.surrogate = state["surrogate"]
+        np.random.set_state(state["rng_state"])
+
+        return state
+
+    def resume_from(self, checkpoint_path: str = None, elites: bool = False, verbose: bool = False):
+        """Continues evolution from the latest checkpoint, as if it had not been interrupted.
+
+        Args:
+            checkpoint_path (str, optional): Relative path of the directory storing checkpoints, this object's checkpoint path if None. Defaults to None.
+            elites (bool): Flag for recording elites.
+            verbose (bool): Flag for per-generation output.
+
+        Raises:
+            ValueError: Indicates that neither this object nor the call specifies a checkpoint path.
+
+        Returns:
+            (pd.Dataframe): Dataframe of metrics calculated per-generation.
+            (pd.Dataframe): Dataframe of metrics calculated for the whole evolution process.
+        """
+
+        if (checkpoint_path == None):
+            checkpoint_path = self.checkpoint_path
+        if (checkpoint_path == None):
+            raise ValueError("ERROR: No checkpoint path to resume from, please pass one or construct Evolution with checkpoint_path")
+
+        # Workers hold a copy of the simulation, so are restarted with the restored settings
+        self.close_pool()
+        return self.evolve_organisms(elites, verbose, self.load_checkpoint(checkpoint_path))
+
+    def evolve_steady_state(self, in_flight: int = 4, elites: bool = False, verbose: bool = False):
+        """Steady-state evolution loop, without a generational barrier. \n
+        Keeps a fixed number of simulations running, and as soon as one finishes its fitness is set and a new
+        offspring replaces the worst individual (rtNEAT). Every pop_s completed simulations are reported as one generation. \n
+        Surrogate pre-screening, simulation fidelities and palette compaction act on whole generations, so are not supported.
+
+        Args:
+            in_flight (int): Number of simulations running at once.
+            elites (bool): Flag for recording elites.
+            verbose (bool): Flag for per-generation output.
+
+        Raises:
+            ValueError: Indicates that a surrogate, fidelities or a palette pool were given, which only apply to generational evolution.
+
+        Returns:
+            (pd.Dataframe): Dataframe of metrics calculated per-generation.
+            (pd.Dataframe): Dataframe of metrics calculated for the whole evolution process.
+        """
+
+        generational = [name for name, value in (("surrogate", self.surrogate), ("fidelities", self.fidelities), ("palette_pool", self.palette_pool)) 
+                        if (value != None)]
+        if (len(generational) > 0):
+            raise ValueError("ERROR: " + ", ".join(generational) + " only apply to evolve_organisms, not to steady-state evolution")
+
+        self.elite_archive = EliteArchive()
+        gen_results = list()
+
+        pop_s = self.params.PopulationSize
+        total = self.gen_n * pop_s
+
+        # The initial population is evaluated before any offspring are produced
+        initial = NEAT.GetGenomeList(self.morphology_pop)
+        controlsys = NEAT.GetGenomeList(self.controlsys_pop)
+
+        pending = dict()
+        gen_orgs = dict()
+        submitted = 0
+
+        if(verbose): print("\n  Gen |  AvgFit  |  MaxFit  | HH:MM:SS  ")
+        if(verbose): print(  "#======================================#")
+
+        gen_start = time.perf_counter()
+        settings_start = time.time()
+
+        with ThreadPoolExecutor(max_workers=in_flight) as executor:
+            while (submitted < total) or (len(pending) > 0):
+
+                # Keep the simulator busy
+                while (submitted < total) and (len(pending) < in_flight):
+                    if (submitted < len(initial)):
+                        genome = initial[submitted]
+                        controlsys_genome = controlsys[submitted]
+                    else:
+                        # Replace the worst individuals of both populations with new offspring
+                        genome = self.morphology_pop.Tick(NEAT.Genome())
+                        controlsys_genome = self.controlsys_pop.Tick(NEAT.Genome())
+                    submitted += 1
+
+                    # Organism keeps copies, as further offspring may move the genomes within the populations
+                    org_id = str(len(gen_results) + 1) +"-"+ str(submitted)
+                    organism = Organism(copy.deepcopy(genome), copy.deepcopy(controlsys_genome), self.W, self.H, self.D)
+                    pending[executor.submit(self.simulate_organism, organism, org_id, submitted)] = (org_id, genome.GetID(), 
+                                                                                                     controlsys_genome.GetID(), organism)
+
+                # Score finished simulations
+                done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    org_id, genome_id, controlsys_id, organism = pending.pop(future)
+                    organism.set_fitnesses(future.result()[org_id])
+                    gen_orgs[org_id] = organism
+                    self.recorder.record("organism", org=org_id, label="steady", fitness=organism.fitness, **organism.timings)
+
+                    # Update the genomes, unless they have already been replaced
+                    for pop, pop_genome_id in ((self.morphology_pop, genome_id), (self.controlsys_pop, controlsys_id)):
+                        for genome in NEAT.GetGenomeList(pop):
+                            if (genome.GetID() == pop_genome_id):
+                                genome.SetFitness(organism.fitness)
+                                genome.SetEvaluated()
+
+                    # Report every pop_s simulations as a generation
+                    if (len(gen_orgs) == pop_s):
+                        elite_key = max(gen_orgs.keys(), key=lambda k: getattr(gen_orgs[k], 'fitness'))
+                        with self.palette_lock:
+                            self.elite_archive.add(elite_key, gen_orgs[elite_key], self.sim.vxa)
+
+                        avg_fit = np.average([org.fitness for org in gen_orgs.values()])
+                        max_fit = np.max([org.fitness for org in gen_orgs.values()])
+                        gen_time = self.format_time(time.perf_counter() - gen_start)
+
+                        gen_results.append([len(gen_results) + 1, avg_fit, max_fit, gen_time])
+
+                        if(verbose): print( "  {0:03d} | {1:+07.2f}% | {2:+07.2f}% | {3} ".format(*gen_results[-1]))
+
+                        self.recorder.end_generation(len(gen_results), avg_fit=avg_fit, max_fit=max_fit, wall=time.perf_counter() - gen_start, 
+                                                     palette_size=len(self.sim.vxa.materials.ids))
+
+                        # Remove settings files of earlier generations, once they are no longer linked
+                        self.sim.collect_settings(settings_start)
+
+                        gen_orgs = dict()
+                        gen_start = time.perf_counter()
+                        settings_start = time.time()
+
+        self.close_pool()
+        self.record_elites(elites, verbose)
+        self.close_simulation()
+
+        if(verbose) and (self.cache != None): print("\n  Cache hit rate: {0:.1%}".format(self.cache.hit_rate()))
+        if(verbose): print("\n#================ DONE ================#")
+
+        return self.summarise_results(gen_results)
+
+    def simulate_organism(self, organism: Organism, org_id: str, eval_n: int):
+        """Simulates a single organism in its own directory, for steady-state evolution.
+
+        Args:
+            organism (Organism): Organism to simulate.
+            org_id (str): ID of the organism, used for naming files.
+            eval_n (int): Number of the evaluation, used for naming the directory.
+
+        Returns:
+            (Dict[str, int]): Dictionary of id-fitness pairs describing organism performance.
+        """
+
+        # Networks are queried without touching the palette, so run outside the lock
+        proposal = organism.propose_materials()
+        self.recorder.add("build_phenotype", organism.timings["build_phenotype"])
+        self.recorder.add("query", organism.timings["query"])
+        phase_offset, _ = organism.generate_controlsys()
+        self.recorder.add("build_controlsys", organism.timings["build_controlsys"])
+        self.recorder.add("query_controlsys", organism.timings["query_controlsys"])
+
+        # Palette is shared, so materials are added one organism at a time
+        with self.palette_lock:
+            hits, misses = self.sim.vxa.materials.hits, self.sim.vxa.materials.misses
+            start = time.perf_counter()
+            org_morphology = resolve_materials(self.sim.vxa, *proposal)
+            organism.timings["add_material"] = time.perf_counter() - start
+            organism.morphology, organism.phase_offset = org_morphology, phase_offset
+            self.recorder.add("add_material", organism.timings["add_material"])
+            self.recorder.add("material_hits", self.sim.vxa.materials.hits - hits)
+            self.recorder.add("material_misses", self.sim.vxa.materials.misses - misses)
+
+            # Skip phenotypes which have already been simulated
+            if (self.cache != None):
+                phenotype = self.cache.phenotype_key(self.sim.place_morphology(org_morphology), self.sim.vxa, 
+                                                     self.cache.settings_key(self.sim.vxa), 
+                                                     self.sim.place_morphology(org_morphology, phase_offset))
+                cached = self.cache.get(phenotype)
+                if (cached != None):
+                    return {org_id: cached}
+
+            evaluation_path = self.sim.create_directory("evaluation_" + str(eval_n))
+            with self.recorder.stage("vxa_write"):
+                self.sim.write_settings(evaluation_path)
+
+        start = time.perf_counter()
+        self.sim.encode_morphology(org_morphology, evaluation_path, "steady_" + org_id, 0, phase_offset)
+        organism.timings["encode"] = time.perf_counter() - start
+        self.recorder.add("encode", organism.timings["encode"])
+
+        with self.recorder.stage("simulate_generation"):
+            fitness_scores = self.sim.simulate_generation(evaluation_path)
+        self.sim.release_directory(evaluation_path)
+
+        if (self.cache != None):
+            with self.palette_lock:
+                self.cache.put({phenotype: fitness_scores[org_id]})
+
+        return fitness_scores
+
+    def format_time(self, secs: float):
+        """Formats a duration for benchmarking.
+
+        Args:
+            secs (float): Duration in seconds.
+
+        Returns:
+            (str): Duration as HH:MM:SS.
+        """
+
+        mins = (secs // 60)
+        hour = (mins // 60)
+        return str("%02d:%02d:%02d") % (hour, mins % 60, secs % 60)
+
+    def summarise_results(self, gen_results: list):
+        """Calculates metrics for the whole evolution process from per-generation results.
+
+        Args:
+            gen_results (list): Generation number, average fitness, maximum fitness and execution time of each generation.
+
+        Returns:
+            (pd.Dataframe): Dataframe of metrics calculated per-generation.
+            (float): Average change in average fitness per generation.
+            (float): Change in fitness improvement between the first and last generations.
+            (float): Maximum average fitness.
+            (int): Generation of maximum average fitness.
+        """
 
         # Calculate result metrics
         evo_results = [0.0, 0.0, 0.0, 0.0]
@@ -185,9 +836,4 @@ class Evolution:
         # Format results as dataframes
         fmt_gen_results = pd.DataFrame(gen_results, columns=["Gen", "Avg Fitness", "Max Fitness", "Exe Time"]).set_index("Gen")
 
-        if(verbose): print("\n#================ DONE ================#")
-
         return fmt_gen_results, evo_results[0], evo_results[1], evo_results[2], evo_results[3]
-        
-
-        
\ No newline at end of file
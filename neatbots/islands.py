@@ -0,0 +1,238 @@
+import os
+import traceback
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from typing import Callable, Dict
+import MultiNEAT as NEAT
+
+from neatbots.evolution import Evolution
+from neatbots.sweep import build_params
+
+# Foreign genes are numbered from here, far past any neuron or innovation an island creates itself
+FOREIGN_ID_BASE = 1 << 24
+
+class GeneMap:
+    """Class translating the neuron and innovation IDs of genomes from the previous island into IDs of this island. \n
+    Islands number their innovations independently, so a foreign ID may already mean a different structure here.
+    Only the seed genome's IDs are shared, and every other foreign ID keeps the ID it was first given, 
+    so that immigrants stay aligned with each other and with their offspring in crossover and speciation."""
+
+    def __init__(self, seed_genome: NEAT.Genome):
+        """Constructs a GeneMap object.
+
+        Args:
+            seed_genome (NEAT.Genome): Seed genome of the population, the same on every island.
+
+        Returns:
+            (GeneMap): GeneMap object with the specified arguments.
+        """
+
+        self.neurons = {neuron.ID: neuron.ID for neuron in seed_genome.NeuronGenes}
+        self.innovations = {link.InnovationID: link.InnovationID for link in seed_genome.LinkGenes}
+
+    def translate(self, ids: Dict[int, int], foreign_id: int):
+        """Returns the ID of this island given to a foreign neuron or innovation, numbering it if new.
+
+        Args:
+            ids (Dict[int, int]): Dictionary of foreign and translated IDs, of either neurons or innovations.
+            foreign_id (int): ID on the previous island.
+
+        Returns:
+            (int): ID on this island.
+        """
+
+        if (foreign_id not in ids):
+            ids[foreign_id] = FOREIGN_ID_BASE + len(ids)
+        return ids[foreign_id]
+
+    def remap(self, genome: NEAT.Genome):
+        """Renumbers the neurons and links of an immigrant genome, in place.
+
+        Args:
+            genome (NEAT.Genome): Genome received from the previous island.
+
+        Returns:
+            (NEAT.Genome): The renumbered genome.
+        """
+
+        neurons = genome.NeuronGenes
+        for neuron in neurons:
+            neuron.ID = self.translate(self.neurons, neuron.ID)
+        genome.NeuronGenes = neurons
+
+        # Crossover walks both parents' links in innovation order
+        links = genome.LinkGenes
+        for link in links:
+            link.FromNeuronID = self.translate(self.neurons, link.FromNeuronID)
+            link.ToNeuronID = self.translate(self.neurons, link.ToNeuronID)
+            link.InnovationID = self.translate(self.innovations, link.InnovationID)
+        genome.LinkGenes = type(links)(sorted(links, key=lambda link: link.InnovationID))
+
+        return genome
+
+def migrate_genomes(evo: Evolution, conn: Connection, gen: int, migrants: int, gene_maps: tuple):
+    """Sends the best organisms of an island to the coordinator, and replaces the worst with those received. \n
+    Organisms pair the genomes at the same position of both populations, so both genomes are exchanged together.
+
+    Args:
+        evo (Evolution): Evolution object of the island, with the generation's fitness scores set.
+        conn (Connection): Island's end of the pipe to the coordinator.
+        gen (int): Generation number.
+        migrants (int): Number of organisms exchanged.
+        gene_maps (tuple): GeneMap objects of the morphology and control system populations.
+    """
+
+    # Positions of each genome within its species, in the same order as NEAT.GetGenomeList
+    positions = [[(s, j) for s, species in enumerate(pop.Species) for j in range(len(species.Individuals))]
+                 for pop in (evo.morphology_pop, evo.controlsys_pop)]
+    morphology = [evo.morphology_pop.Species[s].Individuals[j] for s, j in positions[0]]
+    controlsys = [evo.controlsys_pop.Species[s].Individuals[j] for s, j in positions[1]]
+    order = np.argsort([genome.GetFitness() for genome in morphology], kind="stable")
+
+    conn.send(("migrate", gen, [(morphology[i], controlsys[i]) for i in order[::-1][:migrants]]))
+    immigrants = conn.recv()
+
+    # Immigrants replace the least fit organisms, keeping their fitness until the next evaluation
+    for pop, n in ((evo.morphology_pop, 0), (evo.controlsys_pop, 1)):
+        for i, immigrant in zip(order, immigrants):
+            s, j = positions[n][i]
+            pop.Species[s].Individuals[j] = gene_maps[n].remap(immigrant[n])
+
+def run_island(setup: Callable[[NEAT.Parameters, str], Evolution], values: Dict[str, object], stor_path: str, seed: int,
+               conn: Connection, migrate_every: int, migrants: int):
+    """Process target which evolves a single island, migrating organisms through the coordinator.
+
+    Args:
+        setup (Callable[[NEAT.Parameters, str], Evolution]): Module-level function creating the evolution object from parameters and a storage path.
+        values (Dict[str, object]): Dictionary of parameter names and values.
+        stor_path (str): Relative path of the directory storing this island's generations.
+        seed (int): RNG seed of the island's populations.
+        conn (Connection): Island's end of the pipe to the coordinator.
+        migrate_every (int): Number of generations between migrations.
+        migrants (int): Number of organisms exchanged at each migration.
+    """
+
+    try:
+        os.makedirs(stor_path, exist_ok=True)
+        np.random.seed(seed)
+        evo = setup(build_params(values), stor_path)
+        evo.create_populations(seed)
+        gene_maps = (GeneMap(evo.morphology_seed_genome), GeneMap(evo.controlsys_seed_genome))
+
+        # No migration after the final generation
+        evo.before_epoch = lambda gen: migrate_genomes(evo, conn, gen, migrants, gene_maps) if (gen % migrate_every == 0) and (gen < evo.gen_n) else None
+        conn.send(("done", evo.evolve_organisms(elites=False, verbose=False)))
+    except Exception:
+        # The coordinator closes its end once any island fails
+        try:
+            conn.send(("error", traceback.format_exc()))
+        except OSError:
+            pass
+    finally:
+        conn.close()
+
+class Islands:
+    """Class representing an island model of evolution, with separate populations evolved in parallel processes
+    and their best organisms migrating around a ring of islands."""
+
+    def __init__(self, setup: Callable[[NEAT.Parameters, str], Evolution], params: Dict[str, object] = None, islands: int = 2,
+                 migrate_every: int = 5, migrants: int = 2, stor_path: str = "./generations", seed: int = 0):
+        """Constructs an Islands object.
+
+        Args:
+            setup (Callable[[NEAT.Parameters, str], Evolution]): Module-level function creating the evolution object from parameters and a storage path,
+                                                                 which should give each island its own simulation.
+            params (Dict[str, object], optional): Dictionary of parameter values shared by all islands. Defaults to None.
+            islands (int, optional): Number of islands. Defaults to 2.
+            migrate_every (int, optional): Number of generations between migrations. Defaults to 5.
+            migrants (int, optional): Number of organisms each island sends to the next at each migration. Defaults to 2.
+            stor_path (str, optional): Relative path of the directory containing each island's storage directory. Defaults to "./generations".
+            seed (int, optional): RNG seed of the first island, increasing by one for each other island. Defaults to 0.
+
+        Returns:
+            (Islands): Islands object with the specified arguments.
+        """
+
+        self.setup = setup
+        self.params = params if (params != None) else dict()
+        self.islands = islands
+        self.migrate_every = migrate_every
+        self.migrants = migrants
+        self.stor_path = stor_path
+        self.seed = seed
+
+    def run(self, verbose: bool = False):
+        """Evolves all islands, relaying migrants from each island to the next at every migration.
+
+        Args:
+            verbose (bool): Flag for per-migration output.
+
+        Raises:
+            Exception: Indicates that an island failed, after stopping every other island.
+
+        Returns:
+            (pd.Dataframe): Dataframe of metrics calculated per-generation across all islands.
+            (pd.Dataframe): Dataframe of metrics calculated per-generation for each island.
+        """
+
+        conns = dict()
+        processes = dict()
+        for i in range(self.islands):
+            conns[i], island_conn = mp.Pipe()
+            processes[i] = mp.Process(target=run_island, args=(self.setup, self.params, os.path.join(self.stor_path, "island_" + str(i + 1)),
+                                                              self.seed + i, island_conn, self.migrate_every, self.migrants))
+            processes[i].start()
+            island_conn.close()
+
+        results = dict()
+        try:
+            while (len(results) < self.islands):
+                # Islands migrate at the same generations, so wait for every running island
+                messages = {i: conns[i].recv() for i in conns.keys() if i not in results}
+                migrating = sorted(i for i, message in messages.items() if message[0] == "migrate")
+
+                for i, message in messages.items():
+                    if (message[0] == "error"):
+                        raise Exception("Island " + str(i + 1) + " failed:\n" + message[1])
+                    if (message[0] == "done"):
+                        results[i] = message[1]
+
+                # Each island receives the migrants of the previous island in the ring
+                for n, i in enumerate(migrating):
+                    conns[i].send(messages[migrating[n - 1]][2])
+                if(verbose) and (len(migrating) > 0):
+                    print("  Generation {0:03d}: {1} organisms migrated between {2} islands".format(messages[migrating[0]][1], self.migrants, len(migrating)))
+        except BaseException:
+            # Other islands would wait forever for migrants, so stop them
+            for i in processes.keys():
+                if (processes[i].is_alive()):
+                    processes[i].terminate()
+            raise
+        finally:
+            for i in conns.keys():
+                conns[i].close()
+            for i in processes.keys():
+                processes[i].join()
+
+        return self.aggregate_results(results)
+
+    def aggregate_results(self, results: Dict[int, tuple]):
+        """Combines the per-generation results of each island into a single report.
+
+        Args:
+            results (Dict[int, tuple]): Results of Evolution.evolve_organisms for each island.
+
+        Returns:
+            (pd.Dataframe): Dataframe of the average and maximum fitness over all islands, and the island with the fittest organism, per-generation.
+            (pd.Dataframe): Dataframe of each island's per-generation metrics, indexed by island and generation.
+        """
+
+        island_results = pd.concat({i + 1: results[i][0] for i in sorted(results.keys())}, names=["Island"])
+
+        by_gen = island_results.groupby(level="Gen")
+        report = pd.DataFrame({"Avg Fitness": by_gen["Avg Fitness"].mean(), "Max Fitness": by_gen["Max Fitness"].max(),
+                               "Best Island": by_gen["Max Fitness"].idxmax().map(lambda index: index[0])})
+
+        return report, island_results
@@ -1,8 +1,108 @@
-from neatbots.VoxcraftVXA import VXA
+from neatbots.VoxcraftVXA import VXA, MATERIAL_OUTPUTS
+from functools import lru_cache
 from typing import List
+import time
 import numpy as np
 import MultiNEAT as NEAT
 
+# Control system network outputs, as per-voxel actuation parameters
+CONTROL_OUTPUTS = ("PhaseOffset", "Frequency")
+
+# Vectorised equivalents of the MultiNEAT activation functions, taking the activesum, slope (a) and shift (b)
+ACTIVATIONS = {
+    NEAT.ActivationFunction.SIGNED_SIGMOID:   lambda x, a, b : ((1.0 / (1.0 + np.exp(-a * x - b))) - 0.5) * 2.0,
+    NEAT.ActivationFunction.UNSIGNED_SIGMOID: lambda x, a, b : 1.0 / (1.0 + np.exp(-a * x - b)),
+    NEAT.ActivationFunction.TANH:             lambda x, a, b : np.tanh(x * a),
+    NEAT.ActivationFunction.TANH_CUBIC:       lambda x, a, b : np.tanh(x * x * x * a),
+    NEAT.ActivationFunction.SIGNED_STEP:      lambda x, a, b : np.where(x > b, 1.0, -1.0),
+    NEAT.ActivationFunction.UNSIGNED_STEP:    lambda x, a, b : np.where(x > 0.5 + b, 1.0, 0.0),
+    NEAT.ActivationFunction.SIGNED_GAUSS:     lambda x, a, b : (np.exp(-a * x * x + b) - 0.5) * 2.0,
+    NEAT.ActivationFunction.UNSIGNED_GAUSS:   lambda x, a, b : np.exp(-a * x * x + b),
+    NEAT.ActivationFunction.ABS:              lambda x, a, b : np.abs(x + b),
+    NEAT.ActivationFunction.SIGNED_SINE:      lambda x, a, b : np.sin(x * a + b),
+    NEAT.ActivationFunction.UNSIGNED_SINE:    lambda x, a, b : (np.sin(x * a + b) + 1.0) / 2.0,
+    NEAT.ActivationFunction.LINEAR:           lambda x, a, b : x + b,
+    NEAT.ActivationFunction.RELU:             lambda x, a, b : np.maximum(x, 0.0),
+    NEAT.ActivationFunction.SOFTPLUS:         lambda x, a, b : np.log1p(np.exp(x)),
+}
+
+@lru_cache(maxsize=None)
+def input_grid(W: int, H: int, D: int):
+    """Returns the network inputs for every position of an organism space, shared by all organisms of that shape.
+
+    Args:
+        W (int): The width of organism space.
+        H (int): The height of organism space.
+        D (int): The depth of organism space.
+
+    Returns:
+        (np.array): Read-only (W*H*D x 4) array of X, Y, Z and Bias values, ordered X-major.
+    """
+
+    X, Y, Z = np.meshgrid(np.arange(W), np.arange(H), np.arange(D), indexing="ij")
+    grid = np.stack([X.ravel(), Y.ravel(), Z.ravel(), np.ones(W * H * D)], axis=1).astype(float)
+    grid.flags.writeable = False
+    return grid
+
+def query_network(net: NEAT.NeuralNetwork, inputs: np.ndarray):
+    """Activates a phenotype network for a whole batch of inputs at once. \n
+    Each row is propagated from a flushed network until its activations settle, applying the same
+    per-step update as NeuralNetwork.Activate.
+
+    Args:
+        net (NEAT.NeuralNetwork): Phenotype network built from a genome.
+        inputs (np.ndarray): (N x I) array of input values, one row per query.
+
+    Returns:
+        (np.array): (N x O) array of output values, one row per query.
+    """
+
+    n_neurons = len(net.neurons)
+    n_inputs, n_outputs = net.NumInputs(), net.NumOutputs()
+
+    # Dense weight matrix from all connections
+    weights = np.zeros(shape=(n_neurons, n_neurons))
+    for c in net.connections:
+        weights[c.source_neuron_idx, c.target_neuron_idx] += c.weight
+
+    # Group non-input neurons by activation function
+    groups = dict()
+    for i in range(n_inputs, n_neurons):
+        groups.setdefault(net.neurons[i].activation_function_type, list()).append(i)
+    groups = [(ACTIVATIONS[f], np.array(idx), 
+               np.array([net.neurons[i].a for i in idx]), np.array([net.neurons[i].b for i in idx])) for f, idx in groups.items()]
+
+    n_given = min(inputs.shape[1], n_inputs)
+    state = np.zeros(shape=(inputs.shape[0], n_neurons))
+    state[:, :n_given] = inputs[:, :n_given]
+
+    # Propagate until stable, which takes as many steps as the network is deep
+    with np.errstate(over="ignore"):
+        for _ in range(n_neurons):
+            activesum = state @ weights
+            new_state = state.copy()
+            for f, idx, a, b in groups:
+                new_state[:, idx] = f(activesum[:, idx], a, b)
+            if np.array_equal(new_state, state):
+                break
+            state = new_state
+
+    return state[:, n_inputs:n_inputs + n_outputs]
+
+def resolve_materials(vxa: VXA, proposals: np.ndarray, indices: np.ndarray):
+    """Adds proposed materials to a palette in order, and maps an organism space onto their material IDs.
+
+    Args:
+        vxa (VXA): Instance of VXA class containing simulation execution settings.
+        proposals (np.ndarray): (M x 19) array of distinct network outputs.
+        indices (np.ndarray): 3D array of indices into the proposals for each voxel.
+
+    Returns:
+        (np.array): 3D array of integers representing the material of each voxel in the organism.
+    """
+
+    return vxa.add_materials(proposals, diff_thresh=15)[indices]
+
 class Organism:
     """Class representing an organism composed of seperate genomes acting as a whole."""
 
@@ -24,12 +124,65 @@ class Organism:
         self.controlsys_gen = controlsys_gen
         self.fitness = 0
 
+        # Seconds spent in each stage of generating this organism
+        self.timings = dict()
+
+        # Phenotype as last simulated, with material IDs of the palette at that time
+        self.morphology = None
+        self.phase_offset = None
+        # Fitness predicted by a surrogate model, rather than simulated
+        self.predicted = False
+        # Fitness at each simulation duration, when simulated at several fidelities
+        self.fidelity_fitness = dict()
+
         # Set Width, Height and Depth of organism space
         self.W = W
         self.H = H
         self.D = D
 
 
+    def query_morphology(self):
+        """Builds the phenotype neural network of a morphology genome, and then queries the network
+        at every position of the organism space in a single batch.
+
+        Returns:
+            (np.array): (W*H*D x 19) array of network outputs, ordered X-major.
+        """
+
+        # Create neural network for soft-body generation
+        start = time.perf_counter()
+        morphology_net = NEAT.NeuralNetwork()
+        self.morphology_gen.BuildPhenotype(morphology_net)
+        built = time.perf_counter()
+
+        # Pass X, Y, Z and Bias values for all positions to neural net
+        net_out = query_network(morphology_net, input_grid(self.W, self.H, self.D))
+
+        self.timings["build_phenotype"] = built - start
+        self.timings["query"] = time.perf_counter() - built
+        return net_out
+
+    def propose_materials(self):
+        """Queries the morphology network and groups the organism space by distinct network outputs,
+        without touching the shared palette.
+
+        Returns:
+            (np.array): (M x 19) array of distinct network outputs, in order of first appearance.
+            (np.array): 3D array of indices into the distinct outputs for each voxel in the organism.
+        """
+
+        net_out = self.query_morphology()
+
+        # Identical outputs produce identical materials, so each distinct output is only proposed once
+        rows, first, inverse = np.unique(net_out, axis=0, return_index=True, return_inverse=True)
+
+        # Renumber distinct outputs in voxel order, keeping material IDs deterministic
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        return rows[order], rank[inverse.ravel()].reshape(self.W, self.H, self.D)
+
     def generate_morphology(self, vxa: VXA):
         """Builds the phenotype neural network of a morphology genome, and then queries the network
         to create materials for the organism space.
@@ -38,47 +191,44 @@ class Organism:
             vxa (VXA): Instance of VXA class containing simulation execution settings.
 
         Returns:
-            (List[int]): Array representing the material of each voxel in the organism.
+            (np.array): 3D array of integers representing the material of each voxel in the organism.
         """
         
-        # Create neural network for soft-body generation
-        morphology_net = NEAT.NeuralNetwork()
-        self.morphology_gen.BuildPhenotype(morphology_net)
+        return resolve_materials(vxa, *self.propose_materials())
 
-        morphology = np.zeros(shape=(self.W, self.H, self.D))
-
-        # Generate soft body by querying all positions
-        for x in range(self.W):
-            for y in range(self.H):
-                for z in range(self.D):
-                    # Pass X, Y, Z, d and Bias values to neural net
-                    d = np.linalg.norm(((self.W / 2)- x, (self.H / 2) - y, (self.D / 2) - z) )
-                    morphology_net.Input(np.array([x, y, z, 1.0]))
-                    morphology_net.Activate()
-                    net_out = morphology_net.Output()
-                    mat_id = vxa.add_material(isEmpty=net_out[0], isTarget=net_out[1], isMeasured=net_out[2], Fixed=net_out[3], 
-                                              sticky=net_out[4], Cilia=net_out[5], isPaceMaker=net_out[6], PaceMakerPeriod=net_out[7], 
-                                              signalValueDecay=net_out[8], signalTimeDecay=net_out[9], inactivePeriod=net_out[10], MatModel=net_out[11], 
-                                              Elastic_Mod=net_out[12], Fail_Stress=net_out[13], Density=net_out[14], Poissons_Ratio=net_out[15], 
-                                              CTE=net_out[16], uStatic=net_out[17], uDynamic=net_out[18], diff_thresh=15)
-                    morphology[x, y, z] = mat_id
-
-        return morphology
-
-    def generate_controlsys(self):
+    def query_controlsys(self):
         """Builds the phenotype neural network of a control system genome, and then queries the network
-        for values to fill the organism space.
-
-        Args:
-            NOT YET IMPLEMENTED
+        at every position of the organism space in a single batch.
 
         Returns:
-            _type_: _description_
+            (np.array): (W*H*D x 2) array of network outputs, ordered X-major.
         """
 
-        # Create neural network for querying voxel actuation ### NOT YET IMPLEMENTED ###
+        # Create neural network for querying voxel actuation
+        start = time.perf_counter()
         controlsys_net = NEAT.NeuralNetwork()
         self.controlsys_gen.BuildPhenotype(controlsys_net)
+        built = time.perf_counter()
+
+        # Same positions as the morphology query, so the grid is shared
+        net_out = query_network(controlsys_net, input_grid(self.W, self.H, self.D))
+
+        self.timings["build_controlsys"] = built - start
+        self.timings["query_controlsys"] = time.perf_counter() - built
+        return net_out
+
+    def generate_controlsys(self):
+        """Builds the phenotype neural network of a control system genome, and then queries the network
+        for the actuation parameters of each voxel in the organism space.
+
+        Returns:
+            (np.array): 3D array of actuation phase offsets for each voxel in the organism.
+            (np.array): 3D array of actuation frequencies for each voxel in the organism.
+        """
+
+        net_out = self.query_controlsys()
+
+        return tuple(net_out[:, i].reshape(self.W, self.H, self.D) for i in range(len(CONTROL_OUTPUTS)))
 
     def set_fitnesses(self, fitness_score: float):
         """Set a fitness score to both the morphology and control system genomes of an organism.
@@ -0,0 +1,123 @@
+import json
+import time
+from threading import Lock
+
+class NullStage:
+    """Class representing a stage of a disabled recorder, which does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# Shared context for disabled recorders, so timing a stage costs a single call
+NULL_STAGE = NullStage()
+
+class Stage:
+    """Class representing a timed stage of the evaluation pipeline, used as a context manager."""
+
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add(self.name, time.perf_counter() - self.start)
+
+class Recorder:
+    """Class representing a stream of per-generation and per-organism timing records, written as JSON lines."""
+
+    def __init__(self, path: str = None):
+        """Constructs a Recorder object, appending to the record file if given.
+
+        Args:
+            path (str, optional): Relative path of the record file, recording is disabled if None. Defaults to None.
+
+        Returns:
+            (Recorder): Recorder object with the specified arguments.
+        """
+
+        self.path = path
+        self.enabled = path != None
+        self.file = open(path, mode="a") if (self.enabled) else None
+
+        # Totals for the current generation, shared between simulator threads
+        self.totals = dict()
+        self.lock = Lock()
+
+    def __getstate__(self):
+        """Pickles the recorder as disabled, as worker processes return their timings to the main process instead."""
+
+        return {"path": None}
+
+    def __setstate__(self, state):
+        """Creates a disabled recorder in another process."""
+
+        self.__init__(**state)
+
+    def stage(self, name: str):
+        """Times a stage, adding its duration to the generation totals.
+
+        Args:
+            name (str): Name of the stage.
+
+        Returns:
+            (Stage): Context manager timing the stage, or a shared no-op context if disabled.
+        """
+
+        return Stage(self, name) if (self.enabled) else NULL_STAGE
+
+    def add(self, name: str, value: float):
+        """Adds a duration or count to the generation totals.
+
+        Args:
+            name (str): Name of the stage or counter.
+            value (float): Seconds or count to add.
+        """
+
+        if (self.enabled):
+            with self.lock:
+                self.totals[name] = self.totals.get(name, 0) + value
+
+    def record(self, kind: str, **fields):
+        """Writes a single record to the record file.
+
+        Args:
+            kind (str): Type of the record, "generation" or "organism".
+            **fields: Values of the record.
+        """
+
+        if (self.enabled):
+            line = json.dumps({"type": kind, "time": time.time(), **fields})
+            with self.lock:
+                self.file.write(line + "\n")
+                self.file.flush()
+
+    def end_generation(self, gen: int, **fields):
+        """Writes the totals of a generation as a record, and starts the totals of the next.
+
+        Args:
+            gen (int): Generation number, or "elites" for the re-simulated elites.
+            **fields: Additional values of the record, such as fitness metrics.
+        """
+
+        if (self.enabled):
+            with self.lock:
+                totals = self.totals
+                self.totals = dict()
+            self.record("generation", **{"gen": gen, **fields, **totals})
+
+    def close(self):
+        """Closes the record file, if open."""
+
+        if (self.file != None):
+            self.file.close()
+            self.file = None
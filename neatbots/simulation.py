@@ -1,17 +1,204 @@
-import os, shutil, subprocess, re
-from pyexpat.errors import XML_ERROR_MISPLACED_XML_PI
+import os, shutil, subprocess, re, tempfile, time
 import numpy as np
 from lxml import etree
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 
-from lxml import etree
-from neatbots.VoxcraftVXA import VXA
+from neatbots.VoxcraftVXA import VXA, occupied_bounds, collect_settings
 from neatbots.VoxcraftVXD import VXD
+from neatbots.recorder import Recorder
+from neatbots.trajectory import TrajectoryWriter
+
+class HistoryStream():
+    """Class writing voxcraft-sim output into history files as it is read."""
+
+    # Separator between the execution log and each organism's history
+    SPLIT = b"HISTORY_SPLIT"
+    # Most bytes held at the start of a section while waiting for its organism name, after which it is kept in the log
+    HEADER_LIMIT = 1 << 16
+
+    def __init__(self, generation_path: os.path, chunk_size: int = 1 << 20, keep_log: bool = True, trajectories: bool = False):
+        """Constructs a HistoryStream object.
+
+        Args:
+            generation_path (os.path): Absolute path for storing history files.
+            chunk_size (int, optional): Number of bytes read at once. Defaults to 1 MiB.
+            keep_log (bool, optional): Flag for always writing the execution log, otherwise only when histories were recorded. Defaults to True.
+            trajectories (bool, optional): Flag for converting each organism's history into a binary .traj file of voxel positions,
+                                           instead of writing a .history file. Defaults to False.
+
+        Returns:
+            (HistoryStream): HistoryStream object with the specified arguments.
+        """
+
+        self.generation_path = generation_path
+        self.chunk_size = chunk_size
+        self.keep_log = keep_log
+        self.trajectories = trajectories
+        self.recorded = 0
+        self.parse_time = 0.0
+
+        # Execution log, scanned line by line for diverged simulations, and otherwise written beside it until histories are known
+        self.log_path = os.path.join(generation_path, "log.history")
+        self.log = open(self.log_path if keep_log else self.log_path + ".tmp", "wb")
+        self.line = b""
+        self.diverged = set()
+
+        # Destination of the current section, with its start held until the organism is known
+        self.file = self.log
+        self.header = None
+
+    def read(self, stream):
+        """Reads simulator output until it ends, keeping memory bounded by the chunk size.
+
+        Args:
+            stream (io.BufferedReader): Binary stream of simulator output.
+
+        Returns:
+            (Set[str]): Names of organisms whose simulations diverged.
+        """
+
+        pending = b""
+        while True:
+            data = stream.read(self.chunk_size)
+            if not data: break
+
+            # Time spent handling output, excluding waiting on the simulator
+            start = time.perf_counter()
+            sections = (pending + data).split(HistoryStream.SPLIT)
+            for section in sections[:-1]:
+                self.write(section)
+                self.next_section()
+            # Hold back bytes which may begin a split marker
+            keep = len(HistoryStream.SPLIT) - 1
+            self.write(sections[-1][:-keep])
+            pending = sections[-1][-keep:]
+            self.parse_time += time.perf_counter() - start
+
+        self.write(pending)
+        self.close()
+        return self.diverged
+
+    def write(self, data: bytes):
+        """Writes part of a section to its destination.
+
+        Args:
+            data (bytes): Simulator output containing no split markers.
+        """
+
+        if (self.file == self.log) and (self.header == None):
+            self.log.write(data)
+            # Simulator reports divergence as 'Diverged: <path>/<organism>.vxd'
+            lines = (self.line + data).split(b"\n")
+            self.line = lines.pop()
+            for line in lines:
+                self.scan(line)
+        elif (self.header != None):
+            self.header += data
+            match = re.search(rb"runs: (.+?)\.vxd", self.header)
+            if (match != None):
+                self.recorded += 1
+                name = os.path.join(self.generation_path, match.group(1).decode("utf-8", errors="ignore"))
+                self.file = TrajectoryWriter(name + ".traj") if self.trajectories else open(name + ".history", "wb")
+                self.file.write(self.header)
+                self.header = None
+            elif (len(self.header) > HistoryStream.HEADER_LIMIT):
+                self.log.write(self.header)
+                self.header = None
+        else:
+            self.file.write(data)
+
+    def scan(self, line: bytes):
+        """Records organisms reported as diverged in a line of the execution log.
+
+        Args:
+            line (bytes): Line of the execution log.
+        """
+
+        start = line.find(b"Diverged:")
+        if (start >= 0):
+            for name in re.findall(rb"([^\s/\\]+)\.vxd", line[start:]):
+                self.diverged.add(name.decode("utf-8", errors="ignore"))
+
+    def next_section(self):
+        """Ends the current section, after which an organism's history begins."""
+
+        self.end_section()
+        self.header = b""
+
+    def end_section(self):
+        """Finishes writing the current section."""
+
+        if (self.line != b""):
+            self.scan(self.line)
+            self.line = b""
+        # History without an organism name is kept in the log
+        if (self.header != None):
+            self.log.write(self.header)
+            self.header = None
+        if (self.file != self.log):
+            self.file.close()
+            self.file = self.log
+
+    def close(self):
+        """Finishes writing all history files."""
+
+        self.end_section()
+
+        # Temporary log is only kept alongside recorded histories
+        self.log.close()
+        if (not self.keep_log):
+            if (self.recorded > 0):
+                os.replace(self.log_path + ".tmp", self.log_path)
+            else:
+                os.unlink(self.log_path + ".tmp")
+
+def read_results(results_path: os.path, diverged: set = frozenset(), metrics: tuple = ()):
+    """Streams the per-organism records of a results file, freeing each record once read so that memory 
+    does not grow with the size of the file.
+
+    Args:
+        results_path (os.path): Path of the results.xml file.
+        diverged (set, optional): Names of organisms whose simulations diverged, scored as 0. Defaults to frozenset().
+        metrics (tuple, optional): Paths of additional values within each record, e.g. "currentCenterOfMass/x". Defaults to ().
+
+    Returns:
+        (List[str]): Organism IDs, in the order of the results file.
+        (np.ndarray): (N x 1+M) array of fitness scores followed by each metric, NaN where a metric is missing.
+    """
+
+    keys = list()
+    rows = list()
+    depth = 0
+    for event, elem in etree.iterparse(results_path, events=("start", "end")):
+        if (event == "start"):
+            depth += 1
+            continue
+        depth -= 1
+
+        # Records are the children of the detail tag
+        if (depth == 2) and (elem.getparent().tag == "detail"):
+            name = str(elem.tag)
+            values = [elem.findtext(path) for path in ("fitness_score",) + tuple(metrics)]
+            row = [np.nan if (v == None) else float(v) for v in values]
+            # Preventing specification-gaming using bugs by detecting simulation divergence
+            if (name in diverged):
+                row[0] = 0.0
+            keys.append(name.split("_")[1])
+            rows.append(row)
+
+            # Free the record and those before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    return keys, np.array(rows, dtype=float).reshape(len(rows), 1 + len(metrics))
 
 class Simulation():
     """Class representing a simulation process for voxel-based organisms."""
 
-    def __init__(self, exec_path: str, node_path: str, stor_path: str, vxa: VXA):
+    def __init__(self, exec_path: str, node_path: str, stor_path: str, vxa: VXA, shards: int = 1, max_concurrent: int = None, 
+                 scratch_path: str = None, settings_path: str = None, trajectories: bool = False):
         """Constructs a Simulation object.
 
         Args:
@@ -19,6 +206,14 @@ class Simulation():
             node_path (str): Relative path for the 'vx3_node_worker' executable.
             stor_path (str): Relative path for generation directories.
             vxa (VXA): Instance of VXA class containing simulation execution settings.
+            shards (int, optional): Number of simulator processes each generation is split across. Defaults to 1.
+            max_concurrent (int, optional): Maximum number of simulator processes running at once, all shards if None. Defaults to None.
+            scratch_path (str, optional): Path for temporary generation directories (e.g. a tmpfs such as /dev/shm), enabling low-I/O mode
+                                          where directories are deleted after simulation unless persisted. Defaults to None.
+            settings_path (str, optional): Path for settings files shared between generations, and between simulations using the same path 
+                                           (e.g. trials of a sweep). Within the storage or scratch directory if None. Defaults to None.
+            trajectories (bool, optional): Flag for storing recorded histories as binary trajectory files, read with neatbots.trajectory.Trajectory,
+                                           instead of history text files. Defaults to False.
 
         Returns:
             (Simulation): Simulation object with the specified arguments.
@@ -29,14 +224,34 @@ class Simulation():
         self.node_path = node_path
         self.stor_path = stor_path
 
+        # Split generations across simulator processes to fill multi-device and multi-core hosts
+        self.shards = shards
+        self.max_concurrent = max_concurrent
+
         # Clear the storage directory
         self.empty_directory(self.stor_path)
 
+        # Private scratch directory, as the scratch path may be shared
+        self.scratch_path = None
+        if (scratch_path != None):
+            os.makedirs(scratch_path, exist_ok=True)
+            self.scratch_path = tempfile.mkdtemp(prefix="neatbots_", dir=scratch_path)
+
+        # Settings files are linked into each generation, rather than written again
+        self.settings_path = settings_path if (settings_path != None) else os.path.join(self.scratch_path or self.stor_path, "settings")
+
+        # Recorded histories are converted to trajectories as they are read
+        self.trajectories = trajectories
+
         # Configure simulation settings
         self.vxa = vxa
+        # Morphology shapes known to fit the spawn area
+        self.spawn_checked = set()
+        # Per-stage timings, disabled unless set by an evolution process
+        self.recorder = Recorder()
 
 
-    def encode_morphology(self, morphology: List[int], generation_path: os.path, label: str, step_size: int = 0):
+    def encode_morphology(self, morphology: List[int], generation_path: os.path, label: str, step_size: int = 0, phase_offset: np.ndarray = None):
         """Encodes a 3D array of integers as an XML tree describing a soft-body robot and writes it as a .vxd file.
 
         Args:
@@ -44,44 +259,96 @@ class Simulation():
             generation_path (os.path): Absolute path for storing encodings.
             label (str): Filename for encoding.
             step_size (int, optional): Number of timesteps to record. Defaults to 0.
+            phase_offset (np.ndarray, optional): 3D array of actuation phase offsets for each voxel of the morphology, 
+                                                 the simulator's defaults are used if None. Defaults to None.
         """
         
         # Settings for simulated individual
         vxd = VXD()
         vxd.set_tags(RecordStepSize=step_size, RecordFixedVoxels=1)
-        data = morphology
-
-        # Pull environment from VXA
-        environment, spawnpoint = self.vxa.get_voxelspace()
-
-        if (environment.shape != (0, 0, 0)):
-            
-            # Morphology shape
-            mW, mH, mD = morphology.shape
-            # Environment Shape
-            eW, eH, eD = environment.shape
-            # Origin for morphology insertion
-            oX, oY, oZ = spawnpoint
-            # Check area is within environment bounds
-            if (oX < 0) or (oY < 0) or (oZ < 0) or (oX+mW > eW) or (oY+mH > eH) or (oZ+mD > eD):
-                raise Exception("Spawn location exceeds environment bounds, please check your gym configuration")
-            # Check area is empty
-            if (np.any(environment[oX:oX+mW, oY:oY+mH, oZ:oZ+mD])):
-                raise Exception("Spawn location is not empty, please check your gym configuration")
-
-            # Insert morphology into the environment
-            environment[oX:oX+mW, oY:oY+mH, oZ:oZ+mD] = morphology
-
-            data = environment
-
-        # Optimise the space
-        xL, yL, zL = np.where(data!=0)
-        opt_data = data[min(xL):max(xL)+1,min(yL):max(yL)+1,min(zL):max(zL)+1]
 
         # Set data and store in file
-        vxd.set_data(opt_data)
+        vxd.set_data(self.place_morphology(morphology))
+        if (phase_offset is not None):
+            vxd.set_phase_offset(self.place_morphology(morphology, phase_offset))
         vxd.write(os.path.join(generation_path, label + ".vxd"))
 
+    def place_morphology(self, morphology: np.ndarray, values: np.ndarray = None):
+        """Inserts a morphology into the environment at its spawnpoint, cropped to the occupied space.
+
+        Args:
+            morphology (np.ndarray): 3D array of integers.
+            values (np.ndarray, optional): 3D array of per-voxel values to place instead of the material IDs, such as phase offsets, 
+                                           with zeros for the environment. Defaults to None.
+
+        Returns:
+            (np.array): 3D array of integers describing the optimised space.
+        """
+
+        morphology = np.asarray(morphology)
+        environment, spawnpoint = self.vxa.environment, self.vxa.spawnpoint
+        source = morphology if (values is None) else np.asarray(values)
+
+        # Without an environment, only the morphology is simulated
+        if (environment.shape == (0, 0, 0)):
+            bounds = occupied_bounds(morphology)
+            if (bounds == None):
+                raise Exception("Organism has no voxels to simulate")
+            (xL, yL, zL), (xH, yH, zH) = bounds
+            return source[xL:xH, yL:yH, zL:zH]
+
+        # Origin for morphology insertion, checked once per morphology shape
+        origin = np.array(spawnpoint)
+        if (morphology.shape not in self.spawn_checked):
+            self.check_spawn(morphology.shape)
+
+        # Optimise the space, bounding both the static environment and the morphology
+        env_bounds = self.vxa.environment_bounds
+        mor_bounds = occupied_bounds(morphology)
+        if (mor_bounds != None):
+            mor_bounds = (mor_bounds[0] + origin, mor_bounds[1] + origin)
+        bounds = [b for b in (env_bounds, mor_bounds) if b != None]
+        if (len(bounds) == 0):
+            raise Exception("Organism has no voxels to simulate")
+        lo = np.min([b[0] for b in bounds], axis=0)
+        hi = np.max([b[1] for b in bounds], axis=0)
+
+        # Copy only the cropped environment
+        if (values is None):
+            data = environment[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]].astype(np.result_type(environment, morphology))
+        else:
+            data = np.zeros(hi - lo, dtype=source.dtype)
+
+        # Insert the occupied part of the morphology into the environment
+        if (mor_bounds != None):
+            (xL, yL, zL), (xH, yH, zH) = mor_bounds[0] - lo, mor_bounds[1] - lo
+            (mXL, mYL, mZL), (mXH, mYH, mZH) = mor_bounds[0] - origin, mor_bounds[1] - origin
+            data[xL:xH, yL:yH, zL:zH] = source[mXL:mXH, mYL:mYH, mZL:mZH]
+
+        return data
+
+    def check_spawn(self, shape: tuple):
+        """Checks that a morphology shape fits into the empty spawn area of the environment.
+
+        Args:
+            shape (tuple): Width, height and depth of the morphology.
+        """
+
+        # Morphology shape
+        mW, mH, mD = shape
+        # Environment Shape
+        eW, eH, eD = self.vxa.environment.shape
+        # Origin for morphology insertion
+        oX, oY, oZ = self.vxa.spawnpoint
+        # Check area is within environment bounds
+        if (oX < 0) or (oY < 0) or (oZ < 0) or (oX+mW > eW) or (oY+mH > eH) or (oZ+mD > eD):
+            raise Exception("Spawn location exceeds environment bounds, please check your gym configuration")
+        # Check area is empty
+        if (np.any(self.vxa.environment[oX:oX+mW, oY:oY+mH, oZ:oZ+mD])):
+            raise Exception("Spawn location is not empty, please check your gym configuration")
+
+        self.spawn_checked.add(tuple(shape))
+
     def empty_directory(self, target_path: os.path):
         """Empties a directory completely (OS agnostic).
 
@@ -95,6 +362,13 @@ class Simulation():
             for d in dirs:
                 shutil.rmtree(os.path.join(root, d))
 
+    def close(self):
+        """Deletes the private scratch directory in low-I/O mode, along with the settings files kept within it unless a settings path was given. \n
+        Directories created afterwards are made within it again, so the simulation can still be used."""
+
+        if (self.scratch_path != None):
+            shutil.rmtree(self.scratch_path, ignore_errors=True)
+
     def create_directory(self, target_dir: str):
         """Creates a directory and stores the simulation settings within.
 
@@ -105,15 +379,37 @@ class Simulation():
             (os.path): Absolute path to the newly created directory.
         """
 
-        # Make storage directory if not already made
-        gene_path = os.path.join(self.stor_path, target_dir)
+        # Make storage directory if not already made, in scratch space for low-I/O mode
+        gene_path = os.path.join(self.scratch_path or self.stor_path, target_dir)
         os.makedirs(gene_path, exist_ok=True)
         # Ensure directory is empty
         #self.empty_directory(gene_path)
         return gene_path
 
+    def release_directory(self, generation_path: os.path, persist: bool = False):
+        """Finishes with a directory once its fitness scores have been parsed. \n
+        In low-I/O mode the directory is deleted from scratch space, or moved into storage if persisted. 
+        Otherwise it is left in storage.
+
+        Args:
+            generation_path (os.path): Absolute path of the directory.
+            persist (bool, optional): Flag for keeping the directory in storage. Defaults to False.
+        """
+
+        if (self.scratch_path == None):
+            return
+
+        if (persist):
+            stor_path = os.path.join(self.stor_path, os.path.relpath(generation_path, self.scratch_path))
+            if os.path.exists(stor_path):
+                shutil.rmtree(stor_path)
+            shutil.move(generation_path, stor_path)
+        else:
+            shutil.rmtree(generation_path, ignore_errors=True)
+
     def simulate_generation(self, generation_path: os.path):
-        """Runs a VoxCraft-Sim simulation with the specified settings and inputs.
+        """Runs a VoxCraft-Sim simulation with the specified settings and inputs. \n
+        With multiple shards, the organisms are split between concurrent simulator processes and their results merged.
 
         Args:
             generation_path (os.path): Absolute path to settings and organism files.
@@ -122,39 +418,120 @@ class Simulation():
            (Dict[str, int]): Dictionary of id-fitness pairs describing organism performance.
         """
 
-        # Run voxcraft-sim as subprocess 
-        voxcraft_out = subprocess.run([self.exec_path,
-                                      '-i', generation_path, 
-                                      '-o', os.path.join(generation_path, "results.xml"), 
-                                      '-w', self.node_path,
-                                      '--force'], 
-                                      stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE)
-
-        # Parse history
-        hist_split = voxcraft_out.stdout.decode("utf-8", errors='ignore').split("HISTORY_SPLIT")
-        hist_rec = hist_split[1:]
-        hist_dict = {re.search(r"runs: (.+?)\.vxd", hist).group(1):hist for hist in hist_rec}
-        # Seperate execution log
-        hist_log = hist_split[0]
-        hist_dict["log"] = hist_log
-
-        # Write history files
-        for key in hist_dict.keys():
-            with open(os.path.join(generation_path, key + ".history"), "w") as f:
-                f.write(hist_dict[key])
+        keys, values = self.simulate_metrics(generation_path)
+        return dict(zip(keys, values[:, 0].tolist()))
 
-        # Parse fitness scores
-        with open(os.path.join(generation_path, "results.xml"), 'r') as f:
-            tree = etree.parse(f)
-            
-        # Pair organisms with their fitnesses
-        fitnesses = {str(r.tag).split("_")[1]: float(r.xpath("fitness_score")[0].text) for r in tree.xpath("//detail/*")}
-
-        # Prevent specification-gaming using bugs by detecting simulation divergence
-        for k in fitnesses.keys():
-            if (re.search(r"Diverged:.+"+ str(k) +".vxd", hist_dict["log"]) != None):
-                fitnesses[k] = 0.0
-        
-        return fitnesses
+    def simulate_metrics(self, generation_path: os.path, metrics: tuple = ()):
+        """Runs a VoxCraft-Sim simulation with the specified settings and inputs, returning fitness scores
+        and any additional metrics recorded in the results as an array.
+
+        Args:
+            generation_path (os.path): Absolute path to settings and organism files.
+            metrics (tuple, optional): Paths of additional values within each organism's results, e.g. "currentCenterOfMass/x". Defaults to ().
+
+        Returns:
+            (List[str]): Organism IDs.
+            (np.ndarray): (N x 1+M) array of fitness scores followed by each metric, one row per organism ID.
+        """
+
+        vxd_files = sorted(f for f in os.listdir(generation_path) if f.endswith(".vxd"))
+        n_shards = min(self.shards, len(vxd_files))
+
+        if (n_shards <= 1):
+            return self.run_simulator(generation_path, metrics)
+
+        # Split organisms evenly between shard directories sharing the generation's settings
+        shard_paths = list()
+        for i in range(n_shards):
+            shard_path = os.path.join(generation_path, "shard_" + str(i))
+            os.makedirs(shard_path, exist_ok=True)
+            self.link_file(os.path.join(generation_path, "base.vxa"), os.path.join(shard_path, "base.vxa"))
+            for f in vxd_files[i::n_shards]:
+                os.replace(os.path.join(generation_path, f), os.path.join(shard_path, f))
+            shard_paths.append(shard_path)
+
+        # Simulate shards concurrently
+        with ThreadPoolExecutor(max_workers=self.max_concurrent or n_shards) as executor:
+            shard_results = list(executor.map(self.run_simulator, shard_paths, [metrics] * n_shards))
+
+        # Merge logs, where written, and files back into the generation directory
+        shard_logs = [os.path.join(shard_path, "log.history") for shard_path in shard_paths]
+        if any(os.path.exists(shard_log) for shard_log in shard_logs):
+            with open(os.path.join(generation_path, "log.history"), "wb") as log:
+                for shard_log in shard_logs:
+                    if os.path.exists(shard_log):
+                        with open(shard_log, "rb") as f:
+                            shutil.copyfileobj(f, log)
+        for i, shard_path in enumerate(shard_paths):
+            os.replace(os.path.join(shard_path, "results.xml"), os.path.join(generation_path, "results_" + str(i) + ".xml"))
+            for f in os.listdir(shard_path):
+                if f not in ("base.vxa", "log.history"):
+                    os.replace(os.path.join(shard_path, f), os.path.join(generation_path, f))
+            shutil.rmtree(shard_path)
+
+        keys = [key for shard_keys, _ in shard_results for key in shard_keys]
+        return keys, np.concatenate([values for _, values in shard_results])
+
+    def write_settings(self, generation_path: os.path):
+        """Stores the simulation settings, including the current palette, in a generation directory.
+
+        Args:
+            generation_path (os.path): Absolute path of the generation directory.
+        """
+
+        self.vxa.write(os.path.join(generation_path, "base.vxa"), shared_dir=self.settings_path)
+
+    def collect_settings(self, before: float):
+        """Removes shared settings files no longer used by any generation, keeping those written since the given time.
+
+        Args:
+            before (float): Time, in seconds since the epoch, after which settings files are kept.
+        """
+
+        collect_settings(self.settings_path, before)
+
+    def link_file(self, src_path: os.path, dst_path: os.path):
+        """Shares a file at a second path, copying it where links are unsupported.
+
+        Args:
+            src_path (os.path): Path of the existing file.
+            dst_path (os.path): Path to share the file at.
+        """
+
+        if os.path.exists(dst_path):
+            os.unlink(dst_path)
+        try:
+            os.link(src_path, dst_path)
+        except OSError:
+            shutil.copyfile(src_path, dst_path)
+
+    def run_simulator(self, input_path: os.path, metrics: tuple = ()):
+        """Runs a single VoxCraft-Sim process over a directory of settings and organism files.
+
+        Args:
+            input_path (os.path): Absolute path to settings and organism files.
+            metrics (tuple, optional): Paths of additional values within each organism's results. Defaults to ().
 
+        Returns:
+            (List[str]): Organism IDs.
+            (np.ndarray): (N x 1+M) array of fitness scores followed by each metric, one row per organism ID.
+        """
+
+        # Run voxcraft-sim as subprocess, writing history files as its output arrives
+        voxcraft_proc = subprocess.Popen([self.exec_path,
+                                         '-i', input_path, 
+                                         '-o', os.path.join(input_path, "results.xml"), 
+                                         '-w', self.node_path,
+                                         '--force'], 
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        with self.recorder.stage("simulator"):
+            history = HistoryStream(input_path, keep_log=(self.scratch_path == None), trajectories=self.trajectories)
+            with voxcraft_proc.stdout:
+                diverged = history.read(voxcraft_proc.stdout)
+            voxcraft_proc.wait()
+        self.recorder.add("stdout_parse", history.parse_time)
+
+        # Parse fitness scores
+        with self.recorder.stage("results_parse"):
+            return read_results(os.path.join(input_path, "results.xml"), diverged, metrics)
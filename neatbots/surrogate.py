@@ -0,0 +1,182 @@
+import numpy as np
+
+from neatbots.VoxcraftVXA import VXA, PROPERTIES, PROPERTY_SPANS
+
+# Properties scaled by powers of ten, compared by their exponents
+LOG_PROPERTIES = np.array([tag in ("Elastic_Mod", "Density", "CTE") for tag in PROPERTIES.keys()], dtype=bool)
+# Length of the feature vector describing a morphology
+N_FEATURES = 7 + len(PROPERTIES) + 2
+
+def morphology_features(morphology: np.ndarray, phase_offset: np.ndarray, vxa: VXA):
+    """Describes a morphology by its shape, materials and actuation, as a fixed-length feature vector.
+
+    Args:
+        morphology (np.ndarray): 3D array of material IDs.
+        phase_offset (np.ndarray): 3D array of actuation phase offsets for each voxel, or None.
+        vxa (VXA): Instance of VXA class containing the materials referenced by the morphology.
+
+    Returns:
+        (np.array): Feature vector of fill fraction, extents, centre of mass, mean material properties and phase offset statistics.
+    """
+
+    morphology = np.asarray(morphology)
+    shape = np.array(morphology.shape, dtype=float)
+    filled = morphology != 0
+    n_filled = np.count_nonzero(filled)
+    features = np.zeros(N_FEATURES)
+    if (n_filled == 0):
+        return features
+
+    # Fill fraction, occupied extents and centre of mass, relative to the organism space
+    coords = np.argwhere(filled)
+    features[0] = n_filled / morphology.size
+    features[1:4] = (coords.max(axis=0) - coords.min(axis=0) + 1) / shape
+    features[4:7] = coords.mean(axis=0) / shape
+
+    # Mean properties of the filled voxels, each normalised by its range
+    props = vxa.materials.props.copy()
+    props[:, LOG_PROPERTIES] = np.log10(np.maximum(props[:, LOG_PROPERTIES], 1e-12))
+    props /= np.where(LOG_PROPERTIES, 1.0, PROPERTY_SPANS)
+    table = np.zeros((max(np.max(vxa.materials.ids, initial=0), np.max(morphology)) + 1, len(PROPERTIES)))
+    table[vxa.materials.ids] = props
+    features[7:7 + len(PROPERTIES)] = table[morphology[filled]].mean(axis=0)
+
+    # Actuation of the filled voxels
+    if (phase_offset is not None):
+        phases = np.asarray(phase_offset)[filled]
+        features[-2:] = phases.mean(), phases.std()
+
+    return features
+
+def rank_correlation(a: np.ndarray, b: np.ndarray):
+    """Calculates the Spearman rank correlation between two sets of values.
+
+    Args:
+        a (np.ndarray): First set of values.
+        b (np.ndarray): Second set of values.
+
+    Returns:
+        (float): Correlation between -1 and 1, or NaN if either set is constant or has fewer than 2 values.
+    """
+
+    if (len(a) < 2) or (np.ptp(a) == 0) or (np.ptp(b) == 0):
+        return float("nan")
+    ranks_a = np.argsort(np.argsort(a))
+    ranks_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+class Surrogate:
+    """Class representing a ridge regression model of fitness, learnt online from simulated organisms and used to
+    skip simulating organisms predicted to perform poorly."""
+
+    def __init__(self, fraction: float = 0.5, explore: float = 0.1, min_samples: int = 32, alpha: float = 1.0, max_samples: int = 10000):
+        """Constructs a Surrogate object.
+
+        Args:
+            fraction (float, optional): Fraction of each population with the highest predicted fitness which is simulated. Defaults to 0.5.
+            explore (float, optional): Fraction of each population simulated at random from the remainder,
+                                       measuring the model's accuracy on the organisms it would skip. Defaults to 0.1.
+            min_samples (int, optional): Number of simulated organisms required before any are skipped. Defaults to 32.
+            alpha (float, optional): Strength of the ridge penalty. Defaults to 1.0.
+            max_samples (int, optional): Number of the most recent simulated organisms the model is fitted to. Defaults to 10000.
+
+        Returns:
+            (Surrogate): Surrogate object with the specified arguments.
+        """
+
+        self.fraction = fraction
+        self.explore = explore
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.max_samples = max_samples
+
+        # Training data, and the fitted model
+        self.features = np.zeros(shape=(0, N_FEATURES))
+        self.fitness = np.zeros(shape=(0,))
+        self.weights = None
+
+        # Accuracy and savings of each screened population
+        self.reports = list()
+
+    def predict(self, features: np.ndarray):
+        """Predicts the fitness of organisms.
+
+        Args:
+            features (np.ndarray): (N x F) array of feature vectors.
+
+        Returns:
+            (np.array): Predicted fitness scores, or None if the model has not been fitted.
+        """
+
+        if (self.weights == None):
+            return None
+        mean, scale, weights, bias = self.weights
+        return ((features - mean) / scale) @ weights + bias
+
+    def screen(self, features: np.ndarray):
+        """Chooses which organisms of a population to simulate: those with the highest predicted fitness,
+        and an exploration quota chosen at random from the rest.
+
+        Args:
+            features (np.ndarray): (N x F) array of feature vectors.
+
+        Returns:
+            (np.array): Boolean mask of organisms to simulate.
+            (np.array): Predicted fitness scores, or None if the model has not been fitted.
+        """
+
+        n = len(features)
+        predicted = self.predict(features)
+        if (predicted is None) or (n == 0):
+            return np.ones(n, dtype=bool), predicted
+
+        simulate = np.zeros(n, dtype=bool)
+        order = np.argsort(-predicted, kind="stable")
+        simulate[order[:int(np.ceil(self.fraction * n))]] = True
+
+        # Exploration keeps the model honest about organisms it ranks poorly
+        rest = np.flatnonzero(~simulate)
+        n_explore = min(len(rest), int(np.ceil(self.explore * n)))
+        simulate[np.random.choice(rest, n_explore, replace=False)] = True
+
+        return simulate, predicted
+
+    def update(self, features: np.ndarray, fitness: np.ndarray, predicted: np.ndarray = None, skipped: int = 0):
+        """Adds simulated organisms to the training data and refits the model, reporting how well they were predicted.
+
+        Args:
+            features (np.ndarray): (N x F) array of feature vectors of simulated organisms.
+            fitness (np.ndarray): Simulated fitness scores.
+            predicted (np.ndarray, optional): Fitness scores predicted before simulating, if screened. Defaults to None.
+            skipped (int, optional): Number of organisms in the population given predicted fitness scores. Defaults to 0.
+
+        Returns:
+            (dict): Number of simulated and skipped organisms, mean absolute error and rank correlation of the predictions.
+        """
+
+        report = {"simulated": len(fitness), "skipped": skipped, "mae": float("nan"), "rank_corr": float("nan")}
+        if (predicted is not None) and (len(fitness) > 0):
+            report["mae"] = float(np.mean(np.abs(predicted - fitness)))
+            report["rank_corr"] = rank_correlation(predicted, fitness)
+        self.reports.append(report)
+
+        if (len(fitness) > 0):
+            self.features = np.vstack([self.features, features])[-self.max_samples:]
+            self.fitness = np.concatenate([self.fitness, fitness])[-self.max_samples:]
+
+        if (len(self.fitness) >= self.min_samples):
+            self.fit()
+
+        return report
+
+    def fit(self):
+        """Fits the ridge regression model to the training data, on standardised features."""
+
+        mean = self.features.mean(axis=0)
+        scale = self.features.std(axis=0)
+        scale[scale == 0] = 1.0
+        X = (self.features - mean) / scale
+        bias = self.fitness.mean()
+
+        weights = np.linalg.solve(X.T @ X + self.alpha * np.eye(X.shape[1]), X.T @ (self.fitness - bias))
+        self.weights = (mean, scale, weights, bias)
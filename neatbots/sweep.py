@@ -0,0 +1,169 @@
+import os
+import pandas as pd
+from typing import Callable, Dict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import MultiNEAT as NEAT
+
+from neatbots.evolution import Evolution
+
+RESULT_COLUMNS = ["Exp No.", "Test No.", "Test Value", "Evo Speed", "Evo Accel", "Max Avg Fit", "Generation of Max Avg Fit"]
+
+def build_params(values: Dict[str, object]):
+    """Builds MultiNEAT parameters from a dictionary, as parameter objects cannot be sent between processes.
+
+    Args:
+        values (Dict[str, object]): Dictionary of parameter names and values, all others are MultiNEAT defaults.
+
+    Returns:
+        (NEAT.Parameters): Parameters with the specified values.
+    """
+
+    params = NEAT.Parameters()
+    for name, value in values.items():
+        params.__setattr__(name, value)
+    return params
+
+def run_trial(setup: Callable[[NEAT.Parameters, str], Evolution], values: Dict[str, object], stor_path: str):
+    """Worker task which evolves organisms for a single trial.
+
+    Args:
+        setup (Callable[[NEAT.Parameters, str], Evolution]): Module-level function creating the evolution object from parameters and a storage path.
+        values (Dict[str, object]): Dictionary of parameter names and values for this trial.
+        stor_path (str): Relative path of the directory storing this trial's generations.
+
+    Returns:
+        (tuple): Evolution speed, acceleration, maximum average fitness and the generation it was reached.
+    """
+
+    os.makedirs(stor_path, exist_ok=True)
+    _, evo_speed, evo_accel, max_avg, max_avg_gen = setup(build_params(values), stor_path).evolve_organisms(elites=False, verbose=False)
+    return evo_speed, evo_accel, max_avg, max_avg_gen
+
+class Sweep:
+    """Class representing a resumable hyperparameter sweep, testing one hyperparameter at a time."""
+
+    def __init__(self, setup: Callable[[NEAT.Parameters, str], Evolution], exp_ranges: Dict[str, list], control_params: Dict[str, object] = None,
+                 results_path: str = "./Experiment_Results.csv", stor_path: str = "./generations", workers: int = 1):
+        """Constructs a Sweep object.
+
+        Args:
+            setup (Callable[[NEAT.Parameters, str], Evolution]): Module-level function creating the evolution object from parameters and a storage path.
+            exp_ranges (Dict[str, list]): Dictionary of hyperparameter names and [default, test values] pairs.
+            control_params (Dict[str, object], optional): Dictionary of parameter values shared by all trials. Defaults to None.
+            results_path (str, optional): Relative path of the results file, trials already recorded within are skipped. Defaults to "./Experiment_Results.csv".
+            stor_path (str, optional): Relative path of the directory containing each trial's storage directory. Defaults to "./generations".
+            workers (int, optional): Number of trials run at once. Defaults to 1.
+
+        Returns:
+            (Sweep): Sweep object with the specified arguments.
+        """
+
+        self.setup = setup
+        self.exp_ranges = exp_ranges
+        self.control_params = control_params if (control_params != None) else dict()
+        self.results_path = results_path
+        self.stor_path = stor_path
+        self.workers = workers
+
+    def trials(self):
+        """Lists every trial in the sweep, with all other hyperparameters at their defaults.
+
+        Returns:
+            (Dict[tuple, Dict[str, object]]): Dictionary of (experiment number, test number) keys and trial parameter values.
+        """
+
+        defaults = {name: default for name, (default, _) in self.exp_ranges.items()}
+
+        trials = dict()
+        for e, (exp_param, (_, test_vals)) in enumerate(self.exp_ranges.items()):
+            for t, test_val in enumerate(test_vals):
+                trials[(str("%02d")%(e+1), str("%02d")%(t+1))] = {**self.control_params, **defaults, exp_param: test_val}
+        return trials
+
+    def load_results(self):
+        """Reads the trials recorded so far, creating the results file if required.
+
+        Returns:
+            (pd.DataFrame): Dataframe of recorded trials.
+        """
+
+        # Discard a row left incomplete by an interruption
+        contents = b""
+        if os.path.exists(self.results_path):
+            with open(self.results_path, mode="rb+") as f:
+                contents = f.read()
+                if not contents.endswith(b"\n"):
+                    f.truncate(contents.rfind(b"\n") + 1)
+
+        # Write the header if the file is new, or was interrupted before the header was complete
+        if (b"\n" not in contents):
+            with open(self.results_path, mode="w") as f:
+                f.write(",".join(RESULT_COLUMNS) + "\n")
+
+        return pd.read_csv(self.results_path, dtype={"Exp No.": str, "Test No.": str})
+
+    def record_result(self, key: tuple, test_val: object, result: tuple):
+        """Appends a finished trial to the results file immediately.
+
+        Args:
+            key (tuple): Experiment and test number of the trial.
+            test_val (object): Value of the tested hyperparameter.
+            result (tuple): Evolution speed, acceleration, maximum average fitness and the generation it was reached.
+        """
+
+        fmt_result = pd.DataFrame([[*key, test_val, *result]])
+        with open(self.results_path, mode="a") as f:
+            fmt_result.to_csv(f, float_format="%+07.2f", header=False, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, verbose: bool = False):
+        """Runs every trial not yet recorded, then selects the best value of each hyperparameter.
+
+        Args:
+            verbose (bool, optional): Flag for per-trial output. Defaults to False.
+
+        Returns:
+            (Dict[str, object]): Dictionary of hyperparameter names and the values with the highest maximum average fitness.
+        """
+
+        trials = self.trials()
+        recorded = self.load_results()
+        done = set(zip(recorded["Exp No."], recorded["Test No."]))
+        remaining = [key for key in trials.keys() if key not in done]
+
+        if(verbose): print("#========== Sweep: {0} of {1} trials remaining ==========#".format(len(remaining), len(trials)))
+
+        exp_params = list(self.exp_ranges.keys())
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(run_trial, self.setup, trials[key],
+                                       os.path.join(self.stor_path, "exp_{0}_test_{1}".format(*key))): key for key in remaining}
+
+            # Record trials in the order they finish
+            for future in as_completed(futures):
+                key = futures[future]
+                test_val = trials[key][exp_params[int(key[0]) - 1]]
+                self.record_result(key, test_val, future.result())
+
+                if(verbose): print("  Exp {0} | Test {1} | {2} = {3}".format(*key, exp_params[int(key[0]) - 1], test_val))
+
+        return self.optimal_values()
+
+    def optimal_values(self):
+        """Selects the test value with the highest maximum average fitness for each hyperparameter, from the results file.
+
+        Returns:
+            (Dict[str, object]): Dictionary of hyperparameter names and their best values, omitting those without a positive fitness.
+        """
+
+        recorded = self.load_results().sort_values(["Exp No.", "Test No."])
+
+        optimal = dict()
+        for e, (exp_param, (_, test_vals)) in enumerate(self.exp_ranges.items()):
+            rec_max_avg = 0
+            exp_results = recorded[recorded["Exp No."] == str("%02d")%(e+1)]
+            for test_no, max_avg in zip(exp_results["Test No."], exp_results["Max Avg Fit"]):
+                if (rec_max_avg < max_avg):
+                    rec_max_avg = max_avg
+                    optimal[exp_param] = test_vals[int(test_no) - 1]
+        return optimal
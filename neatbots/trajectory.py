@@ -0,0 +1,195 @@
+import os
+import re
+import struct
+import sys
+import numpy as np
+
+# Trajectory files: magic bytes, float32 voxel positions frame after frame, the frame index, then its offset and length
+TRAJECTORY_MAGIC = b"NEATTRJ1"
+FOOTER = struct.Struct("<QQ")
+# Step number, time and the rows of positions holding each frame
+INDEX_DTYPE = np.dtype([("step", "<i8"), ("time", "<f8"), ("start", "<i8"), ("count", "<i8")])
+
+# Start of each recorded step in a history, followed by its voxels
+STEP_PATTERN = re.compile(rb"<<<Step(\d+) Time:([^>]*)>>>")
+
+def parse_positions(voxels: bytes):
+    """Parses the position of each voxel of a step, the first three of its fields.
+
+    Args:
+        voxels (bytes): Voxels of a step, separated by ';' with their fields separated by ','.
+
+    Raises:
+        ValueError: Indicates that a voxel has fewer than three numeric fields.
+
+    Returns:
+        (np.array): (V x 3) array of voxel positions.
+    """
+
+    # Number of fields of every voxel, from the commas before each separator
+    raw = np.frombuffer(voxels, dtype=np.uint8)
+    commas = np.concatenate([[0], np.cumsum(raw == ord(","))])
+    fields = np.diff(np.concatenate([[0], commas[np.flatnonzero(raw == ord(";"))], [commas[-1]]])) + 1
+
+    # Voxels with the same fields are parsed at once, others one at a time
+    if (np.all(fields == fields[0])) and (fields[0] >= 3):
+        values = np.array(voxels.replace(b";", b",").split(b","), dtype=np.float64)
+        return values.reshape(len(fields), -1)[:, :3].astype(np.float32)
+    if (np.min(fields) < 3):
+        raise ValueError("Voxel without a position")
+    return np.array([voxel.split(b",", 3)[:3] for voxel in voxels.split(b";")], dtype=np.float64).astype(np.float32)
+
+class TrajectoryWriter:
+    """Class converting an organism's history, as written by voxcraft-sim, into a trajectory file as it is read."""
+
+    def __init__(self, path: str):
+        """Constructs a TrajectoryWriter object, creating the trajectory file.
+
+        Args:
+            path (str): Path of the trajectory file.
+
+        Returns:
+            (TrajectoryWriter): TrajectoryWriter object with the specified arguments.
+        """
+
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(TRAJECTORY_MAGIC)
+        self.line = b""
+        self.index = list()
+        self.rows = 0
+
+    def write(self, data: bytes):
+        """Converts part of a history, holding back any incomplete step.
+
+        Args:
+            data (bytes): History text.
+        """
+
+        lines = (self.line + data).split(b"\n")
+        self.line = lines.pop()
+        for line in lines:
+            self.write_step(line)
+
+    def write_step(self, line: bytes):
+        """Appends the voxel positions of one step, ignoring lines which are not steps.
+
+        Args:
+            line (bytes): Line of history text.
+        """
+
+        match = STEP_PATTERN.match(line)
+        if (match == None):
+            return
+
+        # Voxels are separated by ';' and links follow '|', each voxel starting with its position
+        voxels = line[match.end():].split(b"|", 1)[0].rstrip(b";")
+        positions = np.zeros(shape=(0, 3), dtype=np.float32)
+        if (len(voxels) > 0):
+            try:
+                positions = parse_positions(voxels)
+            except ValueError:
+                print("WARNING: Skipped malformed step " + match.group(1).decode() + " of " + self.path, file=sys.stderr)
+                return
+
+        self.file.write(positions.tobytes())
+        self.index.append((int(match.group(1)), float(match.group(2)), self.rows, len(positions)))
+        self.rows += len(positions)
+
+    def close(self):
+        """Converts any final step and writes the frame index."""
+
+        if (self.line != b""):
+            self.write_step(self.line)
+            self.line = b""
+
+        offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(FOOTER.pack(offset, len(self.index)))
+        self.file.close()
+
+class Trajectory:
+    """Class representing a trajectory file, memory mapped so that frames are only read when accessed."""
+
+    def __init__(self, path: str):
+        """Constructs a Trajectory object, reading only the frame index.
+
+        Args:
+            path (str): Path of the trajectory file.
+
+        Raises:
+            Exception: Indicates that the file is not a complete trajectory file.
+
+        Returns:
+            (Trajectory): Trajectory object with the specified arguments.
+        """
+
+        self.path = path
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            magic = f.read(len(TRAJECTORY_MAGIC))
+            f.seek(max(size - FOOTER.size, 0))
+            footer = f.read(FOOTER.size)
+        if (magic != TRAJECTORY_MAGIC) or (size < len(TRAJECTORY_MAGIC) + FOOTER.size):
+            raise Exception("ERROR: " + str(path) + " is not a complete trajectory file")
+
+        offset, n_frames = FOOTER.unpack(footer)
+        self.index = np.fromfile(path, dtype=INDEX_DTYPE, count=n_frames, offset=offset)
+
+        rows = (offset - len(TRAJECTORY_MAGIC)) // 12
+        if (rows > 0):
+            self.positions = np.memmap(path, dtype=np.float32, mode="r", offset=len(TRAJECTORY_MAGIC), shape=(rows, 3))
+        else:
+            self.positions = np.zeros(shape=(0, 3), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.index)
+
+    def frames(self, start: int = 0, stop: int = None):
+        """Yields frames one at a time, reading each only when it is reached.
+
+        Args:
+            start (int, optional): First frame number. Defaults to 0.
+            stop (int, optional): Frame number after the last, the end of the trajectory if None. Defaults to None.
+
+        Returns:
+            (Generator[tuple]): Step number, time and (V x 3) read-only array of voxel positions of each frame.
+        """
+
+        stop = stop if (stop != None) else len(self.index)
+        for i in range(start, min(stop, len(self.index))):
+            yield int(self.index["step"][i]), float(self.index["time"][i]), self.frame(i)
+
+    def frame(self, i: int):
+        """Returns the voxel positions of a single frame.
+
+        Args:
+            i (int): Frame number.
+
+        Returns:
+            (np.array): (V x 3) read-only array of voxel positions.
+        """
+
+        start, count = self.index["start"][i], self.index["count"][i]
+        return self.positions[start:start + count]
+
+    def time_slice(self, start: float, stop: float):
+        """Returns the frames recorded within a period of simulated time, as a single view of the file.
+
+        Args:
+            start (float): Earliest time, inclusive.
+            stop (float): Latest time, exclusive.
+
+        Returns:
+            (np.array): Index records of the frames, with rows relative to the returned positions.
+            (np.array): (R x 3) read-only array of the voxel positions of every frame, one after another.
+        """
+
+        lo, hi = np.searchsorted(self.index["time"], [start, stop])
+        index = self.index[lo:hi].copy()
+        if (len(index) == 0):
+            return index, self.positions[0:0]
+
+        first = index["start"][0]
+        index["start"] -= first
+        return index, self.positions[first:first + index["count"].sum()]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Stand-in for the 'voxcraft-sim' executable, for running NEATbots without a CUDA device.
+
+Accepts the same arguments as voxcraft-sim, scores each .vxd file in the input directory
+deterministically from its contents, and writes a results.xml file in the same format.
+
+Latency, divergence and history length can be set by option or environment variable
+(FAKE_VOXCRAFT_LATENCY, FAKE_VOXCRAFT_DIVERGE, FAKE_VOXCRAFT_STEPS), as NEATbots runs the
+simulator with fixed arguments.
+"""
+
+import argparse, hashlib, os, re, sys, time
+
+def diverges(name, rate):
+    """Chooses organisms to diverge deterministically from their names."""
+
+    return int(hashlib.md5(name.encode("ascii")).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True)
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("-w", "--worker")
+    parser.add_argument("-f", "--force", action="store_true")
+    parser.add_argument("--latency", type=float, default=float(os.environ.get("FAKE_VOXCRAFT_LATENCY", 0.0)),
+                        help="seconds spent simulating each organism")
+    parser.add_argument("--diverge", type=float, default=float(os.environ.get("FAKE_VOXCRAFT_DIVERGE", 0.0)),
+                        help="fraction of organisms reported as diverged")
+    parser.add_argument("--steps", type=int, default=int(os.environ.get("FAKE_VOXCRAFT_STEPS", 3)),
+                        help="number of steps written to each history")
+    args = parser.parse_args()
+
+    names = sorted(f[:-len(".vxd")] for f in os.listdir(args.input) if f.endswith(".vxd"))
+
+    sys.stdout.write("Fake voxcraft-sim: %d files in %s\n" % (len(names), args.input))
+
+    details = list()
+    structures = dict()
+    for n, name in enumerate(names):
+        with open(os.path.join(args.input, name + ".vxd")) as f:
+            vxd = f.read()
+        layers = re.findall(r"<!\[CDATA\[(.*?)\]\]>", re.search(r"<Data>(.*?)</Data>", vxd, re.S).group(1))
+        structures[name] = (vxd, layers)
+
+        # Phase offsets are optional, and zero by default
+        phase_offset = re.search(r"<PhaseOffset>(.*?)</PhaseOffset>", vxd, re.S)
+        if (phase_offset != None):
+            phases = [[float(p) for p in layer.split(",")] for layer in re.findall(r"<!\[CDATA\[(.*?)\]\]>", phase_offset.group(1))]
+        else:
+            phases = [[0.0] * len(layer) for layer in layers]
+
+        time.sleep(args.latency)
+
+        # Fitness is the number of non-empty voxels, scaled by layer height and raised by their phase offsets
+        fitness = sum((z + 1) * sum(1.0 + p for c, p in zip(layer, phase) if c != "0")
+                      for z, (layer, phase) in enumerate(zip(layers, phases))) / 100.0
+        details.append("    <%s>\n      <fitness_score>%f</fitness_score>\n    </%s>\n" % (name, fitness, name))
+
+        if diverges(name, args.diverge):
+            sys.stdout.write("Simulation %d Diverged: %s.\n" % (n, os.path.join(args.input, name + ".vxd")))
+        sys.stdout.write("Simulation of %s.vxd finished.\n" % name)
+
+    # Histories follow the execution log, one section per recorded organism
+    for name in names:
+        vxd, layers = structures[name]
+        step_size = re.search(r"<RecordStepSize>(.*?)</RecordStepSize>", vxd)
+        if (step_size != None) and (float(step_size.group(1)) > 0):
+            sys.stdout.write("HISTORY_SPLIT\n Simulation runs: %s.vxd\n" % name)
+
+            # One position and colour per voxel, as in voxcraft-sim's history format
+            x_voxels = int(re.search(r"<X_Voxels>(\d+)</X_Voxels>", vxd).group(1))
+            voxels = [(i % x_voxels, i // x_voxels, z) for z, layer in enumerate(layers) for i, c in enumerate(layer) if c != "0"]
+            for step in range(args.steps):
+                offset = step * 0.001
+                sys.stdout.write("<<<Step%d Time:%f>>>" % (step, step * 0.01) +
+                                 "".join("%f,%f,%f,0.5,0.5,0.5,1;" % (x * 0.01 + offset, y * 0.01, z * 0.01) for x, y, z in voxels) + "|\n")
+
+    with open(args.output, "w") as f:
+        f.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n<report>\n  <detail>\n" + "".join(details) + "  </detail>\n</report>\n")
+
+if __name__ == "__main__":
+    main()
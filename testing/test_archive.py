@@ -0,0 +1,85 @@
+import unittest, io, os, shutil
+from contextlib import redirect_stderr
+from concurrent.futures import Future
+import numpy as np
+
+from neatbots.archive import EliteArchive, EliteRecord, report_replay
+from neatbots.simulation import Simulation
+from neatbots.VoxcraftVXA import VXA
+
+class FakeOrganism:
+    """Stands in for an evaluated organism, with strings in place of genomes."""
+
+    def __init__(self, morphology, fitness):
+        self.morphology = morphology
+        self.phase_offset = np.random.random(morphology.shape)
+        self.fitness = fitness
+        self.morphology_gen = "morphology"
+        self.controlsys_gen = "controlsys"
+
+class Test_EliteArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.path = "./test_elites.pkl"
+        fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        self.vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        self.sim = Simulation(fake_sim, "", "./generations/test_archive", self.vxa)
+        self.archive = EliteArchive(self.path)
+        self.morphologies = dict()
+        for i in range(3):
+            mats = [self.vxa.add_material(Density=np.random.random(), diff_thresh=-1) for _ in range(3)]
+            self.morphologies["1-" + str(i + 1)] = np.random.choice([0] + mats, (3, 3, 3))
+            self.morphologies["1-" + str(i + 1)][1, 1, 1] = mats[0]
+            self.archive.add("1-" + str(i + 1), FakeOrganism(self.morphologies["1-" + str(i + 1)], float(i)), self.vxa)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        shutil.rmtree("./generations/test_archive", ignore_errors=True)
+
+    def test_01(self):
+        """EliteArchive.replay_vxa rebuilds each elite's materials without modifying the simulation's palette"""
+
+        palette_size = len(self.vxa.materials.ids)
+        replay, lookups = self.archive.replay_vxa(self.vxa)
+        self.assertEqual(len(self.vxa.materials.ids), palette_size)
+
+        for org_id, record in self.archive.records.items():
+            self.assertEqual(record.morphology.dtype, np.uint8)
+            replayed = lookups[org_id][record.morphology]
+            np.testing.assert_array_equal(replayed == 0, self.morphologies[org_id] == 0)
+            # Each voxel's material has the same properties as when recorded
+            for original_id, replayed_id in zip(self.morphologies[org_id][replayed != 0], replayed[replayed != 0]):
+                np.testing.assert_array_equal(self.vxa.materials.props[self.vxa.materials.ids == original_id],
+                                              replay.materials.props[replay.materials.ids == replayed_id])
+
+    def test_02(self):
+        """EliteArchive.replay re-simulates stored elites, including after reloading the archive"""
+
+        self.archive.save()
+        reloaded = EliteArchive(self.path)
+        self.assertEqual(list(reloaded.records.keys()), ["1-1", "1-2", "1-3"])
+        self.assertEqual(reloaded.records["1-2"].genomes(), ("morphology", "controlsys"))
+
+        scores = reloaded.replay_async(self.sim, step_size=10).result()
+        self.assertEqual(sorted(scores.keys()), ["1-1", "1-2", "1-3"])
+        self.assertEqual(len([f for f in os.listdir("./generations/test_archive/elites") if f.startswith("elite_") and f.endswith(".history")]), 3)
+
+    def test_03(self):
+        """EliteRecord numbers materials without overflow, and failed replays are reported"""
+
+        mats = [self.vxa.add_material(Density=np.random.random(), diff_thresh=-1) for _ in range(300)]
+        morphology = np.array(mats).reshape(3, 10, 10)
+        record = EliteRecord("1-4", FakeOrganism(morphology, 0.0), self.vxa)
+        self.assertEqual(record.morphology.dtype, np.uint16)
+        self.assertEqual(len(np.unique(record.morphology)), 300)
+
+        future = Future()
+        future.set_exception(Exception("simulator missing"))
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            report_replay(future)
+        self.assertIn("simulator missing", stderr.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
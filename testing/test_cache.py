@@ -0,0 +1,50 @@
+import unittest, os
+import numpy as np
+
+from neatbots.cache import FitnessCache
+from neatbots.VoxcraftVXA import VXA
+
+class Test_FitnessCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = "./test_cache.sqlite"
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.cache = FitnessCache(self.path, max_entries=3)
+        self.vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        self.settings = self.cache.settings_key(self.vxa)
+
+    def test_01(self):
+        """FitnessCache.phenotype_key matches identical bodies whatever their material IDs"""
+
+        mat_a = self.vxa.add_material(Density=0.2)
+        mat_b = self.vxa.add_material(Density=0.8)
+        # Duplicate of material A with a different ID
+        mat_c = self.vxa.add_material(Density=0.2, diff_thresh=-1)
+        data = np.array([[[mat_a, mat_b, 0]]])
+        self.assertEqual(self.cache.phenotype_key(data, self.vxa, self.settings),
+                         self.cache.phenotype_key(np.array([[[mat_c, mat_b, 0]]]), self.vxa, self.settings))
+        self.assertNotEqual(self.cache.phenotype_key(data, self.vxa, self.settings),
+                            self.cache.phenotype_key(np.array([[[mat_b, mat_a, 0]]]), self.vxa, self.settings))
+        # Settings are part of the key
+        other = self.cache.settings_key(VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.02))
+        self.assertNotEqual(self.cache.phenotype_key(data, self.vxa, self.settings), self.cache.phenotype_key(data, self.vxa, other))
+
+    def test_02(self):
+        """FitnessCache persists fitness scores, evicts the least recently used and counts hits"""
+
+        self.cache.put({"a": 1.0, "b": 2.0, "c": 3.0})
+        self.assertEqual(self.cache.get("a"), 1.0)
+        self.cache.put({"d": 4.0})
+        # Reopened cache shares entries, b was least recently used
+        reopened = FitnessCache(self.path, max_entries=3)
+        self.assertEqual(reopened.get("b"), None)
+        self.assertEqual(reopened.get("a"), 1.0)
+        self.assertEqual(reopened.get("d"), 4.0)
+        self.assertAlmostEqual(reopened.hit_rate(), 2 / 3)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
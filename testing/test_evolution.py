@@ -1,5 +1,5 @@
 from typing import Dict
-import unittest
+import unittest, os, shutil
 import numpy as np
 import pandas as pd
 
@@ -7,6 +7,7 @@ from neatbots.simulation import Simulation
 from neatbots.evolution import Evolution
 from neatbots.organism import Organism
 from neatbots.VoxcraftVXA import VXA
+from neatbots.cache import FitnessCache
 
 class Test_Evolution(unittest.TestCase):
 
@@ -54,5 +55,105 @@ class Test_Evolution(unittest.TestCase):
     def tearDown(self):
         pass
 
+class Test_EvolutionCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        self.checkpoint_path = "./test_checkpoints"
+        shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+
+    def setup_evolution(self, gen_n: int):
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        sim = Simulation(self.fake_sim, "", "./generations", vxa)
+        return Evolution(sim, gen_n=gen_n, pop_s=4, checkpoint_path=self.checkpoint_path)
+
+    def test_01(self):
+        """Evolution.resume_from continues an interrupted run from its last checkpoint"""
+
+        np.random.seed(0)
+        expected = self.setup_evolution(3).evolve_organisms()[0]
+
+        np.random.seed(0)
+        self.setup_evolution(2).evolve_organisms()
+        self.assertEqual(os.listdir(self.checkpoint_path), ["checkpoint_2"])
+        resumed = self.setup_evolution(3).resume_from()[0]
+
+        self.assertEqual(resumed.shape, (3, 3))
+        # Generations before the checkpoint are restored, not re-run
+        self.assertTrue(np.allclose(expected["Avg Fitness"][:2], resumed["Avg Fitness"][:2]))
+        self.assertTrue(np.allclose(expected["Max Fitness"][:2], resumed["Max Fitness"][:2]))
+        # Generations after it continue the numbering, as MultiNEAT's own RNG state is not restored they need not match
+        self.assertEqual(list(resumed.index), list(expected.index))
+        self.assertTrue(np.all(np.isfinite(resumed.loc[3, ["Avg Fitness", "Max Fitness"]].astype(float))))
+
+    def test_02(self):
+        """Evolution.resume_from without any checkpoint path raises a ValueError"""
+
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        evo = Evolution(Simulation(self.fake_sim, "", "./generations", vxa), gen_n=1, pop_s=4)
+        with self.assertRaises(ValueError):
+            evo.resume_from()
+
+    def test_03(self):
+        """Evolution stores the elite archive with the generations only when elites are recorded, checkpoints holding it otherwise"""
+
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        evo = Evolution(Simulation(self.fake_sim, "", "./generations/test_elites", vxa), gen_n=1, pop_s=4, checkpoint_path=self.checkpoint_path)
+        evo.evolve_organisms(elites=False)
+        self.assertFalse(os.path.exists("./generations/test_elites/elites.pkl"))
+        self.assertIn("elite_archive", evo.load_checkpoint(self.checkpoint_path))
+        shutil.rmtree("./generations/test_elites", ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+
+class Test_EvolutionSteadyState(unittest.TestCase):
+
+    def test_01(self):
+        """Evolution.evolve_steady_state raises a ValueError for options which only apply to whole generations"""
+
+        fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        sim = Simulation(fake_sim, "", "./generations/test_steady", vxa)
+        for option in ({"fidelities": (0.5, 1.0)}, {"palette_pool": 8}):
+            with self.assertRaises(ValueError):
+                Evolution(sim, gen_n=1, pop_s=4, **option).evolve_steady_state()
+        shutil.rmtree("./generations/test_steady", ignore_errors=True)
+
+class Test_EvolutionFidelity(unittest.TestCase):
+
+    def setUp(self):
+        fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=2.0)
+        self.sim = Simulation(fake_sim, "", "./generations/test_fidelity", vxa)
+        self.evo = Evolution(self.sim, gen_n=1, pop_s=8, W=3, H=3, D=3, fidelities=(0.25, 0.5, 1.0), promote=0.5)
+
+    def tearDown(self):
+        shutil.rmtree("./generations/test_fidelity", ignore_errors=True)
+
+    def test_01(self):
+        """Evolution.evaluate_organisms promotes the best half of each fidelity to the next, restoring the simulation duration"""
+
+        organisms = self.evo.evaluate_organisms(self.evo.construct_organisms(1), "generation_1", "basic", 0)
+        self.assertEqual(self.sim.vxa.get_sim_time(), 2.0)
+
+        tiers = [[key for key, org in organisms.items() if len(org.fidelity_fitness) == n] for n in (1, 2, 3)]
+        self.assertEqual([len(tier) for tier in tiers], [4, 2, 2])
+        self.assertEqual(sorted(organisms["1-1"].fidelity_fitness.keys())[0], 0.5)
+        # Organisms eliminated at a fidelity never score above those promoted from it
+        for lower, higher in zip(tiers, tiers[1:]):
+            self.assertLessEqual(max(organisms[k].fitness for k in lower), min(organisms[k].fitness for k in higher))
+
+    def test_02(self):
+        """Evolution rejects fidelity schedules which do not end at the full duration, so partial scores never reach the cache"""
+
+        os.makedirs("./generations/test_fidelity", exist_ok=True)
+        cache = FitnessCache("./generations/test_fidelity/cache.sqlite")
+        for fidelities in ((0.25, 0.5), (0.5, 0.25, 1.0), (0.0, 1.0), (0.5, 1.5), ()):
+            with self.assertRaises(ValueError):
+                Evolution(self.sim, gen_n=1, pop_s=8, W=3, H=3, D=3, cache=cache, fidelities=fidelities)
+        self.assertEqual(cache.conn.execute("SELECT COUNT(*) FROM fitness").fetchone()[0], 0)
+        cache.conn.close()
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import unittest, os, shutil
+import numpy as np
+import pandas as pd
+import MultiNEAT as NEAT
+
+from neatbots.islands import Islands, GeneMap
+
+class FakeGenome:
+    """Stands in for a genome, remembering the island it was created on."""
+
+    def __init__(self, island, fitness):
+        self.island = island
+        self.fitness = fitness
+        self.NeuronGenes = list()
+        self.LinkGenes = list()
+
+    def GetFitness(self):
+        return self.fitness
+
+class FakeSpecies:
+
+    def __init__(self, individuals):
+        self.Individuals = individuals
+
+class FakePopulation:
+    """Stands in for a population of two species."""
+
+    def __init__(self, island, pop_s):
+        genomes = [FakeGenome(island, float(i)) for i in range(pop_s)]
+        self.Species = [FakeSpecies(genomes[:pop_s // 2]), FakeSpecies(genomes[pop_s // 2:])]
+
+class FakeEvolution:
+    """Stands in for an evolution process, scoring each organism by its island and recording the islands of its genomes."""
+
+    def __init__(self, params, stor_path):
+        self.stor_path = stor_path
+        self.gen_n = 4
+        self.before_epoch = None
+        self.morphology_seed_genome = FakeGenome(None, 0.0)
+        self.controlsys_seed_genome = FakeGenome(None, 0.0)
+
+    def create_populations(self, seed=0):
+        self.island = seed
+        self.morphology_pop = FakePopulation(seed, 6)
+        self.controlsys_pop = FakePopulation(seed, 6)
+
+    def evolve_organisms(self, elites=False, verbose=False):
+        gen_results = list()
+        for gen in range(self.gen_n):
+            genomes = [genome for species in self.morphology_pop.Species for genome in species.Individuals]
+            gen_results.append([gen+1, sum(g.fitness for g in genomes) / len(genomes) + self.island, max(g.fitness for g in genomes) + self.island, 0.0])
+            if (self.before_epoch != None):
+                self.before_epoch(gen+1)
+
+        with open(os.path.join(self.stor_path, "genomes"), "w") as f:
+            for pop in (self.morphology_pop, self.controlsys_pop):
+                f.write(",".join(str(g.island) for species in pop.Species for g in species.Individuals) + "\n")
+
+        fmt_gen_results = pd.DataFrame(gen_results, columns=["Gen", "Avg Fitness", "Max Fitness", "Exe Time"]).set_index("Gen")
+        return fmt_gen_results, 0.0, 0.0, 0.0, 0
+
+def setup_fake(params, stor_path):
+    return FakeEvolution(params, stor_path)
+
+def setup_failing(params, stor_path):
+    if (stor_path.endswith("island_2")):
+        raise Exception("ERROR: Island setup failed")
+    return FakeEvolution(params, stor_path)
+
+class Test_Islands(unittest.TestCase):
+
+    def setUp(self):
+        self.stor_path = "./generations/test_islands"
+        shutil.rmtree(self.stor_path, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.stor_path, ignore_errors=True)
+
+    def test_01(self):
+        """Islands.run migrates the best organisms around the ring of islands and aggregates their results"""
+
+        islands = Islands(setup_fake, {"AllowClones": False}, islands=3, migrate_every=2, migrants=2, stor_path=self.stor_path)
+        report, island_results = islands.run()
+
+        # Migration after generation 2 only, replacing the two worst organisms of each island with the best of the previous
+        for i in range(3):
+            with open(os.path.join(self.stor_path, "island_" + str(i + 1), "genomes")) as f:
+                lines = f.read().split()
+            self.assertEqual(lines[0], lines[1])
+            self.assertEqual(lines[0].split(","), [str((i - 1) % 3)] * 2 + [str(i)] * 4)
+
+        self.assertEqual(list(island_results.index.names), ["Island", "Gen"])
+        self.assertEqual(len(island_results), 12)
+        self.assertEqual(list(report["Best Island"]), [3, 3, 3, 3])
+        self.assertAlmostEqual(report.loc[1, "Avg Fitness"], 3.5)
+
+    def test_02(self):
+        """Islands.run raises when an island fails, rather than waiting on islands blocked in a migration"""
+
+        islands = Islands(setup_failing, islands=3, migrate_every=1, stor_path=self.stor_path)
+        with self.assertRaises(Exception) as context:
+            islands.run()
+        self.assertIn("Island 2 failed", str(context.exception))
+        self.assertIn("ERROR: Island setup failed", str(context.exception))
+
+    def test_03(self):
+        """GeneMap renumbers immigrants so that their offspring with native genomes never give one innovation two structures"""
+
+        params = NEAT.Parameters()
+        params.PopulationSize = 16
+        params.MutateAddNeuronProb = 0.3
+        params.MutateAddLinkProb = 0.5
+        seed_genome = NEAT.Genome(0, 5, 8, 19, False, NEAT.ActivationFunction.UNSIGNED_SIGMOID, NEAT.ActivationFunction.RELU, 1, params, 4)
+
+        # Islands numbering their innovations independently
+        genomes = list()
+        for seed in (1, 2):
+            np.random.seed(seed)
+            pop = NEAT.Population(seed_genome, params, True, 1.0, seed)
+            for gen in range(6):
+                for genome in NEAT.GetGenomeList(pop):
+                    genome.SetFitness(np.random.random())
+                pop.Epoch()
+            genomes.append(NEAT.GetGenomeList(pop))
+
+        gene_map = GeneMap(seed_genome)
+        immigrants = [gene_map.remap(NEAT.Genome(genome)) for genome in genomes[0]]
+        rng = NEAT.RNG()
+        rng.Seed(0)
+        offspring = [immigrant.Mate(native, False, False, rng, params) for immigrant in immigrants for native in genomes[1]]
+
+        structures = dict()
+        for genome in genomes[1] + immigrants + offspring:
+            neurons = set(neuron.ID for neuron in genome.NeuronGenes)
+            for link in genome.LinkGenes:
+                self.assertIn(link.FromNeuronID, neurons)
+                self.assertIn(link.ToNeuronID, neurons)
+                self.assertEqual(structures.setdefault(link.InnovationID, (link.FromNeuronID, link.ToNeuronID)), (link.FromNeuronID, link.ToNeuronID))
+            genome.BuildPhenotype(NEAT.NeuralNetwork())
+
+        # Immigrants from the same island keep the IDs first given to their genes
+        self.assertEqual([link.InnovationID for link in gene_map.remap(NEAT.Genome(genomes[0][0])).LinkGenes],
+                         [link.InnovationID for link in immigrants[0].LinkGenes])
+
+if __name__ == "__main__":
+    unittest.main()
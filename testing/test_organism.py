@@ -1,9 +1,10 @@
 import unittest
 import numpy as np
+import MultiNEAT as NEAT
 
 from neatbots.simulation import Simulation
 from neatbots.evolution import Evolution
-from neatbots.organism import Organism
+from neatbots.organism import Organism, input_grid
 from neatbots.VoxcraftVXA import VXA
 
 class Test_Organism(unittest.TestCase):
@@ -36,5 +37,29 @@ class Test_Organism(unittest.TestCase):
     def tearDown(self):
         pass
 
+class Test_OrganismQuery(unittest.TestCase):
+
+    def setUp(self):
+        params = NEAT.Parameters()
+        genome = NEAT.Genome(0, 5, 8, 19, False, NEAT.ActivationFunction.UNSIGNED_SIGMOID, NEAT.ActivationFunction.RELU, 1, params, 4)
+        self.test_dims = tuple(np.random.randint(1, 5, 3))
+        self.test_org = Organism(genome, genome, *self.test_dims)
+
+    def test_01(self):
+        """Organism.query_morphology matches per-voxel activation of the phenotype network"""
+
+        test_outputs = self.test_org.query_morphology()
+        self.assertEqual(test_outputs.shape, (np.prod(self.test_dims), 19))
+
+        net = NEAT.NeuralNetwork()
+        self.test_org.morphology_gen.BuildPhenotype(net)
+        for row, inputs in zip(test_outputs, input_grid(*self.test_dims)):
+            # Fully propagate each position from a flushed network
+            net.Flush()
+            net.Input(inputs)
+            for _ in range(len(net.neurons)):
+                net.Activate()
+            np.testing.assert_allclose(row, net.Output())
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,49 @@
+import unittest, os, json
+
+from neatbots.recorder import Recorder, NULL_STAGE
+
+class Test_Recorder(unittest.TestCase):
+
+    def setUp(self):
+        self.path = "./test_recorder.jsonl"
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def test_01(self):
+        """Recorder.stage is a shared no-op when disabled"""
+
+        recorder = Recorder()
+        self.assertIs(recorder.stage("encode"), NULL_STAGE)
+        with recorder.stage("encode"):
+            recorder.add("material_hits", 1)
+        recorder.end_generation(1)
+        self.assertEqual(recorder.totals, dict())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_02(self):
+        """Recorder.end_generation writes the totals of each generation as a JSON line"""
+
+        recorder = Recorder(self.path)
+        for gen in (1, 2):
+            with recorder.stage("encode"):
+                pass
+            recorder.add("material_hits", gen)
+            recorder.add("material_hits", gen)
+            recorder.record("organism", org=str(gen) + "-1", fitness=0.5)
+            recorder.end_generation(gen, max_fit=0.5)
+        recorder.close()
+
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["type"] for r in records], ["organism", "generation", "organism", "generation"])
+        self.assertEqual(records[3]["gen"], 2)
+        self.assertEqual(records[3]["material_hits"], 4)
+        self.assertGreaterEqual(records[3]["encode"], 0.0)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,8 @@
-import unittest, os
+import unittest, os, io, shutil
 import numpy as np
+from lxml import etree
 
-from neatbots.simulation import Simulation
+from neatbots.simulation import Simulation, HistoryStream, read_results
 from neatbots.evolution import Evolution
 from neatbots.organism import Organism
 from neatbots.VoxcraftVXA import VXA
@@ -60,5 +61,224 @@ class Test_Simulation(unittest.TestCase):
             self.assertIsInstance(fitnesses[k], float)
 
 
+class Test_SimulationPlacement(unittest.TestCase):
+
+    def setUp(self):
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        self.sim = Simulation("./voxcraft-sim/voxcraft-sim", "./voxcraft-sim/vx3_node_worker", "./generations", vxa)
+
+    def test_01(self):
+        """Simulation.place_morphology matches inserting the morphology into the full environment and cropping"""
+
+        for _ in range(10):
+            morphology = np.random.randint(0, 6, (3, 3, 3)) * (np.random.random((3, 3, 3)) < 0.3)
+            # Reference placement into a full copy of the environment
+            environment, (oX, oY, oZ) = self.sim.vxa.get_voxelspace()
+            environment[oX:oX+3, oY:oY+3, oZ:oZ+3] = morphology
+            xL, yL, zL = np.where(environment != 0)
+            expected = environment[min(xL):max(xL)+1, min(yL):max(yL)+1, min(zL):max(zL)+1]
+            np.testing.assert_array_equal(expected, self.sim.place_morphology(morphology))
+
+    def test_02(self):
+        """Simulation.place_morphology rejects morphologies that exceed the environment"""
+
+        with self.assertRaises(Exception):
+            self.sim.place_morphology(np.ones((8, 8, 8), dtype=int))
+
+    def test_03(self):
+        """Simulation.encode_morphology writes phase offsets aligned with the placed morphology"""
+
+        morphology = np.random.randint(0, 6, (3, 3, 3)) * (np.random.random((3, 3, 3)) < 0.5)
+        morphology[1, 1, 1] = 1
+        phase_offset = np.random.random((3, 3, 3))
+        data = self.sim.place_morphology(morphology)
+        placed = self.sim.place_morphology(morphology, phase_offset)
+        self.assertEqual(data.shape, placed.shape)
+        # Phase offsets follow the morphology's occupied space, with zeros for the environment
+        xL, yL, zL = np.where(morphology != 0)
+        occupied = phase_offset[min(xL):max(xL)+1, min(yL):max(yL)+1, min(zL):max(zL)+1]
+        self.assertTrue(np.allclose(np.sort(placed[placed != 0]), np.sort(occupied.ravel())))
+
+        abs_path = self.sim.create_directory("generation_p")
+        self.sim.encode_morphology(morphology, abs_path, "test_0", 0, phase_offset)
+        root = etree.parse(os.path.join(abs_path, "test_0.vxd")).getroot()
+        layers = [[float(p) for p in layer.text.split(",")] for layer in root.find("Structure/PhaseOffset")]
+        self.assertEqual(len(layers), data.shape[2])
+        self.assertTrue(np.allclose(np.array(layers).reshape(placed.shape[::-1]).transpose(2, 1, 0), placed, atol=5e-4))
+
+
+class Test_HistoryStream(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join("./generations", "generation_h")
+        os.makedirs(self.path, exist_ok=True)
+        self.log = b"Starting\nSimulation 1 Diverged: /tmp/basic_1-2.vxd.\nDone\n"
+        self.hists = {"basic_1-%d" % i: b" runs: basic_1-%d.vxd\n<<<Step0>>>%s\n" % (i, b"0.1," * 50 * i) for i in range(1, 4)}
+        self.output = self.log + b"".join(b"HISTORY_SPLIT" + h for h in self.hists.values())
+
+    def test_01(self):
+        """HistoryStream writes each history file and finds diverged organisms, whatever the chunk size"""
+
+        for chunk_size in (1, 5, 13, 64, 1 << 20):
+            diverged = HistoryStream(self.path, chunk_size).read(io.BytesIO(self.output))
+            self.assertEqual(diverged, {"basic_1-2"})
+            with open(os.path.join(self.path, "log.history"), "rb") as f:
+                self.assertEqual(f.read(), self.log)
+            for name, hist in self.hists.items():
+                with open(os.path.join(self.path, name + ".history"), "rb") as f:
+                    self.assertEqual(f.read(), hist)
+
+    def test_02(self):
+        """HistoryStream streams an optional log to disk, keeping it only when histories were recorded"""
+
+        for output, kept in ((self.log, False), (self.output, True)):
+            if os.path.exists(os.path.join(self.path, "log.history")):
+                os.unlink(os.path.join(self.path, "log.history"))
+            HistoryStream(self.path, 16, keep_log=False).read(io.BytesIO(output))
+            self.assertEqual(os.path.exists(os.path.join(self.path, "log.history")), kept)
+            self.assertFalse(os.path.exists(os.path.join(self.path, "log.history.tmp")))
+        with open(os.path.join(self.path, "log.history"), "rb") as f:
+            self.assertEqual(f.read(), self.log)
+
+    def test_03(self):
+        """HistoryStream keeps a section without an organism name in the log, holding only a bounded start of it"""
+
+        unnamed = b"<<<Step0>>>" + b"0.1," * HistoryStream.HEADER_LIMIT
+        stream = HistoryStream(self.path)
+        stream.next_section()
+        stream.write(unnamed)
+        self.assertEqual(stream.header, None)
+        stream.close()
+
+        stream = HistoryStream(self.path, 4096)
+        stream.read(io.BytesIO(self.log + b"HISTORY_SPLIT" + unnamed + b"".join(b"HISTORY_SPLIT" + h for h in self.hists.values())))
+        self.assertEqual(stream.recorded, 3)
+        with open(os.path.join(self.path, "log.history"), "rb") as f:
+            self.assertEqual(f.read(), self.log + unnamed)
+
+
+class Test_SimulationShards(unittest.TestCase):
+
+    def setUp(self):
+        self.fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        self.vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+
+    def simulate(self, shards: int, step_size: int):
+        sim = Simulation(self.fake_sim, "", "./generations", self.vxa, shards=shards, max_concurrent=2)
+        abs_path = sim.create_directory("generation_s")
+        for i in range(1, 8):
+            morphology = np.zeros((3, 3, 3), dtype=int)
+            morphology[:, :, :i % 3 + 1] = 3
+            sim.encode_morphology(morphology, abs_path, "test_1-" + str(i), step_size)
+        self.vxa.write(os.path.join(abs_path, "base.vxa"))
+        return abs_path, sim.simulate_generation(abs_path)
+
+    def test_01(self):
+        """Simulation.simulate_generation merges sharded results into the same fitness dict"""
+
+        _, expected = self.simulate(1, 0)
+        abs_path, fitnesses = self.simulate(3, 0)
+        self.assertEqual(len(fitnesses), 7)
+        self.assertEqual(expected, fitnesses)
+        # Organisms are moved back from their shards
+        self.assertEqual(7, len([f for f in os.listdir(abs_path) if f.endswith(".vxd")]))
+        self.assertFalse(any(f.startswith("shard_") for f in os.listdir(abs_path)))
+
+    def test_02(self):
+        """Simulation.simulate_generation merges sharded history files into the generation directory"""
+
+        abs_path, _ = self.simulate(3, 100)
+        for i in range(1, 8):
+            self.assertTrue(os.path.exists(os.path.join(abs_path, "test_1-" + str(i) + ".history")))
+        with open(os.path.join(abs_path, "log.history")) as f:
+            self.assertEqual(3, f.read().count("Fake voxcraft-sim"))
+
+    def test_03(self):
+        """Simulation.simulate_generation scores diverged organisms as 0 in every shard"""
+
+        os.environ["FAKE_VOXCRAFT_DIVERGE"] = "1.0"
+        try:
+            _, fitnesses = self.simulate(3, 0)
+        finally:
+            del os.environ["FAKE_VOXCRAFT_DIVERGE"]
+        self.assertEqual(len(fitnesses), 7)
+        self.assertTrue(all(fitness == 0.0 for fitness in fitnesses.values()))
+
+
+class Test_SimulationScratch(unittest.TestCase):
+
+    def setUp(self):
+        self.fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        self.vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        self.sim = Simulation(self.fake_sim, "", "./generations", self.vxa, scratch_path="./generations_scratch")
+
+    def tearDown(self):
+        shutil.rmtree("./generations_scratch")
+
+    def simulate(self, generation_dir: str):
+        abs_path = self.sim.create_directory(generation_dir)
+        morphology = np.zeros((3, 3, 3), dtype=int)
+        morphology[:, :, :2] = 3
+        self.sim.encode_morphology(morphology, abs_path, "test_1-1", 0)
+        self.vxa.write(os.path.join(abs_path, "base.vxa"))
+        return abs_path, self.sim.simulate_generation(abs_path)
+
+    def test_01(self):
+        """Simulation.release_directory deletes scratch directories, without writing an unused log"""
+
+        abs_path, fitnesses = self.simulate("generation_1")
+        self.assertEqual(list(fitnesses.keys()), ["1-1"])
+        self.assertFalse(os.path.exists(os.path.join(abs_path, "log.history")))
+        self.sim.release_directory(abs_path)
+        self.assertFalse(os.path.exists(abs_path))
+        self.assertFalse(os.path.exists(os.path.join("./generations", "generation_1")))
+
+    def test_02(self):
+        """Simulation.release_directory moves persisted scratch directories into storage"""
+
+        abs_path, _ = self.simulate("generation_2")
+        self.sim.release_directory(abs_path, persist=True)
+        self.assertFalse(os.path.exists(abs_path))
+        self.assertTrue(os.path.exists(os.path.join("./generations", "generation_2", "test_1-1.vxd")))
+
+    def test_03(self):
+        """Simulation.close deletes the private scratch directory and its settings, which evolution does once finished"""
+
+        abs_path, _ = self.simulate("generation_3")
+        self.sim.write_settings(abs_path)
+        self.assertTrue(os.path.exists(self.sim.settings_path))
+        self.sim.close()
+        self.assertEqual(os.listdir("./generations_scratch"), [])
+
+        sim = Simulation(self.fake_sim, "", "./generations", VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01), 
+                         scratch_path="./generations_scratch")
+        Evolution(sim, gen_n=1, pop_s=4).evolve_organisms()
+        self.assertEqual(os.listdir("./generations_scratch"), [])
+
+
+class Test_ReadResults(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs("./generations", exist_ok=True)
+        self.path = os.path.join("./generations", "results_test.xml")
+        records = "".join("<basic_1-%d><fitness_score>%f</fitness_score><currentCenterOfMass><x>%f</x></currentCenterOfMass>"
+                          "<voxel_positions>%s</voxel_positions></basic_1-%d>" % (i, i * 0.5, i * 0.1, "0.1,0.2,0.3;" * 100, i) for i in range(1, 6))
+        with open(self.path, "w") as f:
+            f.write("<?xml version=\"1.0\"?>\n<report><detail>" + records + "</detail></report>\n")
+
+    def test_01(self):
+        """read_results returns fitness scores and requested metrics by organism ID, scoring diverged organisms as 0"""
+
+        keys, values = read_results(self.path, {"basic_1-2"}, ("currentCenterOfMass/x", "currentCenterOfMass/y"))
+        self.assertEqual(keys, ["1-1", "1-2", "1-3", "1-4", "1-5"])
+        self.assertEqual(values.shape, (5, 3))
+        self.assertTrue(np.allclose(values[:, 0], [0.5, 0.0, 1.5, 2.0, 2.5]))
+        self.assertTrue(np.allclose(values[:, 1], [0.1, 0.2, 0.3, 0.4, 0.5]))
+        self.assertTrue(np.all(np.isnan(values[:, 2])))
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+
 if __name__ == "__main__":
     unittest.main()
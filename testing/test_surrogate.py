@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+
+from neatbots.surrogate import Surrogate, morphology_features, N_FEATURES
+from neatbots.VoxcraftVXA import VXA
+
+class Test_Surrogate(unittest.TestCase):
+
+    def setUp(self):
+        self.vxa = VXA(HeapSize=0.6, SimTime=0.01)
+        self.mats = [self.vxa.add_material(Density=d, diff_thresh=-1) for d in (0.0, 1.0)]
+
+    def test_01(self):
+        """morphology_features describes empty, sparse and dense morphologies with fixed-length vectors"""
+
+        empty = np.zeros((3, 3, 3), dtype=int)
+        sparse = empty.copy()
+        sparse[0, 0, 0] = self.mats[0]
+        dense = np.full((3, 3, 3), self.mats[1])
+        features = [morphology_features(m, np.zeros(m.shape), self.vxa) for m in (empty, sparse, dense)]
+
+        self.assertTrue(all(f.shape == (N_FEATURES,) for f in features))
+        self.assertFalse(np.any(features[0]))
+        self.assertAlmostEqual(features[1][0], 1 / 27)
+        self.assertAlmostEqual(features[2][0], 1.0)
+        # Denser material is described by its exponent
+        self.assertGreater(features[2][7:].sum(), features[1][7:].sum())
+
+    def test_02(self):
+        """Surrogate.screen simulates everything until fitted, then the best predicted and an exploration quota"""
+
+        np.random.seed(0)
+        surrogate = Surrogate(fraction=0.25, explore=0.25, min_samples=100)
+        # Fitness depends on a few features, as with fill fraction and material properties
+        weights = np.zeros(N_FEATURES)
+        weights[[0, 4, 9]] = 1.0, 0.5, -0.5
+        features = np.random.random((100, N_FEATURES))
+
+        simulate, predicted = surrogate.screen(features)
+        self.assertTrue(np.all(simulate))
+        self.assertIsNone(predicted)
+        report = surrogate.update(features, features @ weights)
+        self.assertEqual(report["simulated"], 100)
+
+        features = np.random.random((40, N_FEATURES))
+        simulate, predicted = surrogate.screen(features)
+        self.assertEqual(np.count_nonzero(simulate), 20)
+        # Best predicted organisms are always simulated
+        self.assertTrue(np.all(simulate[np.argsort(-predicted)[:10]]))
+
+        report = surrogate.update(features[simulate], features[simulate] @ weights, predicted[simulate], 20)
+        self.assertEqual(report["skipped"], 20)
+        self.assertGreater(report["rank_corr"], 0.8)
+
+if __name__ == "__main__":
+    unittest.main()
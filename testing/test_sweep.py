@@ -0,0 +1,69 @@
+import unittest, os, shutil
+import pandas as pd
+
+from neatbots.sweep import Sweep
+
+class FakeEvolution:
+    """Stands in for an evolution process, scoring each trial by its tested value."""
+
+    def __init__(self, params, stor_path):
+        self.value = params.MinSpecies * 10 + params.MaxSpecies
+        self.stor_path = stor_path
+
+    def evolve_organisms(self, elites=False, verbose=False):
+        open(os.path.join(self.stor_path, "evolved"), "w").close()
+        return None, 1.0, 0.5, float(self.value), 3
+
+def setup_fake(params, stor_path):
+    return FakeEvolution(params, stor_path)
+
+class Test_Sweep(unittest.TestCase):
+
+    def setUp(self):
+        self.results_path = "./test_sweep.csv"
+        self.stor_path = "./generations/test_sweep"
+        if os.path.exists(self.results_path):
+            os.unlink(self.results_path)
+        shutil.rmtree(self.stor_path, ignore_errors=True)
+        exp_ranges = {"MinSpecies": [4, [2, 6]], "MaxSpecies": [10, [8, 2, 4]]}
+        self.sweep = Sweep(setup_fake, exp_ranges, {"AllowClones": False}, self.results_path, self.stor_path, workers=2)
+
+    def tearDown(self):
+        os.unlink(self.results_path)
+        shutil.rmtree(self.stor_path)
+
+    def test_01(self):
+        """Sweep.run records every trial and selects the best value of each hyperparameter"""
+
+        optimal = self.sweep.run()
+        self.assertEqual(optimal, {"MinSpecies": 6, "MaxSpecies": 8})
+        results = pd.read_csv(self.results_path, dtype={"Exp No.": str, "Test No.": str})
+        self.assertEqual(sorted(zip(results["Exp No."], results["Test No."])), [("01", "01"), ("01", "02"), ("02", "01"), ("02", "02"), ("02", "03")])
+
+    def test_02(self):
+        """Sweep.run skips trials already recorded, discarding an incomplete row"""
+
+        with open(self.results_path, "w") as f:
+            f.write("Exp No.,Test No.,Test Value,Evo Speed,Evo Accel,Max Avg Fit,Generation of Max Avg Fit\n")
+            f.write("01,02,6,+001.00,+000.50,+070.00,3\n")
+            f.write("02,01,8,+001.00,+0")
+
+        self.assertEqual(self.sweep.run(), {"MinSpecies": 6, "MaxSpecies": 8})
+        self.assertFalse(os.path.exists(os.path.join(self.stor_path, "exp_01_test_02")))
+        self.assertTrue(os.path.exists(os.path.join(self.stor_path, "exp_02_test_01", "evolved")))
+        self.assertEqual(len(pd.read_csv(self.results_path)), 5)
+
+    def test_03(self):
+        """Sweep.run rewrites the header of a results file interrupted before it was complete"""
+
+        for contents in ("", "Exp No.,Test No.,Test Va"):
+            shutil.rmtree(self.stor_path, ignore_errors=True)
+            with open(self.results_path, "w") as f:
+                f.write(contents)
+
+            self.assertEqual(self.sweep.run(), {"MinSpecies": 6, "MaxSpecies": 8})
+            self.assertEqual(len(pd.read_csv(self.results_path)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest, io, os, shutil
+import numpy as np
+
+from neatbots.simulation import HistoryStream, Simulation
+from neatbots.trajectory import Trajectory
+from neatbots.VoxcraftVXA import VXA
+
+class Test_Trajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join("./generations", "generation_t")
+        os.makedirs(self.path, exist_ok=True)
+        # Voxels with position, orientation and colour, followed by links
+        self.positions = np.random.random((4, 5, 3)).astype(np.float32)
+        steps = b"".join(b"<<<Step%d Time:%f>>>" % (i * 100, i * 0.01) +
+                         b"".join(b"%r,%r,%r,0.0,1.0,0.0,0.0,1,0,0,1;" % tuple(float(v) for v in voxel) for voxel in frame) + b"|1,2;\n"
+                         for i, frame in enumerate(self.positions))
+        self.output = b"Starting\nHISTORY_SPLIT\n Simulation runs: basic_1-1.vxd\n{{{setting}}}<rescale>1</rescale>\n" + steps
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_01(self):
+        """HistoryStream converts histories into trajectories of voxel positions, whatever the chunk size"""
+
+        for chunk_size in (7, 64, 1 << 20):
+            HistoryStream(self.path, chunk_size, trajectories=True).read(io.BytesIO(self.output))
+            self.assertFalse(os.path.exists(os.path.join(self.path, "basic_1-1.history")))
+
+            trajectory = Trajectory(os.path.join(self.path, "basic_1-1.traj"))
+            self.assertEqual(len(trajectory), 4)
+            self.assertEqual(list(trajectory.index["step"]), [0, 100, 200, 300])
+            for (step, time, frame), expected in zip(trajectory.frames(), self.positions):
+                np.testing.assert_array_equal(frame, expected)
+
+    def test_02(self):
+        """Trajectory.time_slice returns the frames within a period as a single view"""
+
+        HistoryStream(self.path, trajectories=True).read(io.BytesIO(self.output))
+        trajectory = Trajectory(os.path.join(self.path, "basic_1-1.traj"))
+
+        index, positions = trajectory.time_slice(0.005, 0.025)
+        self.assertEqual(list(index["step"]), [100, 200])
+        self.assertEqual(list(index["start"]), [0, 5])
+        self.assertFalse(positions.flags.writeable)
+        np.testing.assert_array_equal(positions, self.positions[1:3].reshape(-1, 3))
+        self.assertEqual(len(trajectory.time_slice(1.0, 2.0)[0]), 0)
+
+    def test_03(self):
+        """Simulation stores recorded histories as trajectories when enabled"""
+
+        fake_sim = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_voxcraft_sim.py")
+        vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+        sim = Simulation(fake_sim, "", "./generations", vxa, trajectories=True)
+        abs_path = sim.create_directory("generation_t")
+        morphology = np.zeros((3, 3, 3), dtype=int)
+        morphology[:, :, 0] = 3
+        sim.encode_morphology(morphology, abs_path, "test_1-1", 100)
+        vxa.write(os.path.join(abs_path, "base.vxa"))
+        sim.simulate_generation(abs_path)
+
+        # Every placed voxel, environment included, moves along X at each step
+        trajectory = Trajectory(os.path.join(abs_path, "test_1-1.traj"))
+        self.assertEqual(len(trajectory), 3)
+        self.assertGreater(len(trajectory.frame(0)), 9)
+        np.testing.assert_allclose(trajectory.frame(2)[:, 0] - trajectory.frame(0)[:, 0], 0.002, atol=1e-6)
+
+    def test_04(self):
+        """HistoryStream reads the positions of voxels with differing fields, skipping steps without positions"""
+
+        steps = (b"<<<Step0 Time:0.0>>>1.0,2.0,3.0,0.0,1.0,0.0,0.0,1,0,0,1;4.0,5.0,6.0;|1,2;\n" +
+                 b"<<<Step100 Time:0.01>>>1.0,2.0;4.0,5.0,6.0;|\n" +
+                 b"<<<Step200 Time:0.02>>>7.0,8.0,9.0,1.0;1.5,2.5,3.5,0.0;|\n")
+        output = self.output.split(b"<<<")[0] + steps
+        HistoryStream(self.path, trajectories=True).read(io.BytesIO(output))
+
+        trajectory = Trajectory(os.path.join(self.path, "basic_1-1.traj"))
+        self.assertEqual(list(trajectory.index["step"]), [0, 200])
+        np.testing.assert_array_equal(trajectory.frame(0), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        np.testing.assert_array_equal(trajectory.frame(1), [[7.0, 8.0, 9.0], [1.5, 2.5, 3.5]])
+
+if __name__ == "__main__":
+    unittest.main()
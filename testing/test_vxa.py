@@ -0,0 +1,175 @@
+import unittest, os, shutil, time
+import numpy as np
+from lxml import etree
+
+from neatbots.VoxcraftVXA import VXA, MATERIAL_OUTPUTS, compile_gym, collect_settings
+from neatbots.VoxcraftVXD import MAX_MATERIAL_ID
+
+class Test_VXA(unittest.TestCase):
+
+    def setUp(self):
+        self.vxa = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+
+    def test_01(self):
+        """VXA.add_material returns the existing ID for an identical material"""
+
+        mat_id = self.vxa.add_material(Elastic_Mod=0.5, Density=0.5, diff_thresh=0)
+        self.assertEqual(mat_id, self.vxa.add_material(Elastic_Mod=0.5, Density=0.5, diff_thresh=0))
+        self.assertEqual(len(self.vxa.palette.findall("Material")), mat_id)
+
+    def test_02(self):
+        """VXA.add_material returns the nearest material within the similarity threshold"""
+
+        near_id = self.vxa.add_material(uStatic=0.5, diff_thresh=0)
+        far_id = self.vxa.add_material(uStatic=1.0, diff_thresh=0)
+        self.assertNotEqual(near_id, far_id)
+        self.assertEqual(near_id, self.vxa.add_material(uStatic=0.6, diff_thresh=1))
+        self.assertEqual(far_id, self.vxa.add_material(uStatic=0.9, diff_thresh=1))
+
+    def test_03(self):
+        """VXA.add_material never reuses environment materials and returns 0 for empty space"""
+
+        self.assertEqual(0, self.vxa.add_material(isEmpty=1.0))
+        # Materials 1 and 2 are fixed parts of the gym
+        self.assertNotIn(self.vxa.add_material(diff_thresh=100), (1, 2))
+
+    def test_04(self):
+        """VXA environment is decoded once into a read-only array of material IDs"""
+
+        self.assertEqual(self.vxa.environment.shape, (30, 10, 10))
+        self.assertEqual(self.vxa.spawnpoint, (26, 3, 0))
+        self.assertFalse(self.vxa.environment.flags.writeable)
+        # Layers are strings of material characters with X varying fastest
+        layer = self.vxa.root.find("*/Structure/Data").findall("Layer")[0].text
+        self.assertEqual(layer, "".join(chr(48 + v) for v in self.vxa.environment[:, :, 0].T.ravel()))
+
+    def test_05(self):
+        """VXA.compact_palette keeps gym and referenced materials with dense IDs, and remaps morphologies"""
+
+        old_ids = [self.vxa.add_material(Density=d, diff_thresh=0) for d in (0.1, 0.3, 0.5, 0.7, 0.9)]
+        old_props = {i: self.vxa.materials.props[self.vxa.materials.ids == i][0] for i in old_ids}
+        morphologies = [np.array([[[old_ids[3], 0]]]), np.array([[[old_ids[1], old_ids[3]]]])]
+
+        compacted = self.vxa.compact_palette(morphologies, pool_size=1)
+
+        # Gym materials 1-3, referenced materials, then the newest unreferenced material
+        self.assertEqual(list(self.vxa.materials.ids), [1, 2, 3, 4, 5, 6])
+        self.assertEqual([int(m.get("ID")) for m in self.vxa.palette.findall("Material")], [1, 2, 3, 4, 5, 6])
+        for old, new in zip(morphologies, compacted):
+            for old_id, new_id in zip(old.ravel(), new.ravel()):
+                if (old_id == 0):
+                    self.assertEqual(new_id, 0)
+                else:
+                    self.assertTrue(np.array_equal(old_props[old_id], self.vxa.materials.props[self.vxa.materials.ids == new_id][0]))
+        self.assertTrue(np.array_equal(old_props[old_ids[4]], self.vxa.materials.props[5]))
+        # Pooled materials are reused, and new materials follow the compacted IDs
+        self.assertEqual(6, self.vxa.add_material(Density=0.9, diff_thresh=0))
+        self.assertEqual(7, self.vxa.add_material(Density=0.2, diff_thresh=0))
+
+
+    def test_06(self):
+        """VXA.serialize matches the full tree after the palette changes, reusing the cached settings"""
+
+        self.vxa.add_material(Density=0.2, diff_thresh=0)
+        self.assertEqual(self.vxa.serialize(), etree.tostring(self.vxa.root, pretty_print=True))
+        cached = self.vxa.static_xml
+        self.vxa.add_material(Density=0.8, diff_thresh=0)
+        self.assertEqual(self.vxa.serialize(), etree.tostring(self.vxa.root, pretty_print=True))
+        self.assertIs(cached, self.vxa.static_xml)
+
+    def test_07(self):
+        """VXA.write links identical files to a single shared file, and collect_settings removes unlinked files"""
+
+        shared_dir = "./generations/test_settings"
+        paths = ["./generations/test_a.vxa", "./generations/test_b.vxa"]
+        shutil.rmtree(shared_dir, ignore_errors=True)
+        for path in paths:
+            self.vxa.write(path, shared_dir=shared_dir)
+        self.assertEqual(len(os.listdir(shared_dir)), 1)
+        self.assertTrue(os.path.samefile(*paths))
+        with open(paths[0], "rb") as f:
+            self.assertEqual(f.read(), self.vxa.serialize())
+
+        # Files no longer linked anywhere are removed when collected, unless written since the given time
+        for path in paths:
+            os.unlink(path)
+        self.vxa.add_material(Density=0.5, diff_thresh=0)
+        self.vxa.write(paths[0], shared_dir=shared_dir)
+        self.assertEqual(len(os.listdir(shared_dir)), 2)
+        collect_settings(shared_dir, os.stat(os.path.join(shared_dir, os.listdir(shared_dir)[0])).st_mtime - 60)
+        self.assertEqual(len(os.listdir(shared_dir)), 2)
+        collect_settings(shared_dir, time.time() + 60)
+        self.assertEqual(len(os.listdir(shared_dir)), 1)
+        self.assertTrue(os.path.samefile(os.path.join(shared_dir, os.listdir(shared_dir)[0]), paths[0]))
+        os.unlink(paths[0])
+        shutil.rmtree(shared_dir)
+
+    def test_08(self):
+        """VXA loaded from a compiled gym maps its environment and serialises as the .vxa gym"""
+
+        path = compile_gym("./gyms/gym_05.vxa", "./generations/test_gym_05.gym")
+        compiled = VXA(src=path, HeapSize=0.6, SimTime=0.01)
+
+        self.assertIsInstance(compiled.environment, np.memmap)
+        self.assertFalse(compiled.environment.flags.writeable)
+        np.testing.assert_array_equal(compiled.environment, self.vxa.environment)
+        self.assertEqual(compiled.spawnpoint, self.vxa.spawnpoint)
+        self.assertEqual(compiled.serialize(), self.vxa.serialize())
+
+        # Pickled without the environment's layers, as sent to worker processes
+        state = compiled.__getstate__()
+        self.assertNotIn(b"<Layer>", state["root"])
+        unpickled = VXA.__new__(VXA)
+        unpickled.__setstate__(state)
+        np.testing.assert_array_equal(unpickled.environment, self.vxa.environment)
+        os.unlink(path)
+
+    def test_09(self):
+        """VXA.add_materials resolves a batch as add_material would row by row, sharing IDs between identical rows"""
+
+        outputs = np.random.random((27, len(MATERIAL_OUTPUTS)))
+        outputs[:, MATERIAL_OUTPUTS.index("isEmpty")] = 0.0
+        outputs[:, MATERIAL_OUTPUTS.index("Fixed")] = 0.0
+        sequential = VXA(src="./gyms/gym_05.vxa", HeapSize=0.6, SimTime=0.01)
+
+        for thresh in (0, 15):
+            np.random.seed(thresh)
+            expected = [int(sequential.add_material(**dict(zip(MATERIAL_OUTPUTS, row)), diff_thresh=thresh)) for row in outputs]
+            np.random.seed(thresh)
+            mat_ids = self.vxa.add_materials(outputs, diff_thresh=thresh)
+            self.assertEqual(list(mat_ids), expected)
+            self.assertEqual(etree.tostring(self.vxa.palette), etree.tostring(sequential.palette))
+
+        # Empty rows are 0, and repeated rows are checked once
+        outputs[:5, MATERIAL_OUTPUTS.index("isEmpty")] = 1.0
+        mat_ids = self.vxa.add_materials(np.vstack([outputs, outputs]), diff_thresh=0)
+        self.assertFalse(np.any(mat_ids[:5]))
+        self.assertTrue(np.all(mat_ids[5:27]))
+        np.testing.assert_array_equal(mat_ids[:27], mat_ids[27:])
+
+    def test_10(self):
+        """VXA.compact_palette keeps IDs within the .vxd encoding, and new materials never reuse an existing ID"""
+
+        mat_ids = [self.vxa.add_material(Density=d, diff_thresh=-1) for d in np.linspace(0.0, 1.0, 240)]
+        morphologies = [np.array(mat_ids[:150]).reshape(5, 5, 6)]
+
+        # The pool only fills the IDs left after the referenced materials
+        compacted = self.vxa.compact_palette(morphologies, pool_size=64)
+        self.assertEqual(int(np.max(self.vxa.materials.ids)), MAX_MATERIAL_ID)
+        self.assertEqual(int(np.max(compacted[0])), 153)
+
+        # Too many referenced materials leave the palette untouched
+        mat_ids = [self.vxa.add_material(Density=d, diff_thresh=-1) for d in np.linspace(0.0, 1.0, 10)]
+        palette = etree.tostring(self.vxa.palette)
+        with self.assertRaises(ValueError):
+            self.vxa.compact_palette([np.arange(1, max(mat_ids) + 1)], pool_size=0)
+        self.assertEqual(palette, etree.tostring(self.vxa.palette))
+
+        # Gym IDs with gaps are followed rather than counted
+        self.vxa.palette.findall("Material")[-1].set("ID", "300")
+        self.vxa.index_palette()
+        self.assertEqual(301, self.vxa.add_material(Density=0.5, diff_thresh=-1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest, os, shutil
+import numpy as np
+from lxml import etree
+
+from neatbots.VoxcraftVXD import VXD
+
+class Test_VXD(unittest.TestCase):
+
+    def setUp(self):
+        self.path = "./generations/test_vxd"
+        os.makedirs(self.path, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_01(self):
+        """VXD.write produces a parseable file for any encodable material IDs, including those spelling the CDATA terminator"""
+
+        data = np.zeros((4, 2, 2), dtype=int)
+        data[:, 0, 0] = [45, 45, 14, 1]
+        data[:, 1, 0] = [80, 128, 207, 0]
+        data[:, :, 1] = [[45, 45], [45, 14], [14, 207], [79, 45]]
+
+        vxd = VXD()
+        vxd.set_tags()
+        vxd.set_data(data)
+        vxd.write(os.path.join(self.path, "test.vxd"))
+
+        # Layers decode back into the material IDs, X varying fastest
+        layers = etree.parse(os.path.join(self.path, "test.vxd")).getroot().findall("Structure/Data/Layer")
+        self.assertEqual(len(layers), 2)
+        for z, layer in enumerate(layers):
+            self.assertEqual([ord(c) - 48 for c in layer.text], list(data[:, :, z].T.flatten()))
+
+        with self.assertRaises(ValueError):
+            vxd.set_data(np.full((1, 1, 1), 208))
+
+if __name__ == "__main__":
+    unittest.main()